@@ -0,0 +1,75 @@
+# /// script
+# requires-python = ">=3.9"
+# dependencies = [
+#     "pyciv7",
+# ]
+#
+# [tool.uv.sources]
+# pyciv7 = { path = "../", editable = true }
+# ///
+"""
+Measures how long importing pyciv7 takes in a fresh interpreter and fails if an import exceeds
+its budget.
+
+Usage:
+
+    uv run benchmarks/import_time.py [--runs 10]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+BUDGETS_MS: Dict[str, float] = {
+    "pyciv7": 50,
+    "pyciv7.modinfo": 400,
+    "pyciv7.runner": 600,
+}
+"""
+Maximum median cumulative import time of each module, in milliseconds. The budgets are generous
+so they only catch regressions such as an eagerly imported heavy dependency.
+"""
+
+
+def import_time_ms(module: str) -> float:
+    """
+    Imports a module in a fresh interpreter with `-X importtime`.
+
+    Parameters:
+        module: The module to import.
+
+    Returns:
+        The cumulative import time of the module, in milliseconds.
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    for line in stderr.splitlines():
+        _, _, cumulative, name = (
+            part.strip() for part in line.replace(":", "|", 1).split("|")
+        )
+        if name == module:
+            return int(cumulative) / 1000
+    raise RuntimeError(f"{module} was not imported")
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args(argv)
+    failed = False
+    for module, budget in BUDGETS_MS.items():
+        median = statistics.median(import_time_ms(module) for _ in range(args.runs))
+        verdict = "ok" if median <= budget else "OVER BUDGET"
+        failed |= median > budget
+        print(f"{module:<16} {median:8.1f} ms  (budget {budget:.0f} ms)  {verdict}")
+    return int(failed)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,424 @@
+# /// script
+# requires-python = ">=3.9"
+# dependencies = [
+#     "pyciv7",
+# ]
+#
+# [tool.uv.sources]
+# pyciv7 = { path = "../", editable = true }
+# ///
+"""
+Measures validation, serialization, SQL planning and full builds of synthetic mods at several
+scales, and compares the results with a stored baseline so regressions show up in review.
+
+Each benchmark is timed over several runs, then run again under `tracemalloc` to measure its
+peak memory and the number of memory blocks it retained (allocated and not freed by the end of
+the run, including its result). Transcrypt is replaced by a stub that writes an empty module, so
+script benchmarks measure pyciv7 rather than Transcrypt. Times are only compared with the
+baseline when every benchmark ran at least `MIN_COMPARED_RUNS` times.
+
+Usage:
+
+    uv run benchmarks/suite.py [--scale small|large] [--filter build] [--runs 5]
+    uv run benchmarks/suite.py --save  # Replaces the baseline with the current results
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from pyciv7.diagnostics import silence
+
+BASELINE_FILE = Path(__file__).with_name("baseline.json")
+"""
+The stored results the current results are compared with.
+"""
+SCALES: Dict[str, Dict[str, List[int]]] = {
+    "small": {
+        "items": [10, 1_000],
+        "criteria": [10, 1_000],
+        "statements": [10, 1_000],
+        "scripts": [10],
+    },
+    "large": {
+        "items": [10, 1_000, 100_000],
+        "criteria": [10, 1_000, 10_000],
+        "statements": [10, 1_000, 10_000],
+        "scripts": [10, 500],
+    },
+}
+"""
+The sizes of the generated mods. `small` runs in seconds, `large` includes the 100k items mods.
+"""
+TIME_TOLERANCE = 1.5
+"""
+A benchmark regressed if it takes longer than its baseline time times this.
+"""
+TIME_NOISE = 0.005
+"""
+Slowdowns shorter than this, in seconds, are ignored: benchmarks of tiny mods are dominated by
+noise.
+"""
+MIN_COMPARED_RUNS = 3
+"""
+The number of runs needed to compare times: the median of fewer runs is too noisy.
+"""
+MEMORY_TOLERANCE = 1.25
+"""
+A benchmark regressed if its peak memory exceeds its baseline peak memory times this.
+"""
+MEMORY_NOISE = 64 * 2**10
+"""
+Peak memory increases smaller than this, in bytes, are ignored: the peak memory of tiny mods
+varies with the state of global caches.
+"""
+
+Benchmark = Tuple[Callable[[], Any], Callable[[], Any]]
+"""
+A function returning the state of a run, and the function timed with that state.
+"""
+
+
+def settings_env(root: Path) -> None:
+    """
+    Points the pyciv7 settings to fake game directories, unless they are set already.
+
+    Parameters:
+        root: The directory the fake game directories are created in.
+    """
+    for name in ("installation", "settings"):
+        (root / name).mkdir(exist_ok=True)
+    os.environ.setdefault("CIV7_INSTALLATION_DIR", str(root / "installation"))
+    os.environ.setdefault("CIV7_SETTINGS_DIR", str(root / "settings"))
+    os.environ.setdefault("CIV7_RELEASE_BIN", str(root / "Civ7.exe"))
+    os.environ.setdefault("PYCIV7_CACHE_DIR", str(root / "cache"))
+
+
+def stub_transcrypt() -> None:
+    """
+    Replaces the `transcrypt` subprocess with a stub writing an empty module per source.
+    """
+    from pyciv7 import modinfo_extensions
+
+    def run_transcrypt(source: Path, outdir: Path, flags=()):
+        (outdir / source.with_suffix(".js").name).write_text(f"// {source.name}")
+
+    modinfo_extensions.run_transcrypt = run_transcrypt  # type: ignore
+
+
+def mod_data(items: int = 0, criteria: int = 0) -> Dict[str, Any]:
+    """
+    Parameters:
+        items: The number of `Item`s, spread over `UpdateDatabase` actions of 1000 items.
+        criteria: The number of `Criteria`, each with an action group.
+
+    Returns:
+        The data of a generated `Mod`.
+    """
+    conditions = [
+        {"kind": "AgeInUse", "age": "AGE_ANTIQUITY"},
+        {"kind": "LeaderPlayable", "leader": "LEADER_ASHOKA"},
+        {"kind": "ModInUse", "value": "shawnee-tecumseh", "version": "1"},
+    ]
+    actions = [
+        {
+            "kind": "UpdateDatabase",
+            "items": [f"data/{i}.xml" for i in range(start, min(start + 1000, items))],
+        }
+        for start in range(0, items, 1000)
+    ]
+    return {
+        "id": "fxs-benchmark",
+        "version": "1",
+        "properties": {"name": "Benchmark", "description": "-", "authors": "-"},
+        "action_criteria": [
+            {"id": "always", "conditions": [{"kind": "AlwaysMet"}]},
+            *(
+                {"id": f"criteria-{i}", "conditions": conditions}
+                for i in range(criteria)
+            ),
+        ],
+        "action_groups": [
+            {"id": "items", "scope": "game", "criteria": "always", "actions": actions},
+            *(
+                {
+                    "id": f"group-{i}",
+                    "scope": "game",
+                    "criteria": f"criteria-{i}",
+                    "actions": [{"kind": "UIScripts", "items": [f"ui/{i}.js"]}],
+                }
+                for i in range(criteria)
+            ),
+        ],
+    }
+
+
+def sql_mod(statements: int, mod_dir: Path) -> Any:
+    """
+    Parameters:
+        statements: The number of SQL statements.
+        mod_dir: The directory of the mod.
+
+    Returns:
+        A generated `Mod` updating the database with SQL statements.
+    """
+    from sqlalchemy import text
+
+    from pyciv7.modinfo import ActionGroup, AlwaysMet, Criteria, Mod, UpdateDatabase
+
+    mod = Mod(
+        id="fxs-benchmark-sql",
+        version="1",
+        action_criteria=[Criteria(id="always", conditions=[AlwaysMet()])],
+        action_groups=[
+            ActionGroup(
+                id="sql",
+                scope="game",
+                criteria="always",
+                actions=[
+                    UpdateDatabase(
+                        items=[
+                            text(f"UPDATE Policies SET Cost = {i} WHERE Id = {i}")
+                            for i in range(statements)
+                        ]
+                    )
+                ],
+            )
+        ],
+    )
+    mod.mod_dir = mod_dir
+    return mod
+
+
+def scripts_mod(scripts: int, mod_dir: Path) -> Any:
+    """
+    Parameters:
+        scripts: The number of Python scripts, written to `mod_dir`.
+        mod_dir: The directory of the mod.
+
+    Returns:
+        A generated `Mod` transpiling Python scripts.
+    """
+    from pyciv7.modinfo import ActionGroup, AlwaysMet, Criteria, Mod
+    from pyciv7.modinfo_extensions import PythonGameScripts
+
+    for i in range(scripts):
+        (mod_dir / f"script_{i}.py").write_text(f"print({i})\n")
+    mod = Mod(
+        id="fxs-benchmark-scripts",
+        version="1",
+        action_criteria=[Criteria(id="always", conditions=[AlwaysMet()])],
+        action_groups=[
+            ActionGroup(
+                id="scripts",
+                scope="game",
+                criteria="always",
+                actions=[
+                    PythonGameScripts(items=[f"script_{i}.py" for i in range(scripts)])
+                ],
+            )
+        ],
+    )
+    mod.mod_dir = mod_dir
+    return mod
+
+
+def benchmarks(scale: Dict[str, List[int]], root: Path) -> Iterator[Tuple[str, Any]]:
+    """
+    Parameters:
+        scale: The sizes of the generated mods, see `SCALES`.
+        root: A temporary directory the mods are built in.
+
+    Returns:
+        An iterator of the names of the benchmarks and their functions, see `Benchmark`.
+    """
+    from pyciv7 import runner
+    from pyciv7.modinfo import Mod
+
+    def fresh_dir() -> Path:
+        return Path(tempfile.mkdtemp(dir=root))
+
+    def validated(data: Dict[str, Any]) -> Callable[[], Any]:
+        def setup() -> Any:
+            mod = Mod.model_validate(data)
+            mod.mod_dir = fresh_dir()
+            return mod
+
+        return setup
+
+    for items in scale["items"]:
+        data = mod_data(items=items)
+        yield f"validate/items-{items}", (lambda data=data: data, Mod.model_validate)
+        yield f"to_xml/items-{items}", (validated(data), lambda mod: mod.to_xml())
+        yield f"build/items-{items}", (validated(data), runner.build)
+    for criteria in scale["criteria"]:
+        data = mod_data(criteria=criteria)
+        yield f"validate/criteria-{criteria}", (
+            lambda data=data: data,
+            Mod.model_validate,
+        )
+        yield f"to_xml/criteria-{criteria}", (validated(data), lambda mod: mod.to_xml())
+    for statements in scale["statements"]:
+        # Planning compiles every statement and derives the name of its SQL file
+        yield f"sql-plan/statements-{statements}", (
+            lambda n=statements: sql_mod(n, fresh_dir()).action_groups[0].actions[0],
+            lambda action: action.build_plan(),
+        )
+        yield f"build/statements-{statements}", (
+            lambda n=statements: sql_mod(n, fresh_dir()),
+            runner.build,
+        )
+    for scripts in scale["scripts"]:
+        yield f"build/scripts-{scripts}", (
+            lambda n=scripts: scripts_mod(n, fresh_dir()),
+            runner.build,
+        )
+
+
+def measure(benchmark: Benchmark, runs: int) -> Dict[str, float]:
+    """
+    Parameters:
+        benchmark: The benchmark.
+        runs: The number of timed runs.
+
+    Returns:
+        The median `time` of the runs in seconds, the `peak_memory` of a run in bytes and the
+        number of memory blocks it retained (`retained_blocks`). Blocks that were allocated and
+        freed during the run are not counted.
+    """
+    setup, function = benchmark
+    # Leaves out one-time costs, such as lazy imports and the resolution of the settings
+    function(setup())
+    durations = []
+    for _ in range(runs):
+        state = setup()
+        gc.collect()
+        start = time.perf_counter()
+        function(state)
+        durations.append(time.perf_counter() - start)
+        del state
+    # Tracing allocations slows everything down, so memory is measured on separate runs,
+    # without the garbage collector so its timing does not change the peak memory. Global
+    # tables such as the interned strings of pathlib occasionally grow in the middle of a run,
+    # so the smallest of two runs is kept
+    peak = kept = sys.maxsize
+    for _ in range(2):
+        state = setup()
+        gc.collect()
+        gc.disable()
+        tracemalloc.start()
+        blocks = sys.getallocatedblocks()
+        try:
+            result = function(state)
+            peak = min(peak, tracemalloc.get_traced_memory()[1])
+            kept = min(kept, sys.getallocatedblocks() - blocks)
+        finally:
+            tracemalloc.stop()
+            gc.enable()
+        del result, state
+    return {
+        "time": statistics.median(durations),
+        "peak_memory": peak,
+        "retained_blocks": kept,
+    }
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    runs: int = MIN_COMPARED_RUNS,
+) -> List[str]:
+    """
+    Parameters:
+        results: The current results.
+        baseline: The stored results.
+        runs: The number of timed runs of the current results. Times are not compared if it is
+            less than `MIN_COMPARED_RUNS`.
+
+    Returns:
+        The names of the benchmarks that regressed.
+    """
+    regressed = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        slower = (
+            runs >= MIN_COMPARED_RUNS
+            and result["time"] > expected["time"] * TIME_TOLERANCE
+            and result["time"] - expected["time"] > TIME_NOISE
+        )
+        larger = (
+            result["peak_memory"] > expected["peak_memory"] * MEMORY_TOLERANCE
+            and result["peak_memory"] - expected["peak_memory"] > MEMORY_NOISE
+        )
+        if slower or larger:
+            regressed.append(name)
+    return regressed
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", choices=list(SCALES), default="small")
+    parser.add_argument("--filter", default="")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args(argv)
+    root = Path(tempfile.mkdtemp(prefix="pyciv7-benchmarks-"))
+    try:
+        settings_env(root)
+        stub_transcrypt()
+        stored = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+        baseline = stored.get("results", {})
+        results = {}
+        for name, benchmark in benchmarks(SCALES[args.scale], root):
+            if args.filter not in name:
+                continue
+            # Recommendations about the generated mods would be printed on every run
+            with silence():
+                results[name] = result = measure(benchmark, args.runs)
+            expected = baseline.get(name)
+            change = (
+                f"{result['time'] / expected['time']:5.2f}x" if expected else "  new"
+            )
+            print(
+                f"{name:<32} {result['time'] * 1000:10.1f} ms  {change}  "
+                f"{result['peak_memory'] / 2**20:8.1f} MiB  "
+                f"{result['retained_blocks']:>9} retained blocks"
+            )
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    if args.save:
+        BASELINE_FILE.write_text(
+            json.dumps(
+                {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "results": {**baseline, **results},
+                },
+                indent=2,
+                sort_keys=True,
+            )
+            + "\n"
+        )
+        return 0
+    if args.runs < MIN_COMPARED_RUNS:
+        print(f"Times are not compared with fewer than {MIN_COMPARED_RUNS} runs")
+    regressed = compare(results, baseline, args.runs)
+    for name in regressed:
+        print(f"Regressed: {name}")
+    return int(bool(regressed))
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,144 @@
+# /// script
+# requires-python = ">=3.9"
+# dependencies = [
+#     "pyciv7",
+# ]
+#
+# [tool.uv.sources]
+# pyciv7 = { path = "../", editable = true }
+# ///
+"""
+Compares the ways of building a large `Mod` from dictionaries: untagged union members, which
+Pydantic validates by trying every member of `Condition` and `Action` in turn, members tagged
+with their `kind`, and `construct_trusted`.
+
+Usage:
+
+    uv run benchmarks/validation.py [--criteria 2000] [--action-groups 2000] [--runs 5]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from pyciv7.diagnostics import silence
+from pyciv7.modinfo import Mod, construct_trusted
+
+CONDITIONS: List[Dict[str, Any]] = [
+    {"kind": "AgeInUse", "age": "AGE_ANTIQUITY"},
+    {"kind": "ModInUse", "value": "shawnee-tecumseh", "version": "1"},
+    {"kind": "LeaderPlayable", "leader": "LEADER_ASHOKA"},
+    {"kind": "CivilizationPlayable", "civilization": "CIVILIZATION_HAN"},
+    {
+        "kind": "ConfigurationValueContains",
+        "group": "Map",
+        "configuration_id": "MapSize",
+        "value": ["LARGE", "HUGE"],
+    },
+]
+"""
+Conditions of the generated criteria. Their members come late in `Condition`, so untagged
+validation tries most members first.
+"""
+ACTIONS: List[Dict[str, Any]] = [
+    {"kind": "UIScripts", "items": ["ui/script.js"]},
+    {"kind": "ScenarioScripts", "items": ["scenario/script.js"]},
+    {"kind": "UpdateArt", "items": ["art/icons.xml"]},
+]
+"""
+Actions of the generated action groups.
+"""
+
+
+def mod_data(criteria: int, action_groups: int, tagged: bool) -> Dict[str, Any]:
+    """
+    Parameters:
+        criteria: The number of `Criteria`.
+        action_groups: The number of `ActionGroup`s.
+        tagged: `True` to keep the `kind` of the union members.
+
+    Returns:
+        The data of a generated `Mod`.
+    """
+
+    def member(data: Dict[str, Any]) -> Dict[str, Any]:
+        return data if tagged else {k: v for k, v in data.items() if k != "kind"}
+
+    return {
+        "id": "fxs-benchmark",
+        "version": "1",
+        "action_criteria": [
+            {
+                "id": f"criteria-{i}",
+                "any": True if i % 2 else None,
+                "conditions": [member(condition) for condition in CONDITIONS],
+            }
+            for i in range(criteria)
+        ],
+        "action_groups": [
+            {
+                "id": f"group-{i}",
+                "scope": "game",
+                "criteria": f"criteria-{i % max(criteria, 1)}",
+                "actions": [member(action) for action in ACTIONS],
+            }
+            for i in range(action_groups)
+        ],
+    }
+
+
+def median_of(runs: int, function: Callable[[], Any]) -> float:
+    """
+    Parameters:
+        runs: The number of runs.
+        function: The function to time.
+
+    Returns:
+        The median duration of the function, in seconds.
+    """
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--criteria", type=int, default=2000)
+    parser.add_argument("--action-groups", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+    untagged = mod_data(args.criteria, args.action_groups, tagged=False)
+    tagged = mod_data(args.criteria, args.action_groups, tagged=True)
+    # Recommendations about the generated mod (e.g. its missing properties) would otherwise
+    # be printed, and timed, on every validation
+    with silence():
+        # Untagged actions are ambiguous (every action validates as `UpdateDatabase`), so only
+        # the tagged ways are compared. Validators normalize some fields, so the XML is
+        # compared.
+        trusted, validated = construct_trusted(Mod, tagged), Mod.model_validate(tagged)
+        trusted.mod_dir = validated.mod_dir = "."
+        assert trusted.to_xml() == validated.to_xml()
+        results = {
+            "untagged model_validate": median_of(
+                args.runs, lambda: Mod.model_validate(untagged)
+            ),
+            "tagged model_validate": median_of(
+                args.runs, lambda: Mod.model_validate(tagged)
+            ),
+            "construct_trusted": median_of(
+                args.runs, lambda: construct_trusted(Mod, tagged)
+            ),
+        }
+    baseline = results["untagged model_validate"]
+    for name, duration in results.items():
+        print(f"{name:<24} {duration * 1000:9.1f} ms  {baseline / duration:5.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -69,7 +69,25 @@ Example:
     ```
 """
 
-from pyciv7.modinfo import Mod
-from pyciv7.runner import build, run
+from typing import TYPE_CHECKING, Any
 
-__all__ = ["build", "run", "Mod"]
+if TYPE_CHECKING:
+    from pyciv7.modinfo import Mod
+    from pyciv7.runner import build, build_async, build_many, run, run_async
+
+__all__ = ["build", "build_async", "build_many", "run", "run_async", "Mod"]
+
+
+def __getattr__(name: str) -> Any:
+    # Submodules are imported on first use, so "import pyciv7" does not pay for importing
+    # pydantic-xml, SQLAlchemy or rich
+    if name == "Mod":
+        from pyciv7.modinfo import Mod as value
+    elif name in ("build", "build_async", "build_many", "run", "run_async"):
+        from pyciv7 import runner
+
+        value = getattr(runner, name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
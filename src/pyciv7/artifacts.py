@@ -0,0 +1,92 @@
+"""
+Module containing the files generated from the items of an action, such as SQL files compiled
+from SQL statements.
+
+Actions plan their artifacts without touching the disk, so a `Mod` can be serialized as often as
+needed. The artifacts are only written when the mod is built.
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+from pyciv7.manifest import BuildManifest
+from pyciv7.tracing import ITEM, span
+from pyciv7.utils import atomic_write_text
+
+
+class Artifact(ABC):
+    """
+    One or more files generated from the items of an action.
+    """
+
+    @property
+    @abstractmethod
+    def outputs(self) -> List[Path]:
+        """
+        The files generated by the artifact.
+        """
+
+    @property
+    def inputs(self) -> List[Path]:
+        """
+        The files the artifact is generated from. Artifacts generated from Python objects, such
+        as SQL statements, have none.
+        """
+        return []
+
+    @abstractmethod
+    def emit(self, manifest: Optional[BuildManifest] = None) -> None:
+        """
+        Generates the `outputs` of the artifact. Outputs that are already up to date are left
+        untouched, so emitting an artifact again is cheap.
+
+        Parameters:
+            manifest: The manifest of the build the outputs are recorded in, if any.
+        """
+
+
+@dataclass(frozen=True)
+class SQLFile(Artifact):
+    """
+    A SQL file compiled from SQL statements.
+    """
+
+    path: Path
+    """
+    The path of the SQL file. Its name is derived from `sql`, see `pyciv7.modinfo.sql_file_name`.
+    """
+    sql: str
+    """
+    The compiled SQL.
+    """
+
+    @property
+    def outputs(self) -> List[Path]:
+        return [self.path]
+
+    def emit(self, manifest: Optional[BuildManifest] = None) -> None:
+        with span("write sql", ITEM, path=self.path.name):
+            if manifest is not None:
+                manifest.write_text(self.path, self.sql)
+            # The file is content-addressed, so an existing file always holds the same SQL
+            elif not self.path.exists():
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                atomic_write_text(self.path, self.sql)
+
+
+@dataclass
+class ActionPlan:
+    """
+    The items an action serializes to and the artifacts those items refer to.
+    """
+
+    items: List[str]
+    """
+    The `Item` paths written to the `.modinfo`, relative to the mod directory.
+    """
+    artifacts: List[Artifact] = field(default_factory=list)
+    """
+    The artifacts that must be emitted before the `.modinfo` is usable.
+    """
@@ -0,0 +1,74 @@
+"""
+Module containing the context shared by every step of a build, such as the resolved `Settings`.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from threading import Event
+from typing import Generator, Optional
+
+from pyciv7.errors import BuildCancelledError
+
+from pyciv7.settings import Settings, get_settings
+
+_current_context: ContextVar[Optional["BuildContext"]] = ContextVar(
+    "pyciv7_build_context", default=None
+)
+
+
+@dataclass
+class BuildContext:
+    """
+    State resolved once per build and shared by the `Mod`, its actions and the runner. Steps of a
+    build that cannot receive the context as an argument, such as serializers, read the active
+    context with `BuildContext.current()`.
+    """
+
+    settings: Settings
+    """
+    The `Settings` used by the build.
+    """
+    cancelled: Event = field(default_factory=Event, compare=False, repr=False)
+    """
+    Set when the build is cancelled, see `cancel`.
+    """
+
+    @classmethod
+    def current(cls) -> "BuildContext":
+        """
+        Returns:
+            The active context, or a context using the memoized `get_settings()` when no build
+            is running.
+        """
+        context = _current_context.get()
+        return context if context is not None else cls(get_settings())
+
+    def cancel(self) -> None:
+        """
+        Stops the build using the context before its next action. The files of the actions
+        emitted so far are kept, but the `.modinfo` is left as it was before the build.
+        """
+        self.cancelled.set()
+
+    def check_cancelled(self) -> None:
+        """
+        Raises:
+            BuildCancelledError: If the build was cancelled.
+        """
+        if self.cancelled.is_set():
+            raise BuildCancelledError("The build was cancelled")
+
+    @contextmanager
+    def activate(self) -> Generator["BuildContext", None, None]:
+        """
+        Makes the context the active one until the context manager exits.
+
+        Returns:
+            A context manager yielding the context.
+        """
+        token = _current_context.set(self)
+        try:
+            yield self
+        finally:
+            _current_context.reset(token)
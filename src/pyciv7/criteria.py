@@ -0,0 +1,450 @@
+"""
+Module evaluating `Criteria` against game configurations, so the `ActionGroup`s a mod activates
+can be checked without launching the game.
+
+Criteria are compiled once, either into predicates over a single `GameConfiguration`, or into
+functions over a `ConfigurationBatch`. A batch indexes many configurations by value and evaluates
+a condition for all of them at once as an integer bitmask, with bit `i` set when configuration `i`
+meets the condition. Combining conditions is then a bitwise `&` or `|` on those integers.
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from itertools import product
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from pyciv7.modinfo import (
+    AgeEverInUse,
+    AgeInUse,
+    AgeWasUsed,
+    AlwaysMet,
+    CivilizationPlayable,
+    Condition,
+    ConfigurationValueContains,
+    ConfigurationValueMatches,
+    Criteria,
+    GameModeInUse,
+    LeaderPlayable,
+    MapInUse,
+    Mod,
+    ModInUse,
+    NeverMet,
+    RuleSetInUse,
+)
+
+
+@dataclass(frozen=True)
+class GameConfiguration:
+    """
+    The setup of a game that `Criteria` are evaluated against. Configurations are hashable, so
+    they can be used in sets or as dictionary keys; `mods` and `values` are compared but left out
+    of the hash since mappings are not hashable.
+    """
+
+    age: str
+    """
+    The current age, e.g. `AGE_ANTIQUITY`.
+    """
+    ages_played: FrozenSet[str] = frozenset()
+    """
+    The ages played before the current one. Advanced Starts do not count.
+    """
+    map: Optional[str] = None
+    """
+    The `File` of the map in use.
+    """
+    ruleset: str = "RULESET_STANDARD"
+    """
+    The ruleset in use.
+    """
+    game_mode: str = "SinglePlayer"
+    """
+    The game mode.
+    """
+    leaders: FrozenSet[str] = frozenset()
+    """
+    The leaders that can be set up as a player.
+    """
+    civilizations: FrozenSet[str] = frozenset()
+    """
+    The civilizations that can be set up as a player.
+    """
+    mods: Mapping[str, str] = field(default_factory=dict, hash=False)
+    """
+    The versions of the active mods and DLC, by id.
+    """
+    values: Mapping[Tuple[str, str], str] = field(default_factory=dict, hash=False)
+    """
+    The values of the game configuration parameters, by `ConfigurationGroup` and
+    `ConfigurationKey`.
+    """
+
+
+def configuration_grid(
+    ages: Iterable[str],
+    leaders: Iterable[Optional[str]] = (None,),
+    game_modes: Iterable[str] = ("SinglePlayer",),
+    mod_sets: Iterable[Mapping[str, str]] = ({},),
+    **fixed: Any,
+) -> Iterator[GameConfiguration]:
+    """
+    Generates every combination of the provided ages, leaders, game modes and sets of active
+    mods.
+
+    Parameters:
+        ages: The current ages.
+        leaders: The leader set up in each configuration, or `None` for no leader.
+        game_modes: The game modes.
+        mod_sets: The active mods of each configuration, as versions by id.
+        fixed: The other fields of `GameConfiguration`, shared by every configuration.
+
+    Returns:
+        An iterator of configurations.
+    """
+    for age, leader, game_mode, mods in product(ages, leaders, game_modes, mod_sets):
+        yield GameConfiguration(
+            age=age,
+            leaders=frozenset() if leader is None else frozenset({leader}),
+            game_mode=game_mode,
+            mods=mods,
+            **fixed,
+        )
+
+
+class ConfigurationBatch:
+    """
+    Configurations indexed by the values conditions test for. The index is built in a single
+    pass, after which evaluating a condition over every configuration costs a dictionary lookup
+    and a few bitwise operations on integers.
+    """
+
+    def __init__(self, configurations: Iterable[GameConfiguration]) -> None:
+        """
+        Parameters:
+            configurations: The configurations to evaluate. Bit `i` of every mask refers to
+                the `i`-th one.
+        """
+        self.configurations: List[GameConfiguration] = list(configurations)
+        # The mask of every configuration
+        self.all = (1 << len(self.configurations)) - 1
+        bits: Dict[Hashable, List[int]] = defaultdict(list)
+        for i, configuration in enumerate(self.configurations):
+            keys: List[Hashable] = [
+                ("age", configuration.age),
+                ("map", configuration.map),
+                ("ruleset", configuration.ruleset),
+                ("game_mode", configuration.game_mode),
+            ]
+            keys.extend(("age_played", age) for age in configuration.ages_played)
+            keys.extend(("leader", leader) for leader in configuration.leaders)
+            keys.extend(
+                ("civilization", civilization)
+                for civilization in configuration.civilizations
+            )
+            for mod_id, version in configuration.mods.items():
+                keys.append(("mod", mod_id))
+                keys.append(("mod", mod_id, version))
+            keys.extend(
+                ("value", group, configuration_id, value)
+                for (group, configuration_id), value in configuration.values.items()
+            )
+            for key in keys:
+                bits[key].append(i)
+        self._masks: Dict[Hashable, int] = {}
+        size = (len(self.configurations) + 7) // 8
+        for key, indices in bits.items():
+            # Setting bits in a buffer is linear, unlike OR-ing ever larger integers
+            buffer = bytearray(size)
+            for i in indices:
+                buffer[i >> 3] |= 1 << (i & 7)
+            self._masks[key] = int.from_bytes(buffer, "little")
+
+    def __len__(self) -> int:
+        return len(self.configurations)
+
+    def mask(self, *key: Hashable) -> int:
+        """
+        Parameters:
+            key: The kind of value, e.g. `"age"`, followed by the value.
+
+        Returns:
+            The mask of the configurations with the value.
+        """
+        return self._masks.get(key, 0)
+
+
+Predicate = Callable[[GameConfiguration], bool]
+BatchPredicate = Callable[[ConfigurationBatch], int]
+
+
+def _compile_predicate(condition: Condition) -> Predicate:
+    if isinstance(condition, AlwaysMet):
+        return lambda configuration: True
+    if isinstance(condition, NeverMet):
+        return lambda configuration: False
+    if isinstance(condition, AgeInUse):
+        age = condition.age
+        return lambda configuration: configuration.age == age
+    if isinstance(condition, AgeWasUsed):
+        age = condition.age
+        return lambda configuration: age in configuration.ages_played
+    if isinstance(condition, AgeEverInUse):
+        age = condition.age
+        return lambda configuration: (
+            configuration.age == age or age in configuration.ages_played
+        )
+    if isinstance(condition, (ConfigurationValueMatches, ConfigurationValueContains)):
+        key = (condition.group, condition.configuration_id)
+        values = (
+            frozenset(condition.value)
+            if isinstance(condition, ConfigurationValueContains)
+            else frozenset({condition.value})
+        )
+        return lambda configuration: configuration.values.get(key) in values
+    if isinstance(condition, MapInUse):
+        path = condition.path
+        return lambda configuration: configuration.map == path
+    if isinstance(condition, RuleSetInUse):
+        ruleset = condition.ruleset
+        return lambda configuration: configuration.ruleset == ruleset
+    if isinstance(condition, GameModeInUse):
+        game_mode = condition.game_mode
+        return lambda configuration: configuration.game_mode == game_mode
+    if isinstance(condition, LeaderPlayable):
+        leader = condition.leader
+        return lambda configuration: leader in configuration.leaders
+    if isinstance(condition, CivilizationPlayable):
+        civilization = condition.civilization
+        return lambda configuration: civilization in configuration.civilizations
+    if isinstance(condition, ModInUse):
+        mod_id, version = condition.value, condition.version
+        if version is None:
+            return lambda configuration: mod_id in configuration.mods
+        return lambda configuration: configuration.mods.get(mod_id) == version
+    raise TypeError(f"Cannot evaluate {type(condition).__name__} conditions")
+
+
+def _compile_batch_predicate(condition: Condition) -> BatchPredicate:
+    if isinstance(condition, AlwaysMet):
+        return lambda batch: batch.all
+    if isinstance(condition, NeverMet):
+        return lambda batch: 0
+    if isinstance(condition, AgeInUse):
+        age = condition.age
+        return lambda batch: batch.mask("age", age)
+    if isinstance(condition, AgeWasUsed):
+        age = condition.age
+        return lambda batch: batch.mask("age_played", age)
+    if isinstance(condition, AgeEverInUse):
+        age = condition.age
+        return lambda batch: batch.mask("age", age) | batch.mask("age_played", age)
+    if isinstance(condition, (ConfigurationValueMatches, ConfigurationValueContains)):
+        group, configuration_id = condition.group, condition.configuration_id
+        values = (
+            list(condition.value)
+            if isinstance(condition, ConfigurationValueContains)
+            else [condition.value]
+        )
+
+        def value_mask(batch: ConfigurationBatch) -> int:
+            mask = 0
+            for value in values:
+                mask |= batch.mask("value", group, configuration_id, value)
+            return mask
+
+        return value_mask
+    if isinstance(condition, MapInUse):
+        path = condition.path
+        return lambda batch: batch.mask("map", path)
+    if isinstance(condition, RuleSetInUse):
+        ruleset = condition.ruleset
+        return lambda batch: batch.mask("ruleset", ruleset)
+    if isinstance(condition, GameModeInUse):
+        game_mode = condition.game_mode
+        return lambda batch: batch.mask("game_mode", game_mode)
+    if isinstance(condition, LeaderPlayable):
+        leader = condition.leader
+        return lambda batch: batch.mask("leader", leader)
+    if isinstance(condition, CivilizationPlayable):
+        civilization = condition.civilization
+        return lambda batch: batch.mask("civilization", civilization)
+    if isinstance(condition, ModInUse):
+        key: Tuple[str, ...] = (
+            ("mod", condition.value)
+            if condition.version is None
+            else ("mod", condition.value, condition.version)
+        )
+        return lambda batch: batch.mask(*key)
+    raise TypeError(f"Cannot evaluate {type(condition).__name__} conditions")
+
+
+class CompiledCriteria:
+    """
+    A `Criteria` compiled into predicates. It is met when all of its conditions are met, or any
+    of them when its `any` is `True`. A criteria without conditions is met unless `any` is
+    `True`.
+    """
+
+    def __init__(self, criteria: Criteria) -> None:
+        """
+        Parameters:
+            criteria: The criteria to compile.
+
+        Raises:
+            TypeError: If a condition is not one of the `Condition` types.
+        """
+        self.id = criteria.id
+        self.any = bool(criteria.any)
+        self._predicates = [_compile_predicate(c) for c in criteria.conditions]
+        self._batch_predicates = [
+            _compile_batch_predicate(c) for c in criteria.conditions
+        ]
+
+    def __call__(self, configuration: GameConfiguration) -> bool:
+        """
+        Parameters:
+            configuration: A game configuration.
+
+        Returns:
+            `True` if the criteria is met in the configuration.
+        """
+        if self.any:
+            return any(predicate(configuration) for predicate in self._predicates)
+        return all(predicate(configuration) for predicate in self._predicates)
+
+    def mask(self, batch: ConfigurationBatch) -> int:
+        """
+        Parameters:
+            batch: The configurations to evaluate.
+
+        Returns:
+            The mask of the configurations of `batch` the criteria is met in.
+        """
+        if self.any:
+            mask = 0
+            for predicate in self._batch_predicates:
+                mask |= predicate(batch)
+                if mask == batch.all:
+                    break
+            return mask
+        mask = batch.all
+        for predicate in self._batch_predicates:
+            if not mask:
+                break
+            mask &= predicate(batch)
+        return mask
+
+
+def compile_criteria(criteria: Criteria) -> CompiledCriteria:
+    """
+    Parameters:
+        criteria: The criteria to compile.
+
+    Returns:
+        The compiled criteria.
+    """
+    return CompiledCriteria(criteria)
+
+
+@dataclass
+class ActivationReport:
+    """
+    The `ActionGroup`s of a mod that fire in each of a set of configurations, see `activation`.
+    """
+
+    configurations: List[GameConfiguration]
+    """
+    The evaluated configurations.
+    """
+    masks: Dict[str, int]
+    """
+    The mask of the configurations each `ActionGroup` fires in, by `ActionGroup` id. Bit `i`
+    refers to the `i`-th configuration.
+    """
+    unknown_criteria: Dict[str, str] = field(default_factory=dict)
+    """
+    The criteria ids that are not defined in the `ActionCriteria` of the mod, by the id of
+    the `ActionGroup` referring to them. Those `ActionGroup`s never fire.
+    """
+
+    def fired(self, index: int) -> List[str]:
+        """
+        Parameters:
+            index: The index of a configuration.
+
+        Returns:
+            The ids of the `ActionGroup`s that fire in the configuration.
+        """
+        bit = 1 << index
+        return [group_id for group_id, mask in self.masks.items() if mask & bit]
+
+    def configurations_of(self, group_id: str) -> List[GameConfiguration]:
+        """
+        Parameters:
+            group_id: The id of an `ActionGroup`.
+
+        Returns:
+            The configurations the `ActionGroup` fires in.
+        """
+        mask = self.masks[group_id]
+        return [
+            configuration
+            for i, configuration in enumerate(self.configurations)
+            if mask >> i & 1
+        ]
+
+    def never_fired(self) -> List[str]:
+        """
+        Returns:
+            The ids of the `ActionGroup`s that fire in none of the configurations.
+        """
+        return [group_id for group_id, mask in self.masks.items() if not mask]
+
+
+def activation(
+    mod: Mod,
+    configurations: Iterable[GameConfiguration],
+    criteria: Sequence[Criteria] = (),
+) -> ActivationReport:
+    """
+    Evaluates which `ActionGroup`s of a mod fire in each configuration, in a single batched
+    pass: every `Criteria` is evaluated once for all configurations.
+
+    Parameters:
+        mod: The mod. Its `lazy_action_groups`, if any, are produced.
+        configurations: The game configurations, e.g. from `configuration_grid`.
+        criteria: Additional criteria the `ActionGroup`s may refer to, besides the
+            `ActionCriteria` of the mod.
+
+    Returns:
+        The `ActionGroup`s that fire in each configuration.
+    """
+    batch = ConfigurationBatch(configurations)
+    compiled: Dict[str, CompiledCriteria] = {
+        c.id: compile_criteria(c) for c in [*criteria, *(mod.action_criteria or [])]
+    }
+    criteria_masks: Dict[str, int] = {}
+    report = ActivationReport(configurations=batch.configurations, masks={})
+    for action_group in mod.iter_action_groups():
+        criteria_id = action_group.criteria
+        if criteria_id not in compiled:
+            report.unknown_criteria[action_group.id] = criteria_id
+            report.masks[action_group.id] = 0
+            continue
+        if criteria_id not in criteria_masks:
+            criteria_masks[criteria_id] = compiled[criteria_id].mask(batch)
+        report.masks[action_group.id] = criteria_masks[criteria_id]
+    return report
@@ -0,0 +1,578 @@
+"""
+Module containing a daemon that builds mods on request over a local Unix socket, and the thin
+client talking to it.
+
+Every build run from the command line pays for starting Python, importing pydantic,
+pydantic-xml, SQLAlchemy and rich, and resolving the `Settings`. The daemon pays for them once.
+It also keeps the `Mod`s defined by each script in memory until the script or a local module it
+imports changes, along with the plans of their actions, so SQL statements are only compiled
+again when they change.
+
+Requests and responses are JSON objects, one per line. A connection can send any number of
+requests, e.g. one per save in an editor. Importing this module for the client only imports the
+standard library.
+
+Usage:
+
+    python -m pyciv7.daemon serve &
+    python -m pyciv7.daemon build path/to/my_mod.py
+    python -m pyciv7.daemon stop
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from pyciv7.errors import DaemonError
+from pyciv7.utils import StrPath
+
+if TYPE_CHECKING:
+    from pyciv7.context import BuildContext
+    from pyciv7.diagnostics import Diagnostic
+    from pyciv7.modinfo import Mod
+    from pyciv7.settings import Settings
+
+COMMANDS = ("ping", "validate", "build", "run", "shutdown")
+"""
+The commands the daemon accepts.
+"""
+
+
+def default_socket_path() -> Path:
+    """
+    Returns:
+        The socket the daemon listens on by default. Set `PYCIV7_SOCKET` to override it.
+    """
+    if os.getenv("PYCIV7_SOCKET"):
+        return Path(os.environ["PYCIV7_SOCKET"])
+    if os.getenv("XDG_RUNTIME_DIR"):
+        return Path(os.environ["XDG_RUNTIME_DIR"]) / "pyciv7.sock"
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    return Path(tempfile.gettempdir()) / f"pyciv7-{uid}.sock"
+
+
+class Client:
+    """
+    Sends requests to a running daemon. Requests of one client are answered in order.
+
+    Example:
+
+        with Client() as client:
+            response = client.build("my_mod.py")
+            print(response["changed"])
+    """
+
+    def __init__(
+        self, socket_path: Optional[Path] = None, timeout: Optional[float] = None
+    ) -> None:
+        """
+        Parameters:
+            socket_path: The socket the daemon listens on. Defaults to `default_socket_path()`.
+            timeout: Seconds to wait for a response. Waits forever by default.
+
+        Raises:
+            OSError: If no daemon listens on the socket.
+        """
+        self.socket_path = socket_path or default_socket_path()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        try:
+            self._socket.connect(str(self.socket_path))
+        except OSError:
+            self._socket.close()
+            raise
+        self._file = self._socket.makefile("rwb")
+
+    def request(self, command: str, **params: Any) -> Dict[str, Any]:
+        """
+        Sends a request and waits for its response.
+
+        Parameters:
+            command: One of `COMMANDS`.
+            params: The parameters of the command.
+
+        Returns:
+            The result of the request.
+
+        Raises:
+            DaemonError: If the request failed.
+        """
+        message = {"command": command, **params}
+        self._file.write(json.dumps(message).encode() + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise DaemonError("The daemon closed the connection")
+        response = json.loads(line)
+        if not response["ok"]:
+            raise DaemonError(
+                f'{response["error"]["type"]}: {response["error"]["message"]}'
+            )
+        return response["result"]
+
+    def _script_request(
+        self, command: str, script: StrPath, mod: Optional[str], **params: Any
+    ) -> Dict[str, Any]:
+        return self.request(
+            command,
+            script=str(Path(script).absolute()),
+            mod=mod,
+            cwd=os.getcwd(),
+            **params,
+        )
+
+    def validate(
+        self, script: StrPath, mod: Optional[str] = None, reload: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Runs a script defining `Mod`s, unless it did not change since it last ran.
+
+        Parameters:
+            script: The Python script defining the `Mod`s.
+            mod: The `id` of a `Mod` of the script. Every `Mod` is described by default.
+            reload: `True` to run the script even if neither it nor the local modules it
+                imports changed, e.g. because a data file it reads changed.
+
+        Returns:
+            The `mods` of the script and the `diagnostics` reported while validating them.
+        """
+        return self._script_request("validate", script, mod, reload=reload)
+
+    def build(
+        self, script: StrPath, mod: Optional[str] = None, reload: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Builds a `Mod` defined by a script, overwriting its previous build.
+
+        Parameters:
+            script: The Python script defining the `Mod`.
+            mod: The `id` of the `Mod`. Only needed if the script defines several `Mod`s.
+            reload: `True` to run the script even if neither it nor its local imports changed.
+
+        Returns:
+            The `mod` built, its `mod_dir`, the `changed` files and the `diagnostics`.
+        """
+        return self._script_request("build", script, mod, reload=reload)
+
+    def run(
+        self,
+        script: StrPath,
+        mod: Optional[str] = None,
+        reload: bool = False,
+        debug: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Builds a `Mod` defined by a script, then runs the game until it exits.
+
+        Parameters:
+            script: The Python script defining the `Mod`.
+            mod: The `id` of the `Mod`. Only needed if the script defines several `Mod`s.
+            reload: `True` to run the script even if neither it nor its local imports changed.
+            debug: `True` if the game should be ran in debug mode.
+
+        Returns:
+            The same result as `build`.
+        """
+        return self._script_request("run", script, mod, reload=reload, debug=debug)
+
+    def ping(self) -> Dict[str, Any]:
+        """
+        Returns:
+            The `pid` of the daemon and how many `scripts` it keeps in memory.
+        """
+        return self.request("ping")
+
+    def shutdown(self) -> None:
+        """
+        Stops the daemon once the requests being answered are done.
+        """
+        self.request("shutdown")
+
+    def close(self) -> None:
+        """
+        Closes the connection.
+        """
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+@dataclass
+class ScriptSnapshot:
+    """
+    The `Mod`s defined by a script, kept until the script or a local module it imports changes.
+    """
+
+    stamp: Tuple[Tuple[Path, int, int], ...]
+    """
+    The path, modification time and size of the script and of each local module it imports,
+    see `pyciv7.transpile_cache.local_imports`, when it ran.
+    """
+    mods: Dict[str, "Mod"]
+    """
+    The `Mod`s of the script, by `id`.
+    """
+    diagnostics: List[Tuple["Diagnostic", int]] = field(default_factory=list)
+    """
+    The diagnostics reported while running the script, and how many times each was reported.
+    """
+
+
+def _stamp(paths: Iterable[Path]) -> Tuple[Tuple[Path, int, int], ...]:
+    stamp = []
+    for path in paths:
+        try:
+            stat = path.stat()
+        except OSError:
+            stamp.append((path, -1, -1))
+        else:
+            stamp.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(stamp)
+
+
+def _evict_modules(paths: Set[Path]) -> None:
+    for name, module in list(sys.modules.items()):
+        file = getattr(module, "__file__", None)
+        if file and Path(file).resolve() in paths:
+            del sys.modules[name]
+
+
+class Daemon:
+    """
+    Answers the requests of clients. Requests of different clients are answered concurrently,
+    except for validating and building, which run one at a time since scripts are run in the
+    working directory of the client.
+    """
+
+    def __init__(
+        self,
+        socket_path: Optional[Path] = None,
+        settings_factory: Optional[Callable[[], "Settings"]] = None,
+    ) -> None:
+        """
+        Parameters:
+            socket_path: The socket to listen on. Defaults to `default_socket_path()`.
+            settings_factory: Creates the common `Settings` for pyciv7, once. Defaults to the
+                memoized `get_settings()`.
+        """
+        # Everything a build needs is imported up front, so requests never wait on imports
+        from pyciv7 import modinfo_extensions, runner, sql  # noqa: F401
+        from pyciv7.context import BuildContext
+        from pyciv7.settings import get_settings
+
+        self.socket_path = socket_path or default_socket_path()
+        self.context: "BuildContext" = BuildContext(
+            (settings_factory or get_settings)()
+        )
+        self.snapshots: Dict[Path, ScriptSnapshot] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[Any] = None
+
+    def serve(self, ready: Optional[threading.Event] = None) -> None:
+        """
+        Listens on the socket until a client sends `shutdown` or the process is interrupted.
+
+        Parameters:
+            ready: An event set once the daemon accepts connections.
+
+        Raises:
+            DaemonError: If another daemon already listens on the socket.
+        """
+        import socketserver
+
+        if self.socket_path.exists():
+            try:
+                Client(self.socket_path).close()
+            except OSError:
+                # Left behind by a daemon that did not stop cleanly
+                self.socket_path.unlink()
+            else:
+                raise DaemonError(f"A daemon already listens on {self.socket_path}")
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                for line in self.rfile:
+                    self.wfile.write(json.dumps(daemon.answer(line)).encode() + b"\n")
+                    self.wfile.flush()
+
+        class Server(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        # Clients run arbitrary scripts, so only the user may connect
+        umask = os.umask(0o177)
+        try:
+            self._server = Server(str(self.socket_path), Handler)
+        finally:
+            os.umask(umask)
+        try:
+            if ready is not None:
+                ready.set()
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self.socket_path.unlink(missing_ok=True)
+
+    def shutdown(self) -> None:
+        """
+        Stops `serve` from another thread.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+
+    def answer(self, line: bytes) -> Dict[str, Any]:
+        """
+        Parameters:
+            line: A request.
+
+        Returns:
+            The response to the request: `ok` and either its `result` or the `error` it raised,
+            and its `duration` in seconds.
+        """
+        start = time.perf_counter()
+        try:
+            request = json.loads(line)
+            command = request.pop("command")
+            if command not in COMMANDS:
+                raise ValueError(f"Unknown command: {command}")
+            result = getattr(self, f"_{command}")(**request)
+        except Exception as e:
+            return {
+                "ok": False,
+                "error": {"type": type(e).__name__, "message": str(e)},
+                "duration": time.perf_counter() - start,
+            }
+        return {"ok": True, "result": result, "duration": time.perf_counter() - start}
+
+    def snapshot(self, script: Path, reload: bool = False) -> ScriptSnapshot:
+        """
+        Parameters:
+            script: The Python script defining the `Mod`s.
+            reload: `True` to run the script even if neither it nor its local imports changed.
+
+        Returns:
+            The `Mod`s of the script, running it again only if it changed.
+        """
+        from pyciv7.diagnostics import collect
+        from pyciv7.runner import load_mods
+        from pyciv7.transpile_cache import local_imports
+
+        snapshot = self.snapshots.get(script)
+        if (
+            snapshot is None
+            or reload
+            or _stamp(path for path, _, _ in snapshot.stamp) != snapshot.stamp
+        ):
+            imports = local_imports(script)
+            stamp = _stamp([script, *sorted(imports)])
+            # The modules imported by the previous run are cached, so they are evicted to
+            # run the script against their current code
+            if snapshot is not None:
+                imports.update(path for path, _, _ in snapshot.stamp[1:])
+            _evict_modules(imports)
+            with collect() as diagnostics:
+                mods = load_mods(script)
+            snapshot = ScriptSnapshot(
+                stamp,
+                {mod.id: mod for mod in mods},
+                list(diagnostics.counts.items()),
+            )
+            self.snapshots[script] = snapshot
+        return snapshot
+
+    def _describe(self, snapshot: ScriptSnapshot) -> List[Dict[str, Any]]:
+        return [
+            {
+                "code": diagnostic.code,
+                "field": diagnostic.field,
+                "model_id": diagnostic.model_id,
+                "message": diagnostic.message,
+                "count": count,
+            }
+            for diagnostic, count in snapshot.diagnostics
+        ]
+
+    @contextmanager
+    def _in_directory(self, cwd: Optional[str]) -> Generator[None, None, None]:
+        # The working directory is shared by every thread, hence the lock
+        with self._lock:
+            previous = os.getcwd()
+            if cwd:
+                os.chdir(cwd)
+            try:
+                yield
+            finally:
+                os.chdir(previous)
+
+    def _select(self, snapshot: ScriptSnapshot, mod: Optional[str]) -> "Mod":
+        if mod is None:
+            if len(snapshot.mods) != 1:
+                raise ValueError(
+                    f"The script defines {len(snapshot.mods)} mods, pick one of: "
+                    + ", ".join(snapshot.mods)
+                )
+            return next(iter(snapshot.mods.values()))
+        if mod not in snapshot.mods:
+            raise ValueError(f'The script does not define "{mod}"')
+        return snapshot.mods[mod]
+
+    def _ping(self) -> Dict[str, Any]:
+        return {"pid": os.getpid(), "scripts": len(self.snapshots)}
+
+    def _validate(
+        self,
+        script: str,
+        mod: Optional[str] = None,
+        cwd: Optional[str] = None,
+        reload: bool = False,
+    ) -> Dict[str, Any]:
+        with self._in_directory(cwd):
+            snapshot = self.snapshot(Path(script), reload)
+            mods = [self._select(snapshot, mod)] if mod else snapshot.mods.values()
+            return {
+                "mods": [
+                    {
+                        "id": value.id,
+                        "version": value.version,
+                        "action_groups": len(value.action_groups or []),
+                    }
+                    for value in mods
+                ],
+                "diagnostics": self._describe(snapshot),
+            }
+
+    def _build(
+        self,
+        script: str,
+        mod: Optional[str] = None,
+        cwd: Optional[str] = None,
+        reload: bool = False,
+    ) -> Dict[str, Any]:
+        from pyciv7.runner import build
+
+        with self._in_directory(cwd):
+            snapshot = self.snapshot(Path(script), reload)
+            selected = self._select(snapshot, mod)
+            manifest = build(selected, overwrite=True, context=self.context)
+            return {
+                "mod": selected.id,
+                "mod_dir": str(selected.mod_dir),
+                "changed": [str(path) for path in manifest.changed],
+                "diagnostics": self._describe(snapshot),
+            }
+
+    def _run(
+        self,
+        script: str,
+        mod: Optional[str] = None,
+        cwd: Optional[str] = None,
+        reload: bool = False,
+        debug: bool = True,
+    ) -> Dict[str, Any]:
+        from pyciv7.runner import debug_settings_enabled, launch
+
+        result = self._build(script, mod, cwd, reload)
+        # Other clients can build while the game runs
+        if debug:
+            with debug_settings_enabled(self.context.settings):
+                launch(self.context.settings, debug)
+        else:
+            launch(self.context.settings, debug)
+        return result
+
+    def _shutdown(self) -> Dict[str, Any]:
+        # Stopping the server waits for the request being answered, i.e. this one
+        threading.Thread(target=self.shutdown).start()
+        return {}
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m pyciv7.daemon", description=__doc__.splitlines()[1]
+    )
+    parser.add_argument("--socket", type=Path, default=None)
+    parser.add_argument("--json", action="store_true", help="print raw responses")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("serve")
+    commands.add_parser("ping")
+    commands.add_parser("stop")
+    for command in ("validate", "build", "run"):
+        subparser = commands.add_parser(command)
+        subparser.add_argument("script", type=Path)
+        subparser.add_argument("--mod", default=None)
+        subparser.add_argument("--reload", action="store_true")
+        if command == "run":
+            subparser.add_argument("--release", action="store_true")
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        try:
+            Daemon(args.socket).serve()
+        except KeyboardInterrupt:
+            pass
+        return 0
+    try:
+        with Client(args.socket) as client:
+            if args.command == "ping":
+                result = client.ping()
+            elif args.command == "stop":
+                result = {}
+                client.shutdown()
+            elif args.command == "run":
+                result = client.run(
+                    args.script, args.mod, args.reload, debug=not args.release
+                )
+            else:
+                result = getattr(client, args.command)(
+                    args.script, args.mod, args.reload
+                )
+    except OSError as e:
+        print(
+            f"No daemon listens on {args.socket or default_socket_path()}: {e}",
+            file=sys.stderr,
+        )
+        return 2
+    except DaemonError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return 0
+    for diagnostic in result.get("diagnostics", []):
+        print(f'{diagnostic["message"]} [{diagnostic["code"]}: {diagnostic["field"]}]')
+    if "changed" in result:
+        print(f'Built "{result["mod"]}": {len(result["changed"])} file(s) changed')
+    elif "mods" in result:
+        print(", ".join(mod["id"] for mod in result["mods"]) or "No mods")
+    elif "pid" in result:
+        print(f'Daemon {result["pid"]} keeps {result["scripts"]} script(s) in memory')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,241 @@
+"""
+Module collecting the recommendations reported while validating mods, such as a missing `Name` in
+the `Properties` of a `Mod`.
+
+Diagnostics go to the active sink. By default they are printed right away, like they always were.
+`collect` gathers them instead, deduplicated, and can print them once it exits, e.g. at the end of
+a build. `silence` drops them before any message is formatted, which costs nothing when
+generating mods in bulk.
+
+Example:
+
+    with collect(render=True) as diagnostics:
+        mod = make_mod()
+        pyciv7.build(mod)
+    assert not diagnostics.by_code("mod-id-not-ascii")
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Final, Generator, List, Optional, Tuple
+
+from pyciv7.utils import rich_print as print
+
+MESSAGES: Final[Dict[str, str]] = {
+    "properties-missing-name": (
+        "It is recommended the .modinfo Properties includes a name."
+    ),
+    "properties-missing-description": (
+        "It is recommended the .modinfo Properties includes a description."
+    ),
+    "properties-missing-authors": (
+        "It is recommended the .modinfo Properties includes an author(s)."
+    ),
+    "mod-id-too-long": (
+        "It is recommended that the .modinfo ID is less than {max_length} characters"
+    ),
+    "mod-id-not-ascii": (
+        "It is recommended that the .modinfo ID is composed solely of ASCII characters"
+    ),
+    "mod-id-not-lowercase": (
+        "It is recommended that the .modinfo ID is composed solely of lowercase "
+        "characters, and dashes instead of underscores or spaces"
+    ),
+    "mod-missing-properties": 'It is recommended you define a "Properties" element',
+}
+"""
+The message of each diagnostic code. Messages are `str.format` templates filled with the
+parameters of the diagnostic.
+"""
+
+
+@dataclass(frozen=True)
+class Diagnostic:
+    """
+    A recommendation reported while validating a model.
+    """
+
+    code: str
+    """
+    Identifies the kind of diagnostic, see `MESSAGES`.
+    """
+    field: str
+    """
+    The path of the field the diagnostic is about, e.g. `Properties.name`.
+    """
+    model_id: Optional[str] = None
+    """
+    The id of the model the field belongs to, if it has one, e.g. the id of a `Mod`.
+    """
+    params: Tuple[Tuple[str, Any], ...] = ()
+    """
+    The parameters of the message.
+    """
+
+    @property
+    def message(self) -> str:
+        """
+        The formatted message of the diagnostic.
+        """
+        return MESSAGES[self.code].format(**dict(self.params))
+
+    def render(self) -> str:
+        """
+        Returns:
+            The message with the `rich` markup used to print it.
+        """
+        return f"[yellow]{self.message}"
+
+
+class DiagnosticSink:
+    """
+    Receives the diagnostics of validators. The base sink prints each diagnostic right away.
+    """
+
+    def report(self, diagnostic: Diagnostic) -> None:
+        """
+        Parameters:
+            diagnostic: The reported diagnostic.
+        """
+        print(diagnostic.render())
+
+
+class SilentSink(DiagnosticSink):
+    """
+    Drops every diagnostic. `warn` checks for it before building a diagnostic, so nothing is
+    allocated nor formatted.
+    """
+
+    def report(self, diagnostic: Diagnostic) -> None:
+        pass
+
+
+@dataclass
+class CollectingSink(DiagnosticSink):
+    """
+    Keeps the diagnostics, deduplicated: a diagnostic reported again, e.g. because a model was
+    validated again after an assignment, is only counted.
+    """
+
+    counts: Dict[Diagnostic, int] = field(default_factory=dict)
+    """
+    The number of times each diagnostic was reported, in order of first report.
+    """
+
+    def report(self, diagnostic: Diagnostic) -> None:
+        self.counts[diagnostic] = self.counts.get(diagnostic, 0) + 1
+
+    @property
+    def diagnostics(self) -> List[Diagnostic]:
+        """
+        The distinct diagnostics, in order of first report.
+        """
+        return list(self.counts)
+
+    def by_code(self, code: str) -> List[Diagnostic]:
+        """
+        Parameters:
+            code: A diagnostic code.
+
+        Returns:
+            The distinct diagnostics with the code.
+        """
+        return [diagnostic for diagnostic in self.counts if diagnostic.code == code]
+
+    def render(self) -> None:
+        """
+        Prints every distinct diagnostic once, with the number of times it was reported.
+        """
+        for diagnostic, count in self.counts.items():
+            where = diagnostic.field
+            if diagnostic.model_id is not None:
+                where = f"{diagnostic.model_id}: {where}"
+            suffix = f" (x{count})" if count > 1 else ""
+            print(f"{diagnostic.render()} [dim]\\[{diagnostic.code}, {where}]{suffix}")
+
+    def clear(self) -> None:
+        """
+        Forgets every diagnostic.
+        """
+        self.counts.clear()
+
+
+_default_sink: Final[DiagnosticSink] = DiagnosticSink()
+_current_sink: ContextVar[DiagnosticSink] = ContextVar(
+    "pyciv7_diagnostic_sink", default=_default_sink
+)
+
+
+def current_sink() -> DiagnosticSink:
+    """
+    Returns:
+        The sink diagnostics are currently reported to.
+    """
+    return _current_sink.get()
+
+
+def warn(code: str, field: str, model_id: Optional[str] = None, **params: Any) -> None:
+    """
+    Reports a diagnostic to the active sink.
+
+    Parameters:
+        code: The code of the diagnostic, see `MESSAGES`.
+        field: The path of the field the diagnostic is about.
+        model_id: The id of the model the field belongs to, if any.
+        params: The parameters of the message.
+    """
+    sink = _current_sink.get()
+    if isinstance(sink, SilentSink):
+        return
+    sink.report(Diagnostic(code, field, model_id, tuple(sorted(params.items()))))
+
+
+@contextmanager
+def use_sink(sink: DiagnosticSink) -> Generator[DiagnosticSink, None, None]:
+    """
+    Reports diagnostics to `sink` until the context manager exits.
+
+    Parameters:
+        sink: The sink.
+
+    Returns:
+        A context manager yielding the sink.
+    """
+    token = _current_sink.set(sink)
+    try:
+        yield sink
+    finally:
+        _current_sink.reset(token)
+
+
+@contextmanager
+def collect(render: bool = False) -> Generator[CollectingSink, None, None]:
+    """
+    Collects diagnostics until the context manager exits.
+
+    Parameters:
+        render: `True` to print the collected diagnostics when the context manager exits.
+
+    Returns:
+        A context manager yielding the collecting sink.
+    """
+    sink = CollectingSink()
+    with use_sink(sink):
+        try:
+            yield sink
+        finally:
+            if render:
+                sink.render()
+
+
+@contextmanager
+def silence() -> Generator[SilentSink, None, None]:
+    """
+    Drops diagnostics until the context manager exits.
+
+    Returns:
+        A context manager yielding the silent sink.
+    """
+    with use_sink(SilentSink()) as sink:
+        yield sink  # type: ignore
@@ -5,3 +5,12 @@ class ModDirSerializationError(Exception): ...
 
 
 class ModExistsError(Exception): ...
+
+
+class LazySourceConsumedError(Exception): ...
+
+
+class BuildCancelledError(Exception): ...
+
+
+class DaemonError(Exception): ...
@@ -0,0 +1,500 @@
+"""
+Module containing an index of the mods installed for Civilization 7, built from their `.modinfo`
+files without validating them with the Pydantic models of `pyciv7.modinfo`.
+"""
+
+import json
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Final,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+from xml.etree import ElementTree
+
+from pyciv7.settings import Settings, cache_dir, get_settings
+from pyciv7.utils import atomic_write_text
+
+if TYPE_CHECKING:
+    from pyciv7.modinfo import Mod
+
+INDEX_FILE_NAME: Final[str] = "mod-index.json"
+INDEX_FORMAT_VERSION: Final[int] = 1
+PARALLEL_SCAN_MIN_FILES: Final[int] = 256
+"""
+Number of `.modinfo` files to read below which `ModIndex.scan` does not start worker processes,
+since starting them costs more than reading the files.
+"""
+
+
+@dataclass(frozen=True)
+class IndexedActionGroup:
+    """
+    The attributes of an `ActionGroup` of an indexed mod.
+    """
+
+    id: str
+    scope: str
+    criteria: str
+    load_order: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class IndexedMod:
+    """
+    The summary of a `.modinfo` file kept by `ModIndex`.
+    """
+
+    id: str
+    """
+    The id of the mod.
+    """
+    version: str
+    """
+    The version of the mod.
+    """
+    path: Optional[Path]
+    """
+    The `.modinfo` file of the mod, or `None` for a `Mod` without a `mod_dir`.
+    """
+    name: Optional[str] = None
+    """
+    The `Name` of the mod's `Properties`, if any. Usually a localization key.
+    """
+    dependencies: Tuple[str, ...] = ()
+    """
+    The ids of the mods this mod depends on.
+    """
+    references: Tuple[str, ...] = ()
+    """
+    The ids of the mods this mod references.
+    """
+    action_groups: Tuple[IndexedActionGroup, ...] = field(default=())
+    """
+    The action groups of the mod.
+    """
+
+    @property
+    def scopes(self) -> Tuple[str, ...]:
+        """
+        The distinct scopes of the action groups of the mod, in order of appearance.
+        """
+        return tuple(dict.fromkeys(group.scope for group in self.action_groups))
+
+    @classmethod
+    def from_mod(cls, mod: "Mod") -> "IndexedMod":
+        """
+        Summarizes a `Mod` like its `.modinfo` would be. Its `lazy_action_groups` are left out,
+        since producing them would consume them.
+
+        Parameters:
+            mod: The mod.
+
+        Returns:
+            The summary of the mod.
+        """
+        return cls(
+            id=mod.id,
+            version=mod.version,
+            path=Path(mod.mod_dir) / ".modinfo" if mod.mod_dir else None,
+            name=mod.properties.name if mod.properties else None,
+            dependencies=tuple(child.id for child in mod.dependencies or []),
+            references=tuple(child.id for child in mod.references or []),
+            action_groups=tuple(
+                IndexedActionGroup(
+                    group.id, group.scope, group.criteria, group.load_order
+                )
+                for group in mod.action_groups or []
+            ),
+        )
+
+    def to_json(self) -> Dict[str, Any]:
+        """
+        Returns:
+            The mod as JSON-compatible data, see `from_json`.
+        """
+        data = asdict(self)
+        data["path"] = None if self.path is None else str(self.path)
+        return data
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "IndexedMod":
+        """
+        Parameters:
+            data: A mod converted with `to_json`.
+
+        Returns:
+            The mod.
+        """
+        return cls(
+            id=data["id"],
+            version=data["version"],
+            path=None if data["path"] is None else Path(data["path"]),
+            name=data["name"],
+            dependencies=tuple(data["dependencies"]),
+            references=tuple(data["references"]),
+            action_groups=tuple(
+                IndexedActionGroup(**group) for group in data["action_groups"]
+            ),
+        )
+
+
+class _ModinfoTarget:
+    # Parser target receiving the elements of a .modinfo from expat one at a time. No element
+    # tree is built, so memory stays flat however large the file is.
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.mod_id: Optional[str] = None
+        self.version: Optional[str] = None
+        self.name: Optional[str] = None
+        self.dependencies: List[str] = []
+        self.references: List[str] = []
+        self.action_groups: List[IndexedActionGroup] = []
+        self.group: Optional[Dict[str, Any]] = None
+        self.stack: List[str] = []
+        self.text: Optional[List[str]] = None
+
+    def start(self, tag: str, attrib: Dict[str, str]) -> None:
+        # The "ModInfo" xmlns places every element in a namespace
+        tag = tag.rsplit("}", 1)[-1]
+        stack = self.stack
+        parent = stack[-1] if stack else None
+        stack.append(tag)
+        if parent is None:
+            if tag != "Mod":
+                raise ValueError(f'{self.path} is not a .modinfo: root is "{tag}"')
+            self.mod_id = attrib.get("id")
+            self.version = attrib.get("version")
+        elif tag == "Mod" and parent == "Dependencies":
+            if attrib.get("id"):
+                self.dependencies.append(attrib["id"])
+        elif tag == "Mod" and parent == "References":
+            if attrib.get("id"):
+                self.references.append(attrib["id"])
+        elif tag == "ActionGroup" and parent == "ActionGroups":
+            self.group = {
+                "id": attrib.get("id", ""),
+                "scope": attrib.get("scope", ""),
+                "criteria": attrib.get("criteria", ""),
+            }
+        elif parent == "Properties" and (
+            (tag == "Name" and len(stack) == 3)
+            or (tag == "LoadOrder" and self.group is not None)
+        ):
+            self.text = []
+
+    def data(self, data: str) -> None:
+        if self.text is not None:
+            self.text.append(data)
+
+    def end(self, tag: str) -> None:
+        tag = self.stack.pop()
+        if self.text is not None:
+            text = "".join(self.text).strip()
+            self.text = None
+            if tag == "Name":
+                self.name = text or None
+            else:
+                try:
+                    self.group["load_order"] = int(text)  # type: ignore
+                except ValueError:
+                    pass
+        elif tag == "ActionGroup" and self.group is not None:
+            self.action_groups.append(IndexedActionGroup(**self.group))
+            self.group = None
+
+    def close(self) -> IndexedMod:
+        if self.mod_id is None:
+            raise ValueError(f'{self.path} has no "id"')
+        return IndexedMod(
+            id=self.mod_id,
+            version=self.version or "",
+            path=self.path,
+            name=self.name,
+            dependencies=tuple(self.dependencies),
+            references=tuple(self.references),
+            action_groups=tuple(self.action_groups),
+        )
+
+
+def read_modinfo(path: Path) -> IndexedMod:
+    """
+    Reads the summary of a `.modinfo` file with a streaming parser. The file is read in chunks
+    and its elements are never kept, nor validated.
+
+    Parameters:
+        path: The `.modinfo` file.
+
+    Returns:
+        The summary of the mod.
+
+    Raises:
+        ValueError: If the file is not well-formed XML or its root is not a `Mod`.
+    """
+    parser = ElementTree.XMLParser(target=_ModinfoTarget(path))
+    try:
+        with open(path, "rb") as file:
+            while chunk := file.read(64 * 1024):
+                parser.feed(chunk)
+        return parser.close()
+    except ElementTree.ParseError as e:
+        raise ValueError(f"{path} is not well-formed: {e}") from e
+
+
+def default_roots(settings: Optional[Settings] = None) -> List[Path]:
+    """
+    Parameters:
+        settings: Common `Settings` for pyciv7. Defaults to the memoized `get_settings()`.
+
+    Returns:
+        The directories mods are installed in: the user's `Mods` directory, the DLC of the
+        installation and its base modules, such as `core` and `base-standard`.
+    """
+    settings = settings or get_settings()
+    return [
+        settings.civ7_settings_dir / "Mods",
+        settings.civ7_installation_dir / "DLC",
+        settings.civ7_installation_dir / "Base" / "modules",
+    ]
+
+
+def find_modinfo_files(roots: Iterable[Path]) -> Iterator[Path]:
+    """
+    Parameters:
+        roots: Directories to search recursively. Missing directories are skipped.
+
+    Returns:
+        An iterator of the `.modinfo` files under the directories, in the order of `roots`, then
+        of their paths, so scans always find the files in the same order.
+    """
+    for root in roots:
+        for directory, directories, files in os.walk(root):
+            # Sorted in place, so the sub-directories are walked in order
+            directories.sort()
+            for file in sorted(files):
+                if file.endswith(".modinfo"):
+                    yield Path(directory) / file
+
+
+class ModIndex:
+    """
+    An index of installed mods supporting queries such as "which mods depend on X".
+
+    `ModIndex.scan` reads the `.modinfo` files in parallel worker processes and caches their
+    summaries on disk. Files whose path, size and modification time did not change since the
+    previous scan are not read again, so scans after the first one only cost a directory walk.
+    """
+
+    def __init__(
+        self, mods: Iterable[IndexedMod], errors: Optional[Dict[Path, str]] = None
+    ) -> None:
+        """
+        Parameters:
+            mods: The indexed mods.
+            errors: The `.modinfo` files that could not be read, with the reason.
+        """
+        self.mods: List[IndexedMod] = list(mods)
+        self.errors: Dict[Path, str] = errors or {}
+        self._by_id: Dict[str, IndexedMod] = {}
+        self._dependents: Dict[str, List[IndexedMod]] = defaultdict(list)
+        self._referrers: Dict[str, List[IndexedMod]] = defaultdict(list)
+        for mod in self.mods:
+            # Mods installed more than once resolve to the first copy found, see
+            # `find_modinfo_files`
+            self._by_id.setdefault(mod.id, mod)
+            for dependency in dict.fromkeys(mod.dependencies):
+                self._dependents[dependency].append(mod)
+            for reference in dict.fromkeys(mod.references):
+                self._referrers[reference].append(mod)
+
+    @classmethod
+    def scan(
+        cls,
+        roots: Optional[Sequence[Path]] = None,
+        settings: Optional[Settings] = None,
+        cache_file: Optional[Path] = None,
+        use_cache: bool = True,
+        max_workers: Optional[int] = None,
+    ) -> "ModIndex":
+        """
+        Indexes every `.modinfo` file under `roots`.
+
+        Parameters:
+            roots: The directories to scan. Defaults to `default_roots(settings)`.
+            settings: Common `Settings` for pyciv7. Defaults to the memoized `get_settings()`.
+            cache_file: The on-disk index. Defaults to `mod-index.json` in
+                `pyciv7.settings.cache_dir()`.
+            use_cache: `False` to read every file again and leave the on-disk index alone.
+            max_workers: The maximum number of files read at the same time. Defaults to the
+                number of CPUs.
+
+        Returns:
+            The index.
+        """
+        roots = default_roots(settings) if roots is None else roots
+        cache_file = cache_file or cache_dir() / INDEX_FILE_NAME
+        cached = _read_index_cache(cache_file) if use_cache else {}
+        # Filled in the order the files are found, whether they are cached or read again
+        entries: Dict[str, Dict[str, Any]] = {}
+        stale: List[Tuple[str, Path, os.stat_result]] = []
+        for path in find_modinfo_files(roots):
+            key = str(path.absolute())
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entry = cached.get(key)
+            if (
+                entry is not None
+                and entry["size"] == stat.st_size
+                and entry["mtime_ns"] == stat.st_mtime_ns
+            ):
+                entries[key] = entry
+            else:
+                entries[key] = {}
+                stale.append((key, path, stat))
+
+        if stale:
+            paths = [path for _, path, _ in stale]
+            max_workers = min(max_workers or os.cpu_count() or 1, len(paths))
+            if max_workers > 1 and len(paths) >= PARALLEL_SCAN_MIN_FILES:
+                # Parsing holds the GIL, so the files are read by worker processes
+                with ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                ) as executor:
+                    results = list(
+                        executor.map(
+                            _read_entry,
+                            paths,
+                            chunksize=max(len(paths) // (max_workers * 4), 1),
+                        )
+                    )
+            else:
+                results = [_read_entry(path) for path in paths]
+            for (key, _, stat), result in zip(stale, results):
+                entries[key] = {
+                    **result,
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                }
+        if use_cache:
+            # Entries of the files outside of `roots` are kept for the scans of other roots
+            scanned = [Path(root).absolute() for root in roots]
+            others = {
+                key: entry
+                for key, entry in cached.items()
+                if not any(_is_within(Path(key), root) for root in scanned)
+            }
+            if stale or len(others) + len(entries) != len(cached):
+                _write_index_cache(cache_file, {**others, **entries})
+        mods = []
+        errors = {}
+        for key, entry in entries.items():
+            if "mod" in entry:
+                mods.append(IndexedMod.from_json(entry["mod"]))
+            else:
+                errors[Path(key)] = entry["error"]
+        return cls(mods, errors)
+
+    def __len__(self) -> int:
+        return len(self.mods)
+
+    def __iter__(self) -> Iterator[IndexedMod]:
+        return iter(self.mods)
+
+    def __contains__(self, mod_id: object) -> bool:
+        return mod_id in self._by_id
+
+    def get(self, mod_id: str) -> Optional[IndexedMod]:
+        """
+        Parameters:
+            mod_id: The id of a mod.
+
+        Returns:
+            The mod with the id, or `None` if it is not installed.
+        """
+        return self._by_id.get(mod_id)
+
+    def dependents(self, mod_id: str) -> List[IndexedMod]:
+        """
+        Parameters:
+            mod_id: The id of a mod.
+
+        Returns:
+            The mods that list `mod_id` in their `Dependencies`.
+        """
+        return list(self._dependents.get(mod_id, []))
+
+    def referrers(self, mod_id: str) -> List[IndexedMod]:
+        """
+        Parameters:
+            mod_id: The id of a mod.
+
+        Returns:
+            The mods that list `mod_id` in their `References`.
+        """
+        return list(self._referrers.get(mod_id, []))
+
+    def missing_dependencies(self) -> Dict[str, List[str]]:
+        """
+        Returns:
+            The ids of the dependencies that are not installed, by the id of the mods
+            depending on them.
+        """
+        missing: Dict[str, List[str]] = {}
+        for mod in self.mods:
+            absent = [dep for dep in mod.dependencies if dep not in self._by_id]
+            if absent:
+                missing[mod.id] = absent
+        return missing
+
+
+def _is_within(path: Path, directory: Path) -> bool:
+    try:
+        path.relative_to(directory)
+    except ValueError:
+        return False
+    return True
+
+
+def _read_entry(path: Path) -> Dict[str, Any]:
+    try:
+        return {"mod": read_modinfo(path).to_json()}
+    except (OSError, ValueError) as e:
+        return {"error": str(e)}
+
+
+def _read_index_cache(cache_file: Path) -> Dict[str, Dict[str, Any]]:
+    try:
+        data = json.loads(cache_file.read_text())
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != INDEX_FORMAT_VERSION:
+        return {}
+    return dict(data.get("entries", {}))
+
+
+def _write_index_cache(cache_file: Path, entries: Dict[str, Dict[str, Any]]) -> None:
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(
+            cache_file,
+            json.dumps({"version": INDEX_FORMAT_VERSION, "entries": entries}),
+        )
+    except OSError:
+        # Caching is only an optimization
+        pass
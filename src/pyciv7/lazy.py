@@ -0,0 +1,91 @@
+"""
+Module containing lazy sources of `.modinfo` elements, such as the `ActionGroup`s of a
+procedurally generated mod. Elements of a lazy source are produced, validated and serialized one
+at a time while the `.modinfo` is written, so they are never held in memory at once.
+"""
+
+from itertools import islice
+from typing import Any, Callable, Generic, Iterable, Iterator, List, TypeVar, Union
+
+from pyciv7.errors import LazySourceConsumedError
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """
+    Elements produced on demand by a callable or an iterable, e.g. a generator function
+    yielding one `ActionGroup` per age and leader.
+
+    A callable is called again every time the source is iterated, so a `Mod` using it can be
+    built as often as needed. An iterator, such as a generator, can only be iterated once.
+    """
+
+    def __init__(
+        self, source: Union[Callable[[], Iterable[Any]], Iterable[Any]]
+    ) -> None:
+        """
+        Parameters:
+            source: A callable returning the elements, or the elements themselves.
+        """
+        self.source = source
+        self._consumed = False
+
+    def __iter__(self) -> Iterator[Any]:
+        if callable(self.source):
+            return iter(self.source())
+        elements = iter(self.source)
+        # Containers such as lists can be iterated again, iterators cannot
+        if elements is self.source:
+            if self._consumed:
+                raise LazySourceConsumedError(
+                    "The lazy source was already consumed. Pass a callable to iterate it "
+                    "more than once."
+                )
+            self._consumed = True
+        return elements
+
+    @property
+    def reiterable(self) -> bool:
+        """
+        `True` if the elements can be iterated more than once, i.e. the source is a callable or
+        a container rather than an iterator.
+        """
+        return callable(self.source) or iter(self.source) is not self.source
+
+    def batches(self, size: int) -> Iterator[List[Any]]:
+        """
+        Parameters:
+            size: The maximum number of elements per batch.
+
+        Returns:
+            An iterator of lists of at most `size` elements.
+        """
+        elements = iter(self)
+        while True:
+            batch = list(islice(elements, size))
+            if not batch:
+                return
+            yield batch
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.source!r})"
+
+
+def to_lazy(value: Any) -> Any:
+    """
+    Wraps callables and iterables in `Lazy`. Used as a "before" validator of lazy fields, so
+    generators and generator functions can be assigned to them directly.
+
+    Parameters:
+        value: The value of a lazy field.
+
+    Returns:
+        The value wrapped in `Lazy` if it is a callable or an iterable, otherwise the value
+        itself.
+    """
+    if isinstance(value, (Lazy, str, bytes)) or not (
+        callable(value) or isinstance(value, Iterable)
+    ):
+        return value
+    return Lazy(value)
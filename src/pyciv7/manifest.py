@@ -0,0 +1,216 @@
+"""
+Build manifest that lets `pyciv7.runner.build` only redo the work whose inputs changed since the
+previous build of a mod.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Final, Iterable, List, Optional
+
+from pyciv7.utils import atomic_write_chunks, atomic_write_text, sha256_file
+
+MANIFEST_FILE_NAME: Final[str] = ".pyciv7-manifest.json"
+MANIFEST_FORMAT_VERSION: Final[int] = 1
+
+
+def sha256_text(text: str, encoding: str = "utf-8") -> str:
+    """
+    Parameters:
+        text: The text to hash.
+        encoding: The encoding the text is written with.
+
+    Returns:
+        The hexadecimal SHA-256 digest of the encoded text.
+    """
+    return hashlib.sha256(text.encode(encoding)).hexdigest()
+
+
+class BuildManifest:
+    """
+    Records the input and output hashes of every file of a built mod: the `.modinfo`, generated
+    SQL files, transpiled JavaScript and imported files. Each entry also records the size and
+    modification time of the file, so unchanged files are recognized without reading them.
+
+    Files whose inputs did not change are never rewritten, leaving their modification times
+    alone. This keeps the game's `UIFileWatcher` from reloading files that did not change.
+
+    The manifest is stored as `.pyciv7-manifest.json` in the mod directory.
+    """
+
+    def __init__(self, mod_dir: Path) -> None:
+        """
+        Parameters:
+            mod_dir: The root directory of the mod.
+        """
+        self.mod_dir = mod_dir
+        self.path = mod_dir / MANIFEST_FILE_NAME
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        # Files written, modified or removed since the manifest was loaded
+        self.changed: List[Path] = []
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("version") == MANIFEST_FORMAT_VERSION:
+            self.entries = dict(data.get("entries", {}))
+
+    def _name(self, path: Path) -> str:
+        try:
+            return path.relative_to(self.mod_dir).as_posix()
+        except ValueError:
+            return path.resolve().as_posix()
+
+    def _mark_changed(self, path: Path) -> None:
+        if path not in self.changed:
+            self.changed.append(path)
+
+    def _unchanged_on_disk(self, path: Path, entry: Optional[Dict[str, Any]]) -> bool:
+        if entry is None:
+            return False
+        try:
+            stat = path.stat()
+        except OSError:
+            return False
+        return stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]
+
+    def is_fresh(self, path: Path, input_hash: str) -> bool:
+        """
+        Parameters:
+            path: A file of the mod.
+            input_hash: A digest of every input the file is generated from.
+
+        Returns:
+            `True` if `path` was generated from the same inputs and has not been modified since.
+        """
+        entry = self.entries.get(self._name(path))
+        return (
+            entry is not None
+            and entry["input"] == input_hash
+            and self._unchanged_on_disk(path, entry)
+        )
+
+    def record(
+        self, path: Path, input_hash: str, output_hash: Optional[str] = None
+    ) -> None:
+        """
+        Records that `path` was generated from the provided inputs.
+
+        Parameters:
+            path: A file of the mod. It must exist.
+            input_hash: A digest of every input the file is generated from.
+            output_hash: The digest of the file's contents, if it is already known.
+        """
+        name = self._name(path)
+        previous = self.entries.get(name)
+        if output_hash is None:
+            if self._unchanged_on_disk(path, previous):
+                output_hash = previous["output"]  # type: ignore
+            else:
+                output_hash = sha256_file(path)
+        if previous is None or previous["output"] != output_hash:
+            self._mark_changed(path)
+        stat = path.stat()
+        self.entries[name] = {
+            "input": input_hash,
+            "output": output_hash,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+
+    def track(self, path: Path) -> None:
+        """
+        Records a file that is used as-is by the mod, such as an imported file. Its contents are
+        both its input and its output.
+
+        Parameters:
+            path: A file of the mod. Missing files are ignored.
+        """
+        if path.is_file():
+            entry = self.entries.get(self._name(path))
+            if self._unchanged_on_disk(path, entry):
+                return
+            output_hash = sha256_file(path)
+            self.record(path, output_hash, output_hash)
+
+    def write_text(self, path: Path, text: str) -> bool:
+        """
+        Writes a generated text file, unless the file already holds the same text.
+
+        Parameters:
+            path: The file to write.
+            text: The contents of the file.
+
+        Returns:
+            `True` if the file was written.
+        """
+        input_hash = sha256_text(text)
+        if self.is_fresh(path, input_hash):
+            return False
+        written = not self._holds(path, input_hash)
+        if written:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_text(path, text)
+            self._mark_changed(path)
+        self.record(path, input_hash, input_hash)
+        return written
+
+    def write_stream(self, path: Path, chunks: Iterable[str]) -> bool:
+        """
+        Writes a generated text file chunk by chunk, unless the file already holds the same
+        text. The text is never held in memory at once.
+
+        Parameters:
+            path: The file to write.
+            chunks: The contents of the file, in chunks.
+
+        Returns:
+            `True` if the file was written.
+        """
+        kept = []
+
+        def unchanged(digest: str) -> bool:
+            kept.append(self._holds(path, digest))
+            return kept[0]
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        digest = atomic_write_chunks(path, chunks, unchanged=unchanged)
+        if not kept[0]:
+            self._mark_changed(path)
+        self.record(path, digest, digest)
+        return not kept[0]
+
+    def _holds(self, path: Path, digest: str) -> bool:
+        entry = self.entries.get(self._name(path))
+        if self._unchanged_on_disk(path, entry):
+            return entry["output"] == digest  # type: ignore
+        return path.is_file() and sha256_file(path) == digest
+
+    def forget(self, path: Path) -> None:
+        """
+        Removes a file that no longer belongs to the mod from the manifest.
+
+        Parameters:
+            path: A file of the mod.
+        """
+        if self.entries.pop(self._name(path), None) is not None:
+            self._mark_changed(path)
+
+    def save(self) -> None:
+        """
+        Drops the entries of deleted files and writes the manifest to disk.
+        """
+        self.entries = {
+            name: entry
+            for name, entry in self.entries.items()
+            if (self.mod_dir / name).exists()
+        }
+        self.mod_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(
+            self.path,
+            json.dumps(
+                {"version": MANIFEST_FORMAT_VERSION, "entries": self.entries},
+                indent=2,
+                sort_keys=True,
+            ),
+        )
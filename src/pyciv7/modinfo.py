@@ -2,27 +2,71 @@
 Module containing Pydantic XML models for building a `.modinfo` XML file.
 """
 
+import hashlib
+import re
+import sys
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Final, List, Literal, Optional, Union
-from uuid import uuid4
+from typing import (
+    Annotated,
+    Any,
+    Callable,
+    Dict,
+    Final,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Pattern,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    get_args,
+    get_origin,
+)
+from xml.sax.saxutils import escape
 
 from pydantic import (
     Field,
+    PlainValidator,
+    PrivateAttr,
     SerializeAsAny,
+    TypeAdapter,
+    ValidationInfo,
+    ValidatorFunctionWrapHandler,
+    WrapValidator,
     field_serializer,
     field_validator,
-    model_serializer,
 )
-from pydantic_core import PydanticCustomError
-from pydantic_xml import BaseXmlModel, attr, element, wrapped
-from rich import print
-from sqlalchemy.sql.elements import CompilerElement
+from pydantic.fields import FieldInfo
+from pydantic_core import PydanticCustomError, to_jsonable_python
+from pydantic_xml import BaseXmlModel, attr, element, wrapped, xml_field_serializer
+from pydantic_xml.element import XmlElementWriter
 
+from pyciv7.artifacts import ActionPlan, SQLFile
+from pyciv7.diagnostics import warn
 from pyciv7.errors import ModDirSerializationError
-from pyciv7.settings import Settings
-from pyciv7.utils import StrPath
+from pyciv7.lazy import Lazy, to_lazy
+from pyciv7.manifest import BuildManifest
+from pyciv7.tracing import ACTION, ITEM, VALIDATION, span
+from pyciv7.utils import StrPath, atomic_write_chunks
 
 RECOMMENDED_MAX_ID_LENGTH: Final[int] = 64
+STREAM_CHUNK_ITEMS: Final[int] = 1024
+"""
+Number of `Item` elements per chunk yielded by `Mod.iter_xml`, and number of lazy items
+validated and planned at once.
+"""
+GENERATED_SQL_FILE_PATTERN: Final[Pattern[str]] = re.compile(
+    r"[0-9a-f]{16}\.sql|[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[0-9a-f]{4}-[0-9a-f]{12}\.sql"
+)
+"""
+Names of the SQL files generated from SQL statements. Older versions of pyciv7 named them with a
+random UUID.
+"""
 
 
 class Properties(BaseXmlModel, tag="Properties"):
@@ -73,7 +117,7 @@ class Properties(BaseXmlModel, tag="Properties"):
     @field_validator("name")
     def check_minimum_name_recommendation(cls, value: Optional[str]) -> Optional[str]:
         if not value:
-            print("[yellow]It is recommended the .modinfo Properties includes a name.")
+            warn("properties-missing-name", "Properties.name")
         return value
 
     @field_validator("description")
@@ -81,9 +125,7 @@ class Properties(BaseXmlModel, tag="Properties"):
         cls, value: Optional[str]
     ) -> Optional[str]:
         if not value:
-            print(
-                "[yellow]It is recommended the .modinfo Properties includes a description."
-            )
+            warn("properties-missing-description", "Properties.description")
         return value
 
     @field_validator("authors")
@@ -91,9 +133,7 @@ class Properties(BaseXmlModel, tag="Properties"):
         cls, value: Optional[str]
     ) -> Optional[str]:
         if not value:
-            print(
-                "[yellow]It is recommended the .modinfo Properties includes an author(s)."
-            )
+            warn("properties-missing-authors", "Properties.authors")
         return value
 
     @field_serializer("affects_saved_games", "show_in_browser", "enabled_by_default")
@@ -276,21 +316,101 @@ class ModInUse(BaseXmlModel, tag="ModInUse"):
     version: Optional[str] = element(tag="Version", default=None)
 
 
-Condition = Union[
-    AlwaysMet,
-    NeverMet,
-    AgeInUse,
-    AgeWasUsed,
-    AgeEverInUse,
-    ConfigurationValueMatches,
-    ConfigurationValueContains,
-    MapInUse,
-    RuleSetInUse,
-    GameModeInUse,
-    LeaderPlayable,
-    CivilizationPlayable,
-    ModInUse,
-]
+class TaggedUnion:
+    """
+    Validates a union of XML models by dispatching on the element tag of its members, instead
+    of trying each member in turn:
+
+    - instances of a member are accepted as they are,
+    - dictionaries with a `kind` key holding the tag of a member, e.g.
+      `{"kind": "AgeInUse", "age": "AGE_ANTIQUITY"}`, are validated by that member only,
+    - anything else is validated by the union, like before.
+
+    It is used as a wrap validator, see `tagged_union`.
+    """
+
+    def __init__(self, members: Tuple[Type[BaseXmlModel], ...]) -> None:
+        """
+        Parameters:
+            members: The models of the union.
+        """
+        self.types = members
+        self.members: Dict[str, Type[BaseXmlModel]] = {
+            member.__xml_tag__: member for member in members  # type: ignore
+        }
+        self._adapter: Optional[TypeAdapter] = None
+
+    def member(self, kind: Any) -> Type[BaseXmlModel]:
+        """
+        Parameters:
+            kind: The tag of a member.
+
+        Returns:
+            The member with the tag.
+
+        Raises:
+            PydanticCustomError: If no member has the tag.
+        """
+        try:
+            return self.members[kind]
+        except (KeyError, TypeError):
+            raise PydanticCustomError(
+                "union_tag_invalid",
+                "Unknown kind {kind}, expected one of: {expected}",
+                {"kind": repr(kind), "expected": ", ".join(self.members)},
+            ) from None
+
+    def __call__(self, value: Any, handler: ValidatorFunctionWrapHandler) -> Any:
+        if isinstance(value, self.types):
+            return value
+        if isinstance(value, dict) and "kind" in value:
+            data = dict(value)
+            return self.member(data.pop("kind")).model_validate(data)
+        return handler(value)
+
+    def validate(self, value: Any) -> Any:
+        """
+        Parameters:
+            value: A member, or the data of one.
+
+        Returns:
+            The validated member.
+        """
+        if self._adapter is None:
+            self._adapter = TypeAdapter(
+                Annotated[Union[self.types], WrapValidator(self)]  # type: ignore
+            )
+        return self._adapter.validate_python(value)
+
+
+def tagged_union(union: Any) -> Any:
+    """
+    Parameters:
+        union: A `Union` of XML models.
+
+    Returns:
+        The union, validated with a `TaggedUnion`.
+    """
+    return Annotated[union, WrapValidator(TaggedUnion(get_args(union)))]
+
+
+Condition = tagged_union(
+    Union[
+        AlwaysMet,
+        NeverMet,
+        AgeInUse,
+        AgeWasUsed,
+        AgeEverInUse,
+        ConfigurationValueMatches,
+        ConfigurationValueContains,
+        MapInUse,
+        RuleSetInUse,
+        GameModeInUse,
+        LeaderPlayable,
+        CivilizationPlayable,
+        ModInUse,
+    ]
+)
 
 
 class Criteria(BaseXmlModel, tag="Criteria"):
@@ -307,8 +427,76 @@ class Criteria(BaseXmlModel, tag="Criteria"):
     conditions: List[Condition]
 
 
-SQLStatement = CompilerElement
-SQLStatementOrPath = Union[StrPath, SQLStatement]
+def is_sql_statement(value: Any) -> bool:
+    """
+    Checks whether a value is a SQLAlchemy or SQLModel statement without importing SQLAlchemy,
+    which is slow to import. A statement cannot exist before SQLAlchemy was imported.
+
+    Parameters:
+        value: The value to check.
+
+    Returns:
+        `True` if `value` is a SQL statement.
+    """
+    elements = sys.modules.get("sqlalchemy.sql.elements")
+    return elements is not None and isinstance(value, elements.CompilerElement)
+
+
+def is_rows(value: Any) -> bool:
+    """
+    Checks whether a value is a `pyciv7.sql.Rows` instance without importing `pyciv7.sql`.
+
+    Parameters:
+        value: The value to check.
+
+    Returns:
+        `True` if `value` holds rows to insert in bulk.
+    """
+    sql = sys.modules.get("pyciv7.sql")
+    return sql is not None and isinstance(value, sql.Rows)
+
+
+def validate_sql_item(value: Any) -> Any:
+    if is_sql_statement(value) or is_rows(value):
+        return value
+    raise PydanticCustomError(
+        "invalid_sql_item", "Item must be a path, a SQL statement or Rows"
+    )
+
+
+# pydantic-xml only serializes primitive types. Items are serialized by "to_posix" regardless.
+SQLItem = Annotated[str, PlainValidator(validate_sql_item)]
+"""
+A SQL statement or `pyciv7.sql.Rows`, validated without importing SQLAlchemy.
+"""
+
+
+def __getattr__(name: str) -> Any:
+    # The aliases of SQLAlchemy types are resolved on first use since SQLAlchemy is slow to
+    # import. They are deliberately left out of star-imports, which would resolve them
+    if name in ("SQLStatement", "SQLStatementOrPath"):
+        from sqlalchemy.sql.elements import CompilerElement
+
+        return (
+            CompilerElement
+            if name == "SQLStatement"
+            else Union[StrPath, CompilerElement]
+        )
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def sql_file_name(sql: str) -> str:
+    """
+    Derives the name of a generated SQL file from its contents, so rebuilding an unchanged
+    statement always produces the same file.
+
+    Parameters:
+        sql: The compiled SQL statement.
+
+    Returns:
+        The name of the SQL file.
+    """
+    return f"{hashlib.sha256(sql.encode()).hexdigest()[:16]}.sql"
 
 
 def validate_item_ext(path: StrPath, *exts: str) -> Path:
@@ -325,52 +513,279 @@ def validate_item_ext(path: StrPath, *exts: str) -> Path:
 
 
 class ItemsAction(BaseXmlModel):
-    items: List[StrPath] = wrapped("Item")
+    model_config = {"arbitrary_types_allowed": True}
+    items: List[StrPath] = element(tag="Item", default_factory=list)
     mod_dir: Optional[StrPath] = Field(default=None, exclude=True)
+    lazy_items: Optional[Lazy[Any]] = Field(default=None, exclude=True)
+    """
+    Items produced on demand, e.g. by a generator, that follow `items`. They are validated and
+    planned in batches of `STREAM_CHUNK_ITEMS` while `Mod.iter_xml` writes the `.modinfo`, so
+    they are never held in memory at once. `to_xml` and `model_dump` only serialize `items`.
+    """
+    _plan: Optional[Tuple[List[Any], Dict[str, Any], ActionPlan]] = PrivateAttr(
+        default=None
+    )
+
+    @field_validator("lazy_items", mode="before")
+    def wrap_lazy_items(cls, value: Any) -> Any:
+        return to_lazy(value)
 
     @field_serializer("items")
-    def to_posix(self, items: List[StrPath]) -> List[str]:
-        if self.mod_dir:
-            mod_dir = Path(self.mod_dir)
-            new_items = []
-            for item in items:
-                item = Path(item)
-                if item.is_absolute():
-                    try:
-                        item = item.relative_to(mod_dir)
-                    except ValueError as e:
-                        raise ModDirSerializationError(
-                            'Each "Item" must be a relative path of the mod directory.'
-                        ) from e
-                new_items.append((mod_dir / item).relative_to(mod_dir).as_posix())
-            return new_items
-        raise ModDirSerializationError('"mod_dir" must be set prior to serialization.')
+    def to_posix(self, items: List[Any]) -> List[str]:
+        return self.plan().items
+
+    @xml_field_serializer("items")
+    def items_to_xml(
+        self, element: XmlElementWriter, value: List[Any], field_name: str
+    ) -> None:
+        # Actions can serialize to a different number of items than they hold (e.g. `Rows`
+        # expanding to several SQL files), so the planned items are written instead
+        for item in self.plan().items:
+            sub_element = element.make_element("Item", nsmap=None)
+            sub_element.set_text(item)
+            element.append_element(sub_element)
+
+    def relative_items(self, items: Iterable[StrPath]) -> List[str]:
+        """
+        Converts paths to the POSIX paths relative to `mod_dir` used by the `.modinfo`.
+
+        Parameters:
+            items: Paths that are either relative to `mod_dir` or inside of it.
+
+        Returns:
+            The relative POSIX paths.
+
+        Raises:
+            ModDirSerializationError: If `mod_dir` is not set or an absolute path is outside of
+                it.
+        """
+        if not self.mod_dir:
+            raise ModDirSerializationError(
+                '"mod_dir" must be set prior to serialization.'
+            )
+        mod_dir = Path(self.mod_dir)
+        new_items = []
+        for item in items:
+            item = Path(item)
+            if item.is_absolute():
+                try:
+                    item = item.relative_to(mod_dir)
+                except ValueError as e:
+                    raise ModDirSerializationError(
+                        'Each "Item" must be a relative path of the mod directory.'
+                    ) from e
+            new_items.append((mod_dir / item).relative_to(mod_dir).as_posix())
+        return new_items
+
+    def plan(self) -> ActionPlan:
+        """
+        Plans the items the action serializes to and the artifacts they refer to, without
+        touching the disk. The plan is reused until the items, any other field of the action or
+        the settings of the active `BuildContext` change, so serializing an action repeatedly is
+        cheap and consumes iterators only once.
+
+        Returns:
+            The plan of the action.
+        """
+        items = list(self.items)
+        fields = self.plan_inputs()
+        if self._plan is not None:
+            planned_items, planned_fields, plan = self._plan
+            # Items are compared by identity since SQL statements overload "=="
+            if (
+                len(planned_items) == len(items)
+                and all(a is b for a, b in zip(planned_items, items))
+                and planned_fields == fields
+            ):
+                return plan
+        with span("plan", ACTION, action=type(self).__name__, items=len(items)):
+            plan = self.build_plan()
+        self._plan = (items, fields, plan)
+        return plan
+
+    def plan_inputs(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Everything besides the items that the plan of the action depends on, by default
+            the other fields of the action.
+        """
+        return {
+            name: getattr(self, name)
+            for name in type(self).model_fields
+            if name != "items"
+        }
+
+    def iter_batches(self, size: int = STREAM_CHUNK_ITEMS) -> Iterator["ItemsAction"]:
+        """
+        Splits the action into eager actions: the action itself, then one action per batch of
+        `lazy_items`. Each batch is validated like `items` when it is produced.
+
+        Parameters:
+            size: The maximum number of lazy items per batch.
+
+        Returns:
+            An iterator of actions without `lazy_items`.
+        """
+        if self.lazy_items is None:
+            yield self
+            return
+        fields = {
+            name: getattr(self, name)
+            for name in type(self).model_fields
+            if name not in ("items", "lazy_items")
+        }
+        if self.items:
+            yield self.model_copy(update={"lazy_items": None})
+        for batch in self.lazy_items.batches(size):
+            with span("validate items", VALIDATION, action=type(self).__name__):
+                action = type(self)(items=batch, **fields)
+            yield action
+
+    def build_plan(self) -> ActionPlan:
+        """
+        Builds a new plan for the action. Subclasses generating files from their items override
+        this to add the artifacts.
+
+        Returns:
+            The plan of the action.
+        """
+        return ActionPlan(items=self.relative_items(self.items))
+
+    def emit(self, manifest: Optional[BuildManifest] = None) -> None:
+        """
+        Writes the artifacts planned for the action. Artifacts that are up to date are left
+        untouched.
+
+        Parameters:
+            manifest: The manifest of the build the artifacts and the files used as-is by the
+                action are recorded in, if any.
+        """
+        plan = self.plan()
+        with span("emit", ACTION, action=type(self).__name__, items=len(plan.items)):
+            self._emit(plan, manifest)
+
+    def _emit(self, plan: ActionPlan, manifest: Optional[BuildManifest]) -> None:
+        for artifact in plan.artifacts:
+            artifact.emit(manifest)
+        if manifest is not None and self.mod_dir:
+            outputs = {
+                output for artifact in plan.artifacts for output in artifact.outputs
+            }
+            for item in plan.items:
+                path = Path(self.mod_dir) / item
+                if path not in outputs:
+                    manifest.track(path)
 
 
 class DatabaseItemsAction(ItemsAction):
     model_config = {"arbitrary_types_allowed": True}
-    items: List[Union[StrPath, SQLStatement]] = wrapped("Item")
+    items: List[Union[StrPath, SQLItem]] = element(tag="Item", default_factory=list)
+    bundle: bool = Field(default=False, exclude=True)
+    """
+    `True` if every SQL statement and `Rows` item of the action should be written, in order,
+    to a single SQL file instead of one file per statement. This reduces the number of files
+    the game opens when loading the mod. The bundled file takes the place of the first
+    statement among the items.
+    """
+    transaction: bool = Field(default=False, exclude=True)
+    """
+    `True` if the bundled statements should be wrapped in a single transaction. Only used when
+    `bundle` is `True`.
+    """
 
-    @model_serializer()
-    def save_sql_statements(self) -> Dict[str, Any]:
+    @field_validator("bundle")
+    def check_bundle_is_eager(cls, bundle: bool, info: ValidationInfo) -> bool:
+        if bundle and info.data.get("lazy_items") is not None:
+            raise ValueError(
+                '"bundle" needs every item up front and cannot be used with "lazy_items"'
+            )
+        return bundle
+
+    @field_validator("items", mode="before")
+    def wrap_bulk_rows(cls, items: Any) -> Any:
+        if not isinstance(items, list):
+            return items
+        new_items = []
+        for item in items:
+            if isinstance(item, (list, tuple, Iterator)):
+                from pyciv7.sql import Rows
+
+                # Iterables of rows are inserted in bulk
+                item = Rows(item)
+            elif hasattr(type(item), "__table__"):
+                from pyciv7.sql import Rows
+
+                # A single SQLModel instance
+                item = Rows([item])
+            new_items.append(item)
+        return new_items
+
+    def has_sql_items(self) -> bool:
+        """
+        Returns:
+            `True` if any item is a SQL statement or `Rows`, i.e. SQL files are generated.
+        """
+        return any(is_sql_statement(item) or is_rows(item) for item in self.items)
+
+    def plan_inputs(self) -> Dict[str, Any]:
+        inputs = super().plan_inputs()
+        if self.has_sql_items():
+            from pyciv7.context import BuildContext
+
+            inputs["settings"] = BuildContext.current().settings
+        return inputs
+
+    def build_plan(self) -> ActionPlan:
+        if not self.has_sql_items():
+            return super().build_plan()
         if not self.mod_dir:
             raise ModDirSerializationError(
                 '"mod_dir" must be set prior to serialization.'
             )
-        sql_dir = Path(self.mod_dir) / Settings().sql_sub_dir
-        sql_dir.mkdir(exist_ok=True, parents=True)
-        new_items = []
-        for item in self.items:
-            if isinstance(item, SQLStatement):
-                # Compile SQL statement and write to SQL file
-                sql_file = (sql_dir / str(uuid4())).with_suffix(".sql")
-                sql_file.write_text(
-                    str(item.compile(compile_kwargs={"literal_binds": True}))
+        from pyciv7.context import BuildContext
+        from pyciv7.sql import bundle_statements, compile_statement
+
+        sql_sub_dir = BuildContext.current().settings.sql_sub_dir
+        sql_files: Dict[Path, SQLFile] = {}
+
+        def sql_file(sql: str) -> Path:
+            # Items are relative to the mod directory, which may itself be a relative path
+            item = sql_sub_dir / sql_file_name(sql)
+            path = Path(self.mod_dir) / item  # type: ignore
+            sql_files.setdefault(path, SQLFile(path, sql))
+            return item
+
+        new_items: List[Optional[StrPath]] = []
+        bundled: List[str] = []
+        bundle_index: Optional[int] = None
+        for index, item in enumerate(self.items):
+            if not (is_sql_statement(item) or is_rows(item)):
+                new_items.append(item)
+                continue
+            # Rows are compiled while their statements are consumed
+            with span("compile sql", ITEM, index=index, kind=type(item).__name__):
+                if is_sql_statement(item):
+                    statements: Iterable[str] = [compile_statement(item)]
+                else:
+                    statements = item.statements()  # type: ignore
+                if self.bundle:
+                    if bundle_index is None:
+                        # Placeholder for the bundled SQL file
+                        bundle_index = len(new_items)
+                        new_items.append(None)
+                    bundled.extend(statements)
+                else:
+                    # Reassign item to new SQL files
+                    new_items.extend(sql_file(sql) for sql in statements)
+        if bundle_index is not None and bundled:
+            with span("bundle sql", ACTION, statements=len(bundled)):
+                new_items[bundle_index] = sql_file(
+                    bundle_statements(bundled, self.transaction)
                 )
-                # Reassign item to new SQL file
-                item = sql_file
-            new_items.append(item)
-        return ItemsAction(items=new_items, mod_dir=self.mod_dir).model_dump()
+        return ActionPlan(
+            items=self.relative_items(item for item in new_items if item is not None),
+            artifacts=list(sql_files.values()),
+        )
 
 
 class ScriptItemsAction(ItemsAction):
@@ -383,27 +798,29 @@ class ScriptItemsAction(ItemsAction):
 class UpdateDatabase(DatabaseItemsAction, tag="UpdateDatabase"):
     """
     Updates either the frontend/shell or gameplay database with the provided `.xml`,
-    SQLModel ORM statement, or `.sql` items, depending on the scope of the `ActionGroup`.
+    SQLModel ORM statement, bulk `Rows`, or `.sql` items, depending on the scope of the
+    `ActionGroup`.
     """
 
 
 class UpdateText(DatabaseItemsAction, tag="UpdateText"):
     """
-    Updates the Localization database with the provided `.xml`, SQLModel ORM statement, or, `.sql`
-    items.
+    Updates the Localization database with the provided `.xml`, SQLModel ORM statement, bulk
+    `Rows`, or, `.sql` items.
     """
 
 
 class UpdateIcons(DatabaseItemsAction, tag="UpdateIcons"):
     """
-    Updates the `Icons` database with the provided `.xml`, SQLModel ORM statement, or `.sql` items.
+    Updates the `Icons` database with the provided `.xml`, SQLModel ORM statement, bulk `Rows`, or
+    `.sql` items.
     """
 
 
 class UpdateColors(DatabaseItemsAction, tag="UpdateColors"):
     """
-    Updates the `Colors` database with the provided `.xml`, SQLModel ORM statement, or `.sql`
-    items.
+    Updates the `Colors` database with the provided `.xml`, SQLModel ORM statement, bulk `Rows`,
+    or `.sql` items.
     """
 
 
@@ -441,9 +858,9 @@ class UIShortcuts(ItemsAction, tag="UIShortcuts"):
 
 class UpdateVisualRemaps(DatabaseItemsAction, tag="UpdateVisualRemaps"):
     """
-    Updates the Visual Remap database with the provided `.xml`, SQLModel ORM statement, or `.sql`
-    items. The Visual Remaps can be used to relink the visuals of gameplay entries onto other
-    assets.
+    Updates the Visual Remap database with the provided `.xml`, SQLModel ORM statement, bulk
+    `Rows`, or `.sql` items. The Visual Remaps can be used to relink the visuals of gameplay
+    entries onto other assets.
     """
 
 
@@ -460,19 +877,21 @@ class ScenarioScripts(ScriptItemsAction, tag="ScenarioScripts"):
 
 
 Action = SerializeAsAny[
-    Union[
-        UpdateDatabase,
-        UpdateText,
-        UpdateIcons,
-        UpdateColors,
-        UpdateArt,
-        ImportFiles,
-        UIScripts,
-        UIShortcuts,
-        UpdateVisualRemaps,
-        MapGenScripts,
-        ScenarioScripts,
-    ]
+    tagged_union(
+        Union[
+            UpdateDatabase,
+            UpdateText,
+            UpdateIcons,
+            UpdateColors,
+            UpdateArt,
+            ImportFiles,
+            UIScripts,
+            UIShortcuts,
+            UpdateVisualRemaps,
+            MapGenScripts,
+            ScenarioScripts,
+        ]
+    )
 ]
 
 
@@ -503,6 +922,23 @@ class ActionGroup(BaseXmlModel, tag="ActionGroup"):
     """
     load_order: Optional[int] = wrapped("Properties/LoadOrder", default=None, ge=0)
 
+    @xml_field_serializer("actions")
+    def actions_to_xml(
+        self, element: XmlElementWriter, value: List[Any], field_name: str
+    ) -> None:
+        # The serializer of the `Action` union only writes instances of its exact member types,
+        # so subclasses such as `PythonGameScripts` would be dropped. Each action is written
+        # by the serializer of its own type instead, like `iter_xml` does
+        actions = element.make_element("Actions", nsmap=None)
+        for action in value:
+            serializer = action.__xml_serializer__
+            sub_element = actions.make_element(
+                serializer.element_name, nsmap=serializer.nsmap
+            )
+            serializer.serialize(sub_element, action, to_jsonable_python(action))
+            actions.append_element(sub_element)
+        element.append_element(actions)
+
 
 class Mod(BaseXmlModel, tag="Mod"):
     """
@@ -514,6 +950,7 @@ class Mod(BaseXmlModel, tag="Mod"):
     model_config = {
         "validate_assignment": True,
         "validate_default": True,
+        "arbitrary_types_allowed": True,
     }
     id: str = attr()
     """
@@ -571,34 +1008,49 @@ class Mod(BaseXmlModel, tag="Mod"):
     """
     The `ActionGroups` element consists of `ActionGroup` child elements.
     """
+    lazy_action_groups: Optional[Lazy[ActionGroup]] = Field(default=None, exclude=True)
+    """
+    `ActionGroup`s produced on demand that follow `action_groups`, e.g. a generator function
+    yielding one `ActionGroup` per combination of age, leader and ruleset. They are validated and
+    serialized one at a time by `iter_xml`, so procedurally generated mods are never held in
+    memory at once. `to_xml` and `model_dump` only serialize `action_groups`.
+
+    Pass a callable rather than a generator to build the mod more than once, e.g. with
+    `pyciv7.runner.watch`.
+    """
+    _mod_dir: Optional[StrPath] = PrivateAttr(default=None)
 
     @field_validator("id")
     def check_id_recommendations(cls, value: str) -> str:
         if len(value) >= RECOMMENDED_MAX_ID_LENGTH:
-            print(
-                "[yellow]It is recommended that the .modinfo ID is less than "
-                f"{RECOMMENDED_MAX_ID_LENGTH} characters"
+            warn(
+                "mod-id-too-long",
+                "Mod.id",
+                value,
+                max_length=RECOMMENDED_MAX_ID_LENGTH,
             )
         if not value.isascii():
-            print(
-                "[yellow]It is recommended that the .modinfo ID is composed solely of ASCII "
-                "characters"
-            )
+            warn("mod-id-not-ascii", "Mod.id", value)
         if not value.islower() or "_" in value or len(value.split(maxsplit=1)) > 1:
-            print(
-                "[yellow]It is recommended that the .modinfo ID is composed solely of lowercase "
-                "characters, and dashes instead of underscores or spaces"
-            )
+            warn("mod-id-not-lowercase", "Mod.id", value)
         return value
 
     @field_validator("properties")
-    def check_properties_recommendations(cls, value: Optional[str]) -> Optional[str]:
+    def check_properties_recommendations(
+        cls, value: Optional[str], info: ValidationInfo
+    ) -> Optional[str]:
         if not value:
-            print('[yellow]It is recommended you define a "Properties" element')
+            warn("mod-missing-properties", "Mod.properties", info.data.get("id"))
         return value
 
+    @field_validator("lazy_action_groups", mode="before")
+    def wrap_lazy_action_groups(cls, value: Any) -> Any:
+        return to_lazy(value)
+
     @property
     def mod_dir(self) -> Optional[StrPath]:
+        if self._mod_dir is not None:
+            return self._mod_dir
         for action_group in self.action_groups or []:
             for action in action_group.actions:
                 if isinstance(action, ItemsAction):
@@ -606,7 +1058,287 @@ class Mod(BaseXmlModel, tag="Mod"):
 
     @mod_dir.setter
     def mod_dir(self, mod_dir: StrPath) -> None:
+        # Kept for the lazy action groups, which do not exist yet
+        self._mod_dir = mod_dir
         for action_group in self.action_groups or []:
             for action in action_group.actions:
                 if isinstance(action, ItemsAction):
                     action.mod_dir = mod_dir
+
+    def iter_action_groups(self) -> Iterator[ActionGroup]:
+        """
+        Iterates over `action_groups`, then over `lazy_action_groups`. Lazy action groups are
+        validated as they are produced, and their actions inherit the `mod_dir` of the `Mod`
+        unless they set their own.
+
+        Returns:
+            An iterator of every `ActionGroup` of the `Mod`.
+        """
+        yield from self.action_groups or []
+        if self.lazy_action_groups is None:
+            return
+        for value in self.lazy_action_groups:
+            if isinstance(value, ActionGroup):
+                action_group = value
+            else:
+                with span("validate action group", VALIDATION):
+                    action_group = ActionGroup.model_validate(value)
+            if self._mod_dir is not None:
+                for action in action_group.actions:
+                    if isinstance(action, ItemsAction) and not action.mod_dir:
+                        action.mod_dir = self._mod_dir
+            yield action_group
+
+    def iter_xml(
+        self, emit: Optional[Callable[[ItemsAction], None]] = None
+    ) -> Iterator[str]:
+        """
+        Serializes the `Mod` in chunks, one `ActionGroup`, action and batch of `Item` elements
+        at a time, so the XML of very large mods is never held in memory at once. Joining the
+        chunks gives the same XML as `to_xml(encoding="unicode", exclude_none=True)`, followed
+        by the lazy action groups and items, if any.
+
+        Parameters:
+            emit: Called with each action, or each batch of lazy items of an action, right
+                before its items are serialized, e.g. to write the artifacts they refer to.
+
+        Returns:
+            An iterator of XML chunks.
+        """
+        action_groups = self.iter_action_groups()
+        first = next(action_groups, None)
+        if first is None:
+            yield self.to_xml(encoding="unicode", exclude_none=True)  # type: ignore
+            return
+        marker = _marker_action_group()
+        skeleton: str = self.model_copy(update={"action_groups": [marker]}).to_xml(
+            encoding="unicode", exclude_none=True
+        )  # type: ignore
+        head, tail = _split_at(skeleton, marker.to_xml(encoding="unicode"))  # type: ignore
+        yield head
+        yield from _iter_action_group_xml(first, emit)
+        for action_group in action_groups:
+            yield from _iter_action_group_xml(action_group, emit)
+        yield tail
+
+    def write_xml(self, path: StrPath) -> None:
+        """
+        Writes the `.modinfo` XML of the `Mod` to a file with `iter_xml`. The XML is written to a
+        temporary file that replaces `path` once complete, so readers never see a partially
+        written file.
+
+        Parameters:
+            path: The file to write.
+        """
+        atomic_write_chunks(path, self.iter_xml())
+
+
+M = TypeVar("M", bound=BaseXmlModel)
+
+
+def construct_trusted(model_type: Type[M], data: Any) -> M:
+    """
+    Builds a model from data that is known to be valid, e.g. data cached from a mod that was
+    validated before, without running any validator. Nested models are built the same way.
+    Members of `Condition` and `Action` are picked by the `kind` key of their dictionaries, see
+    `TaggedUnion`; dictionaries without one are validated.
+
+    Invalid data is not detected and produces broken models, so untrusted data must go through
+    `model_validate` instead.
+
+    Parameters:
+        model_type: The model to build, e.g. `Mod`.
+        data: The fields of the model by name or alias, or an instance of the model.
+
+    Returns:
+        The model.
+    """
+    if isinstance(data, model_type):
+        return data
+    fields, defaults, private = _trusted_fields(model_type)
+    values = {}
+    for name, keys, convert in fields:
+        for key in keys:
+            if key in data:
+                values[name] = convert(data[key])
+                break
+    fields_set = set(values)
+    for name, info in defaults:
+        if name not in values:
+            values[name] = info.get_default(
+                call_default_factory=True, validated_data=values
+            )
+    # What `model_construct` does, minus the features these models do not use (extra fields,
+    # validation aliases and post-init hooks), which makes it several times faster
+    instance = model_type.__new__(model_type)
+    object.__setattr__(instance, "__dict__", values)
+    object.__setattr__(instance, "__pydantic_fields_set__", fields_set)
+    object.__setattr__(instance, "__pydantic_extra__", None)
+    object.__setattr__(
+        instance,
+        "__pydantic_private__",
+        {name: attr.get_default() for name, attr in private} if private else None,
+    )
+    return instance
+
+
+@lru_cache(maxsize=None)
+def _trusted_fields(model_type: Type[BaseXmlModel]) -> Tuple[
+    List[Tuple[str, Tuple[str, ...], Callable[[Any], Any]]],
+    List[Tuple[str, FieldInfo]],
+    List[Tuple[str, Any]],
+]:
+    fields = [
+        (
+            name,
+            (name,) if info.alias is None else (name, info.alias),
+            _trusted_converter(info.annotation, info.metadata),
+        )
+        for name, info in model_type.model_fields.items()
+    ]
+    defaults = [
+        (name, info)
+        for name, info in model_type.model_fields.items()
+        if not info.is_required()
+    ]
+    private = list(model_type.__private_attributes__.items())
+    return fields, defaults, private
+
+
+def _trusted_converter(
+    annotation: Any, metadata: Sequence[Any] = ()
+) -> Callable[[Any], Any]:
+    tagged = next(
+        (
+            m.func
+            for m in metadata
+            if isinstance(m, WrapValidator) and isinstance(m.func, TaggedUnion)
+        ),
+        None,
+    )
+    if get_origin(annotation) is Annotated:
+        annotation, *extra = get_args(annotation)
+        return _trusted_converter(annotation, [*metadata, *extra])
+    if tagged is not None:
+        union = tagged
+
+        def convert_member(value: Any) -> Any:
+            if isinstance(value, dict) and "kind" in value:
+                # Keys that are not fields, such as "kind", are ignored
+                return construct_trusted(union.member(value["kind"]), value)
+            if isinstance(value, union.types):
+                return value
+            return union.validate(value)
+
+        return convert_member
+    origin = get_origin(annotation)
+    if origin is Union:
+        members = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(members) == 1:
+            convert = _trusted_converter(members[0])
+            return lambda value: None if value is None else convert(value)
+        # Unions of plain values, such as paths and SQL statements, are kept as they are
+        return lambda value: value
+    if origin in (list, List):
+        (item_type,) = get_args(annotation)
+        convert_item = _trusted_converter(item_type)
+        return lambda value: [convert_item(item) for item in value]
+    if isinstance(annotation, type) and issubclass(annotation, BaseXmlModel):
+        model_type = annotation
+        return lambda value: construct_trusted(model_type, value)
+    return lambda value: value
+
+
+_STREAM_MARKERS: Final[Tuple[str, str]] = ("pyciv7-stream-1", "pyciv7-stream-2")
+_UNSAFE_TEXT: Final[Pattern[str]] = re.compile(r"[\x00-\x08\x0b\x0c\x0d\x0e-\x1f]")
+
+
+def _split_at(xml: str, marker: str) -> Tuple[str, str]:
+    head, found, tail = xml.partition(marker)
+    if not found:
+        raise ValueError(f"{marker!r} not found in {xml!r}")
+    return head, tail
+
+
+@lru_cache(maxsize=None)
+def _marker_action() -> "ImportFiles":
+    # Shared so its plan is only built once, however many action groups are streamed
+    return ImportFiles(items=[_STREAM_MARKERS[0]], mod_dir=".")
+
+
+def _marker_action_group() -> ActionGroup:
+    return ActionGroup(
+        id=_STREAM_MARKERS[0],
+        scope="game",
+        criteria=_STREAM_MARKERS[0],
+        actions=[_marker_action()],
+    )
+
+
+@lru_cache(maxsize=None)
+def _items_template(action_type: Type[ItemsAction]) -> Tuple[str, str, str]:
+    # The XML around and between two items. Actions have no attributes, so it only depends on
+    # the type of the action.
+    action = action_type.model_construct(items=list(_STREAM_MARKERS), mod_dir=".")
+    xml: str = action.to_xml(encoding="unicode", exclude_none=True)  # type: ignore
+    head, rest = _split_at(xml, _STREAM_MARKERS[0])
+    separator, tail = _split_at(rest, _STREAM_MARKERS[1])
+    return head, separator, tail
+
+
+def _items_xml(action_type: Type[ItemsAction], items: List[str]) -> str:
+    head, separator, tail = _items_template(action_type)
+    # Items with control characters are left to the XML backend, which escapes them its own way
+    if any(_UNSAFE_TEXT.search(item) for item in items):
+        action = action_type.model_construct(items=items, mod_dir=".")
+        xml: str = action.to_xml(encoding="unicode", exclude_none=True)  # type: ignore
+        return xml[len(head) : len(xml) - len(tail)]
+    return separator.join(escape(item) for item in items)
+
+
+def _iter_planned_items(
+    action: ItemsAction, emit: Optional[Callable[[ItemsAction], None]]
+) -> Iterator[List[str]]:
+    for batch in action.iter_batches():
+        if emit is not None:
+            emit(batch)
+        items = batch.plan().items
+        for start in range(0, len(items), STREAM_CHUNK_ITEMS):
+            yield items[start : start + STREAM_CHUNK_ITEMS]
+
+
+def _iter_action_xml(
+    action: BaseXmlModel, emit: Optional[Callable[[ItemsAction], None]] = None
+) -> Iterator[str]:
+    if not isinstance(action, ItemsAction):
+        yield action.to_xml(encoding="unicode", exclude_none=True)  # type: ignore
+        return
+    chunks = _iter_planned_items(action, emit)
+    first = next(chunks, None)
+    if first is None:
+        empty = type(action).model_construct(items=[], mod_dir=".")
+        yield empty.to_xml(encoding="unicode", exclude_none=True)  # type: ignore
+        return
+    head, separator, tail = _items_template(type(action))
+    yield head
+    yield _items_xml(type(action), first)
+    for chunk in chunks:
+        yield separator + _items_xml(type(action), chunk)
+    yield tail
+
+
+def _iter_action_group_xml(
+    action_group: ActionGroup, emit: Optional[Callable[[ItemsAction], None]] = None
+) -> Iterator[str]:
+    if not action_group.actions:
+        yield action_group.to_xml(encoding="unicode", exclude_none=True)  # type: ignore
+        return
+    marker = _marker_action()
+    skeleton: str = action_group.model_copy(update={"actions": [marker]}).to_xml(
+        encoding="unicode", exclude_none=True
+    )  # type: ignore
+    head, tail = _split_at(skeleton, marker.to_xml(encoding="unicode"))  # type: ignore
+    yield head
+    for action in action_group.actions:
+        yield from _iter_action_xml(action, emit)
+    yield tail
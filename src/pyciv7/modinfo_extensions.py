@@ -3,17 +3,381 @@ Pydantic models and utilities that provide extended `.modinfo` functionality bey
 Civilization 7 modding guide.
 """
 
+import asyncio
+import hashlib
+import importlib
+import importlib.resources
+import io
+import json
+import keyword
+import os
+import shutil
 import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from contextvars import copy_context
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Literal
+from types import SimpleNamespace
+from typing import (
+    Annotated,
+    Any,
+    Dict,
+    Final,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
-from pydantic import Field, field_validator, model_serializer
-from rich.status import Status
+from pydantic import Field, ValidationInfo, field_validator
+from pydantic_xml import NoXml
 
+from pyciv7.artifacts import ActionPlan, Artifact
+from pyciv7.context import BuildContext
 from pyciv7.errors import ModDirSerializationError, TranspileError
+from pyciv7.manifest import BuildManifest
 from pyciv7.modinfo import UIScripts, validate_item_ext
-from pyciv7.settings import Settings
-from pyciv7.utils import StrPath
+from pyciv7.tracing import ACTION, ITEM, span
+from pyciv7.transpile_cache import TranspileCache, local_imports
+from pyciv7.utils import StrPath, atomic_write_text, status
+
+BATCH_MODULE_NAME: Final[str] = "__pyciv7_batch__"
+"""
+Name of the generated entry module that imports every item of a batched Transcrypt session.
+"""
+
+BOOTSTRAP_TEMPLATE: Final[str] = "transcrypt_hook.js"
+"""
+Name of the resource the bootstrap scripts of `PythonGameScripts` are generated from.
+"""
+
+_transcrypt_lock = threading.Lock()
+
+
+def move_outputs(staging_dir: Path, outdir: Path, skip: Sequence[str] = ()) -> None:
+    """
+    Moves the files Transcrypt wrote to a staging directory into the output directory.
+
+    Transcrypt wipes its output directory when `--build` is used, so it is never pointed
+    directly at the transcrypt sub-directory of a mod.
+
+    Parameters:
+        staging_dir: The directory Transcrypt wrote to.
+        outdir: Directory the transpiled JavaScript is moved to.
+        skip: Module names whose outputs are discarded instead of moved.
+    """
+    for file in staging_dir.rglob("*"):
+        if file.is_dir() or file.suffix == ".project":
+            continue
+        if any(file.name.startswith(f"{name}.") for name in skip):
+            continue
+        target = outdir / file.relative_to(staging_dir)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(file, target)
+
+
+def run_transcrypt(
+    source: Path, outdir: Path, flags: Sequence[str] = ()
+) -> Optional[subprocess.CalledProcessError]:
+    """
+    Transpiles a single Python script to JavaScript with a `transcrypt` subprocess.
+
+    Parameters:
+        source: The `.py` file to transpile.
+        outdir: Directory the transpiled JavaScript is written to.
+        flags: Additional command line flags passed to `transcrypt`.
+
+    Returns:
+        The error of the `transcrypt` subprocess if it failed, otherwise `None`.
+    """
+    with span("transcrypt", ITEM, source=source.name):
+        staging_dir = Path(tempfile.mkdtemp(prefix=".staging-", dir=outdir)).resolve()
+        try:
+            subprocess.run(
+                ["transcrypt", "--build", *flags, source, "--outdir", staging_dir],
+                text=True,
+                capture_output=True,
+                check=True,
+            )
+        except subprocess.CalledProcessError as e:
+            return e
+        else:
+            move_outputs(staging_dir, outdir)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+async def run_transcrypt_async(
+    source: Path, outdir: Path, flags: Sequence[str] = ()
+) -> Optional[subprocess.CalledProcessError]:
+    """
+    Transpiles a single Python script to JavaScript with a `transcrypt` subprocess, without
+    blocking the event loop. The subprocess is killed if the task is cancelled.
+
+    Parameters:
+        source: The `.py` file to transpile.
+        outdir: Directory the transpiled JavaScript is written to.
+        flags: Additional command line flags passed to `transcrypt`.
+
+    Returns:
+        The error of the `transcrypt` subprocess if it failed, otherwise `None`.
+    """
+    with span("transcrypt", ITEM, source=source.name):
+        staging_dir = Path(tempfile.mkdtemp(prefix=".staging-", dir=outdir)).resolve()
+        try:
+            args = ["transcrypt", "--build", *flags, source, "--outdir", staging_dir]
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                stdout, stderr = await process.communicate()
+            except asyncio.CancelledError:
+                process.kill()
+                await process.wait()
+                raise
+            if process.returncode:
+                return subprocess.CalledProcessError(
+                    process.returncode,
+                    args,
+                    output=stdout.decode(errors="replace"),
+                    stderr=stderr.decode(errors="replace"),
+                )
+            await asyncio.to_thread(move_outputs, staging_dir, outdir)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+    return None
+
+
+def run_transcrypt_in_process(args: Sequence[str]) -> Tuple[int, str]:
+    """
+    Runs Transcrypt's command line interface in the current interpreter.
+
+    Transcrypt keeps its configuration in global state, so sessions are serialized and the
+    interpreter's `sys.path` and `sys.argv` are restored afterwards.
+
+    Parameters:
+        args: The command line arguments passed to Transcrypt.
+
+    Returns:
+        The exit code of Transcrypt and everything it logged.
+    """
+    log = io.StringIO()
+    with _transcrypt_lock:
+        path, argv = sys.path, sys.argv
+        try:
+            with redirect_stdout(log):
+                transcrypt_main = importlib.import_module("transcrypt.__main__")
+            transpilation_dirs = list(transcrypt_main.transpilationDirs)
+            atexit = transcrypt_main.atexit
+            # Transcrypt would otherwise log "Ready" or "Aborted" when the interpreter exits
+            transcrypt_main.atexit = SimpleNamespace(register=lambda handler: handler)
+            sys.path = [*path, transcrypt_main.modulesDir]
+            sys.argv = ["transcrypt", *args]
+            try:
+                with redirect_stdout(log):
+                    exit_code = transcrypt_main.main()
+            except SystemExit as e:
+                exit_code = e.code if isinstance(e.code, int) else 1
+            finally:
+                transcrypt_main.atexit = atexit
+                transcrypt_main.transpilationDirs[:] = transpilation_dirs
+        finally:
+            sys.path, sys.argv = path, argv
+    return exit_code, log.getvalue()
+
+
+def run_transcrypt_batch(
+    sources: Sequence[Path], outdir: Path, flags: Sequence[str] = ()
+) -> Optional[subprocess.CalledProcessError]:
+    """
+    Transpiles several Python scripts to JavaScript in a single in-process Transcrypt session.
+
+    Transcrypt compiles every module a program imports, so the scripts are transpiled by
+    compiling a generated entry module that imports all of them. The Transcrypt runtime is
+    compiled once and shared by every generated module.
+
+    Parameters:
+        sources: The `.py` files to transpile. Their names must be valid module names.
+        outdir: Directory the transpiled JavaScript is written to.
+        flags: Additional command line flags passed to Transcrypt.
+
+    Returns:
+        An error holding Transcrypt's log if the session failed, otherwise `None`.
+    """
+    with span("transcrypt batch", ACTION, sources=len(sources)):
+        staging_dir = Path(tempfile.mkdtemp(prefix=".staging-", dir=outdir)).resolve()
+        try:
+            entry_dir = staging_dir / "entry"
+            entry_dir.mkdir()
+            entry = entry_dir / f"{BATCH_MODULE_NAME}.py"
+            entry.write_text("".join(f"import {source.stem}\n" for source in sources))
+            search_dirs = dict.fromkeys(
+                source.resolve().parent.as_posix().replace(" ", "#")
+                for source in sources
+            )
+            target_dir = staging_dir / "target"
+            args = [
+                "--build",
+                *flags,
+                "--xpath",
+                "$".join(search_dirs),
+                "--outdir",
+                target_dir.as_posix(),
+                entry.as_posix(),
+            ]
+            exit_code, log = run_transcrypt_in_process(args)
+            if exit_code:
+                return subprocess.CalledProcessError(
+                    exit_code, ["transcrypt", *args], output=log
+                )
+            move_outputs(target_dir, outdir, skip=[BATCH_MODULE_NAME])
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+@lru_cache(maxsize=None)
+def bootstrap_template() -> str:
+    """
+    Returns:
+        The template of the bootstrap scripts, see `BOOTSTRAP_TEMPLATE`.
+    """
+    resource = importlib.resources.files("pyciv7") / "resources" / BOOTSTRAP_TEMPLATE
+    return resource.read_text(encoding="utf-8")
+
+
+def render_bootstrap(modules: Sequence[Tuple[str, str, bool]]) -> str:
+    """
+    Generates a bootstrap script importing transpiled modules with `import('fs://game/...')`.
+
+    Parameters:
+        modules: The key of each module in the `pyciv7` registry shared by every mod, its path
+            relative to `fs://game/` and `True` if it is only imported on demand.
+
+    Returns:
+        The bootstrap script.
+    """
+    return bootstrap_template().replace("<MODULES>", json.dumps(modules))
+
+
+def bootstrap_file_name(script: str) -> str:
+    """
+    Derives the name of a bootstrap script from its contents, like `sql_file_name`.
+
+    Parameters:
+        script: The bootstrap script.
+
+    Returns:
+        The name of the bootstrap script.
+    """
+    return f"bootstrap-{hashlib.sha256(script.encode()).hexdigest()[:16]}.js"
+
+
+@dataclass(frozen=True)
+class BootstrapScript(Artifact):
+    """
+    The script loading the transpiled modules of a `PythonGameScripts` action, see
+    `PythonGameScripts.bootstrap`.
+    """
+
+    path: Path
+    """
+    The path of the script. Its name is derived from `script`, see `bootstrap_file_name`.
+    """
+    script: str
+    """
+    The generated JavaScript.
+    """
+
+    @property
+    def outputs(self) -> List[Path]:
+        return [self.path]
+
+    def emit(self, manifest: Optional[BuildManifest] = None) -> None:
+        if manifest is not None:
+            manifest.write_text(self.path, self.script)
+        # The file is content-addressed, so an existing file always holds the same script
+        elif not self.path.exists():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_text(self.path, self.script)
+
+
+class TranspiledScripts(Artifact):
+    """
+    JavaScript transpiled from the Python scripts of a `PythonGameScripts` action.
+    """
+
+    def __init__(
+        self, scripts: "PythonGameScripts", sources: List[Path], outdir: Path
+    ) -> None:
+        """
+        Parameters:
+            scripts: The action the scripts belong to.
+            sources: The `.py` files to transpile.
+            outdir: Directory the transpiled JavaScript is written to.
+        """
+        self.scripts = scripts
+        self.sources = sources
+        self.outdir = outdir
+
+    @property
+    def outputs(self) -> List[Path]:
+        return [self.outdir / source.with_suffix(".js").name for source in self.sources]
+
+    @property
+    def inputs(self) -> List[Path]:
+        inputs = dict.fromkeys(self.sources)
+        for source in self.sources:
+            inputs.update(dict.fromkeys(sorted(local_imports(source))))
+        return list(inputs)
+
+    def emit(self, manifest: Optional[BuildManifest] = None) -> None:
+        self.outdir.mkdir(exist_ok=True, parents=True)
+        cache = TranspileCache(self.outdir, self.scripts.flags)
+        stale = [
+            source
+            for source, output in zip(self.sources, self.outputs)
+            if not cache.is_fresh(source, output)
+        ]
+        if stale:
+            try:
+                self.scripts.run_backend(stale, self.outdir, cache)
+            finally:
+                cache.save()
+        if manifest is not None:
+            for source, output in zip(self.sources, self.outputs):
+                manifest.record(output, cache.key(source))
+
+    async def emit_async(self, manifest: Optional[BuildManifest] = None) -> None:
+        """
+        Like `emit`, but transpiles the stale sources without blocking the event loop, see
+        `PythonGameScripts.run_backend_async`.
+
+        Parameters:
+            manifest: The manifest of the build the outputs are recorded in, if any.
+        """
+        self.outdir.mkdir(exist_ok=True, parents=True)
+        cache = TranspileCache(self.outdir, self.scripts.flags)
+        stale = [
+            source
+            for source, output in zip(self.sources, self.outputs)
+            if not cache.is_fresh(source, output)
+        ]
+        if stale:
+            try:
+                await self.scripts.run_backend_async(stale, self.outdir, cache)
+            finally:
+                await asyncio.to_thread(cache.save)
+        if manifest is not None:
+            for source, output in zip(self.sources, self.outputs):
+                manifest.record(output, cache.key(source))
 
 
 class PythonGameScripts(UIScripts):
@@ -25,50 +389,259 @@ class PythonGameScripts(UIScripts):
     """
     The backend to use for convert Python to JavaScript.
     """
+    mode: Literal["sequential", "parallel", "batch"] = Field(
+        default="sequential", exclude=True
+    )
+    """
+    How the items are transpiled. `sequential` transpiles one item after another, `parallel`
+    transpiles independent items at the same time, and `batch` transpiles every item in a single
+    in-process Transcrypt session that emits one shared runtime module.
+    """
+    max_workers: Optional[int] = Field(default=None, gt=0, exclude=True)
+    """
+    The maximum number of items transpiled at the same time in `parallel` mode. Defaults to the
+    number of CPUs.
+    """
+    flags: Annotated[List[str], NoXml] = Field(default_factory=list, exclude=True)
+    """
+    Additional command line flags passed to Transcrypt, e.g. `["--esv", "6"]`.
+    """
+    bootstrap: bool = Field(default=False, exclude=True)
+    """
+    `True` to list a single bootstrap script, generated from `BOOTSTRAP_TEMPLATE`, in place of
+    the transpiled items. The bootstrap script imports the transpiled modules with
+    `import('fs://game/<mod directory name>/...')` and logs the modules that fail to import.
+    """
+    lazy: List[StrPath] = Field(default_factory=list, exclude=True)
+    """
+    Items the bootstrap script only imports on demand, so they do not add to the startup time of
+    the UI. `pyciv7.load("<mod directory name>/<module name>")` imports a module, once, and
+    returns a promise of its namespace. Every mod shares the UI's JavaScript context, so modules
+    are qualified by the directory of their mod. The other items are imported when the UI
+    starts. Requires `bootstrap`.
+    """
 
     @field_validator("items")
     def validate_items(cls, items: List[StrPath]) -> List[StrPath]:
         return [validate_item_ext(item, ".py") for item in items]
 
-    @model_serializer()
-    def to_javascript(self) -> Dict[str, Any]:
-        if self.backend == "transcrypt":
-            return self.transpile()
-        raise NotImplementedError(f"Unsupported backend: {self.backend}")
+    @field_validator("bootstrap")
+    def check_bootstrap_is_eager(cls, bootstrap: bool, info: ValidationInfo) -> bool:
+        if bootstrap and info.data.get("lazy_items") is not None:
+            raise ValueError(
+                '"bootstrap" needs every item up front and cannot be used with "lazy_items"'
+            )
+        return bootstrap
+
+    @field_validator("lazy")
+    def check_lazy_items(
+        cls, lazy: List[StrPath], info: ValidationInfo
+    ) -> List[StrPath]:
+        if lazy and not info.data.get("bootstrap"):
+            raise ValueError('"lazy" items are imported by the "bootstrap" script')
+        items = {Path(item) for item in info.data.get("items", [])}
+        for item in lazy:
+            if Path(item) not in items:
+                raise ValueError(f'"{item}" is not an item of the action')
+        return lazy
+
+    def plan_inputs(self) -> Dict[str, Any]:
+        return {**super().plan_inputs(), "settings": BuildContext.current().settings}
 
-    def transpile(self) -> Dict[str, Any]:
+    def build_plan(self) -> ActionPlan:
+        if self.backend != "transcrypt":
+            raise NotImplementedError(f"Unsupported backend: {self.backend}")
         if not self.mod_dir:
             raise ModDirSerializationError(
                 '"mod_dir" must be set prior to serialization.'
             )
-        transcrypt_dir = Path(self.mod_dir) / Settings().transcrypt_sub_dir
-        transcrypt_dir.mkdir(exist_ok=True, parents=True)
+        mod_dir = Path(self.mod_dir)
+        transcrypt_sub_dir = BuildContext.current().settings.transcrypt_sub_dir
+        lazy = {
+            Path(item) if Path(item).is_absolute() else mod_dir / item
+            for item in self.lazy
+        }
+        # The game addresses the files of a mod by its directory name
+        game_dir = mod_dir.absolute().name
         new_items = []
+        sources: List[Path] = []
+        # The key, game path and laziness of each module imported by the bootstrap script
+        modules: List[Tuple[str, str, bool]] = []
         for item in self.items:
             item = Path(item)
             if item.suffix.lower() == ".py":
-                transpiled_file = transcrypt_dir / item.with_suffix(".js").name
-                if not transpiled_file.exists():
-                    # Use transcrypt to transpile Python to JavaScript
-                    with Status(f"Transpiling {item.name}..."):
-                        try:
-                            subprocess.run(
-                                [
-                                    "transcrypt",
-                                    "--build",
-                                    item,
-                                    "--outdir",
-                                    transcrypt_dir,
-                                ],
-                                text=True,
-                                capture_output=True,
-                                check=True,
+                source = item if item.is_absolute() else mod_dir / item
+                new_source = source not in sources
+                if new_source:
+                    # Transpiled scripts are named after their module, in a single directory
+                    for other in sources:
+                        if other.stem == source.stem:
+                            raise ValueError(
+                                f'"{other}" and "{source}" would both be transpiled to '
+                                f'"{source.stem}.js"'
                             )
-                        except subprocess.CalledProcessError as e:
-                            raise TranspileError(
-                                f"Failed to transpile {item.name}"
-                            ) from e
-                    # Reassign item to new transpiled JavaScript
-                    item = transpiled_file
+                    sources.append(source)
+                # Reassign item to new transpiled JavaScript
+                item = transcrypt_sub_dir / item.with_suffix(".js").name
+                if self.bootstrap:
+                    if new_source:
+                        path = f"{game_dir}/{item.as_posix()}"
+                        key = f"{game_dir}/{source.stem}"
+                        modules.append((key, path, source in lazy))
+                    continue
             new_items.append(item)
-        return UIScripts(items=new_items, mod_dir=self.mod_dir).model_dump()
+        artifacts: List[Artifact] = []
+        if sources:
+            artifacts.append(
+                TranspiledScripts(self, sources, mod_dir / transcrypt_sub_dir)
+            )
+        if modules:
+            script = render_bootstrap(modules)
+            item = transcrypt_sub_dir / bootstrap_file_name(script)
+            # The bootstrap script takes the place of the transpiled items
+            new_items.insert(0, item)
+            artifacts.append(BootstrapScript(mod_dir / item, script))
+        return ActionPlan(items=self.relative_items(new_items), artifacts=artifacts)
+
+    def run_backend(
+        self, sources: List[Path], outdir: Path, cache: TranspileCache
+    ) -> None:
+        """
+        Transpiles the `sources` into `outdir`, either one after another or concurrently
+        depending on `mode`.
+
+        Parameters:
+            sources: The `.py` files to transpile.
+            outdir: Directory the transpiled JavaScript is written to.
+            cache: The cache successfully transpiled `sources` are recorded in.
+
+        Raises:
+            TranspileError: If any of the `sources` failed to transpile. Every failure is
+                reported, not only the first one.
+        """
+        errors: List[Optional[subprocess.CalledProcessError]]
+        if self.mode == "parallel":
+            max_workers = self.max_workers or os.cpu_count() or 1
+            with status(f"Transpiling {len(sources)} scripts..."):
+                # Each task only waits on its own transcrypt subprocess, so threads are enough
+                # to keep one process per worker busy. Tasks run in a copy of the current
+                # context, so their spans are recorded by the active tracer
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    errors = list(
+                        executor.map(
+                            lambda source, context: context.run(
+                                run_transcrypt, source, outdir, self.flags
+                            ),
+                            sources,
+                            [copy_context() for _ in sources],
+                        )
+                    )
+        elif self.mode == "batch":
+            batch = [
+                source
+                for source in sources
+                if source.stem.isidentifier() and not keyword.iskeyword(source.stem)
+            ]
+            with status(f"Transpiling {len(batch)} scripts..."):
+                error = (
+                    run_transcrypt_batch(batch, outdir, self.flags) if batch else None
+                )
+            errors = []
+            for source in sources:
+                if source in batch:
+                    errors.append(error)
+                else:
+                    # Scripts that cannot be imported by name are transpiled on their own
+                    with status(f"Transpiling {source.name}..."):
+                        errors.append(run_transcrypt(source, outdir, self.flags))
+        else:
+            errors = []
+            for source in sources:
+                with status(f"Transpiling {source.name}..."):
+                    errors.append(run_transcrypt(source, outdir, self.flags))
+        self.check_errors(sources, errors, cache)
+
+    async def run_backend_async(
+        self, sources: List[Path], outdir: Path, cache: TranspileCache
+    ) -> None:
+        """
+        Like `run_backend`, but waits on the `transcrypt` subprocesses without blocking the event
+        loop. In `parallel` mode, at most `max_workers` subprocesses run at the same time. The
+        in-process session of `batch` mode runs in a worker thread.
+
+        Parameters:
+            sources: The `.py` files to transpile.
+            outdir: Directory the transpiled JavaScript is written to.
+            cache: The cache successfully transpiled `sources` are recorded in.
+
+        Raises:
+            TranspileError: If any of the `sources` failed to transpile.
+        """
+        if self.mode == "batch":
+            await asyncio.to_thread(self.run_backend, sources, outdir, cache)
+            return
+        errors: List[Optional[subprocess.CalledProcessError]]
+        if self.mode == "parallel":
+            slots = asyncio.Semaphore(self.max_workers or os.cpu_count() or 1)
+
+            async def transpile(
+                source: Path,
+            ) -> Optional[subprocess.CalledProcessError]:
+                async with slots:
+                    return await run_transcrypt_async(source, outdir, self.flags)
+
+            errors = list(await asyncio.gather(*map(transpile, sources)))
+        else:
+            errors = []
+            for source in sources:
+                errors.append(await run_transcrypt_async(source, outdir, self.flags))
+        self.check_errors(sources, errors, cache)
+
+    def check_errors(
+        self,
+        sources: List[Path],
+        errors: List[Optional[subprocess.CalledProcessError]],
+        cache: TranspileCache,
+    ) -> None:
+        """
+        Records the successfully transpiled `sources` in the cache and reports the others.
+
+        Parameters:
+            sources: The transpiled `.py` files.
+            errors: The error of each source, or `None` if it was transpiled.
+            cache: The cache successfully transpiled `sources` are recorded in.
+
+        Raises:
+            TranspileError: If any of the `sources` failed to transpile.
+        """
+        failures = []
+        for source, error in zip(sources, errors):
+            if error is None:
+                cache.update(source)
+            else:
+                failures.append((source, error))
+        if failures:
+            # A batched session fails as a whole, so group the sources sharing an error
+            grouped: Dict[int, Tuple[subprocess.CalledProcessError, List[Path]]] = {}
+            for source, error in failures:
+                grouped.setdefault(id(error), (error, []))[1].append(source)
+            details = "\n".join(
+                ", ".join(source.name for source in group)
+                + ":\n"
+                + (error.stderr or error.output or "").strip()
+                for error, group in grouped.values()
+            )
+            raise TranspileError(
+                "Failed to transpile "
+                + ", ".join(source.name for source, _ in failures)
+                + f"\n{details}"
+            ) from failures[0][1]
+
+    async def transpile_async(self) -> None:
+        """
+        Transpiles the items that changed since they were last transpiled without blocking the
+        event loop. A build then finds the transpiled JavaScript up to date.
+        """
+        for artifact in self.plan().artifacts:
+            if isinstance(artifact, TranspiledScripts):
+                await artifact.emit_async()
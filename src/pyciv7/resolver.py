@@ -0,0 +1,252 @@
+"""
+Module resolving the load order of a set of mods from their `Dependencies`, `References` and the
+`LoadOrder` of their action groups.
+"""
+
+import heapq
+from dataclasses import dataclass, field
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Final,
+    FrozenSet,
+    Iterable,
+    List,
+    Tuple,
+    Union,
+)
+
+from pyciv7.index import IndexedActionGroup, IndexedMod, ModIndex
+
+if TYPE_CHECKING:
+    from pyciv7.modinfo import Mod
+
+BUILTIN_MOD_IDS: Final[FrozenSet[str]] = frozenset(
+    {"core", "base-standard", "age-antiquity", "age-exploration", "age-modern"}
+)
+"""
+Modules every mod depends on by default. They ship with the game, so they are assumed to be
+installed when resolving mods without an index of the installation.
+"""
+
+
+@dataclass
+class Resolution:
+    """
+    The outcome of `resolve`.
+    """
+
+    order: List[IndexedMod] = field(default_factory=list)
+    """
+    The mods in load order: every mod comes after its dependencies and the references that are
+    part of the resolved mods.
+    """
+    action_groups: List[Tuple[IndexedMod, IndexedActionGroup]] = field(
+        default_factory=list
+    )
+    """
+    The action groups of the ordered mods in load order, see `resolve`.
+    """
+    cycles: List[List[str]] = field(default_factory=list)
+    """
+    The ids of the mods of each dependency cycle. Mods in a cycle cannot be loaded.
+    """
+    blocked: List[str] = field(default_factory=list)
+    """
+    The ids of the mods that cannot be loaded because they depend on a cycle.
+    """
+    missing: Dict[str, List[str]] = field(default_factory=dict)
+    """
+    The ids of the dependencies that are not available, by the id of the mods depending on
+    them.
+    """
+
+    @property
+    def ok(self) -> bool:
+        """
+        `True` if every mod can be loaded with all of its dependencies.
+        """
+        return not (self.cycles or self.blocked or self.missing)
+
+
+def _load_order(mod: IndexedMod) -> int:
+    # Mods go as early as the earliest of their action groups
+    return min(
+        (
+            group.load_order
+            for group in mod.action_groups
+            if group.load_order is not None
+        ),
+        default=0,
+    )
+
+
+def _group_load_order(group: IndexedActionGroup) -> int:
+    return group.load_order if group.load_order is not None else 0
+
+
+def _merge_action_groups(
+    order: List[IndexedMod], dependents: Dict[str, List[str]]
+) -> List[Tuple[IndexedMod, IndexedActionGroup]]:
+    # Merges the action groups of every mod by `LoadOrder`, then by the rank of their mod in
+    # `order`. The groups of a mod only become ready once every group of the mods it requires
+    # was merged, so dependency edges win over `LoadOrder`
+    rank = {mod.id: position for position, mod in enumerate(order)}
+    queues = {mod.id: sorted(mod.action_groups, key=_group_load_order) for mod in order}
+    waiting = dict.fromkeys(rank, 0)
+    for mod in order:
+        for dependent in dependents[mod.id]:
+            if dependent in rank:
+                waiting[dependent] += 1
+    ready: List[Tuple[int, int, int]] = []
+    merged: List[Tuple[IndexedMod, IndexedActionGroup]] = []
+
+    def unlock(mod_id: str) -> None:
+        # A mod without action groups unlocks its dependents right away
+        pending = [mod_id]
+        while pending:
+            mod_id = pending.pop()
+            if queues[mod_id]:
+                group = queues[mod_id][0]
+                heapq.heappush(ready, (_group_load_order(group), rank[mod_id], 0))
+                continue
+            for dependent in dependents[mod_id]:
+                if dependent in waiting:
+                    waiting[dependent] -= 1
+                    if waiting[dependent] == 0:
+                        pending.append(dependent)
+
+    for mod_id, count in list(waiting.items()):
+        if count == 0:
+            unlock(mod_id)
+    while ready:
+        _, mod_rank, position = heapq.heappop(ready)
+        mod = order[mod_rank]
+        groups = queues[mod.id]
+        merged.append((mod, groups[position]))
+        if position + 1 < len(groups):
+            group = groups[position + 1]
+            heapq.heappush(ready, (_group_load_order(group), mod_rank, position + 1))
+        else:
+            queues[mod.id] = []
+            unlock(mod.id)
+    return merged
+
+
+def _find_cycles(graph: Dict[str, List[str]]) -> List[List[str]]:
+    # Tarjan's strongly connected components, iteratively so deep graphs do not hit the
+    # recursion limit
+    index: Dict[str, int] = {}
+    low: Dict[str, int] = {}
+    on_stack = set()
+    stack: List[str] = []
+    cycles = []
+    for root in graph:
+        if root in index:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, child = work.pop()
+            if child == 0:
+                index[node] = low[node] = len(index)
+                stack.append(node)
+                on_stack.add(node)
+            children = graph[node]
+            if child < len(children):
+                work.append((node, child + 1))
+                successor = children[child]
+                if successor not in index:
+                    work.append((successor, 0))
+                elif successor in on_stack:
+                    low[node] = min(low[node], index[successor])
+                continue
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                if len(component) > 1 or node in graph[node]:
+                    cycles.append(sorted(component))
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+    return sorted(cycles)
+
+
+def resolve(
+    mods: Union[ModIndex, Iterable[Union["Mod", IndexedMod]]],
+    available: Iterable[str] = BUILTIN_MOD_IDS,
+) -> Resolution:
+    """
+    Resolves the load order of mods. Dependencies and references are loaded before the mods
+    listing them; among the mods that are ready to load, those whose action groups have the
+    lowest `LoadOrder` come first, then ties are broken by id, so the order is deterministic.
+
+    Action groups are merged across mods by `LoadOrder`, then by the position of their mod in
+    the load order, except that the groups of a mod always come after every group of the mods
+    it requires.
+
+    The graph is sorted with Kahn's algorithm and a heap, in `O((V + E) log V)` time for `V`
+    mods and `E` dependencies, so thousands of mods resolve in milliseconds.
+
+    Parameters:
+        mods: The `Mod`s, indexed mods or `ModIndex` to resolve. When several mods share an
+            id, the first one is used.
+        available: The ids of mods that are not part of `mods` but are installed, such as the
+            modules shipped with the game. Defaults to `BUILTIN_MOD_IDS`.
+
+    Returns:
+        The load order, with the cycles and missing dependencies that were found.
+    """
+    by_id: Dict[str, IndexedMod] = {}
+    for mod in mods:
+        indexed = mod if isinstance(mod, IndexedMod) else IndexedMod.from_mod(mod)
+        by_id.setdefault(indexed.id, indexed)
+    available = set(available)
+    resolution = Resolution()
+    # Edges go from a mod to the mods that must load after it
+    dependents: Dict[str, List[str]] = {mod_id: [] for mod_id in by_id}
+    indegree: Dict[str, int] = dict.fromkeys(by_id, 0)
+    for mod in by_id.values():
+        requirements = dict.fromkeys(mod.dependencies)
+        for dependency in requirements:
+            if dependency not in by_id and dependency not in available:
+                resolution.missing.setdefault(mod.id, []).append(dependency)
+        # References are optional, but still load first when they are present
+        requirements.update(dict.fromkeys(mod.references))
+        for requirement in requirements:
+            if requirement in by_id:
+                dependents[requirement].append(mod.id)
+                indegree[mod.id] += 1
+    ready = [
+        (_load_order(mod), mod_id)
+        for mod_id, mod in by_id.items()
+        if indegree[mod_id] == 0
+    ]
+    heapq.heapify(ready)
+    while ready:
+        _, mod_id = heapq.heappop(ready)
+        resolution.order.append(by_id[mod_id])
+        for dependent in dependents[mod_id]:
+            indegree[dependent] -= 1
+            if indegree[dependent] == 0:
+                heapq.heappush(ready, (_load_order(by_id[dependent]), dependent))
+    resolution.action_groups = _merge_action_groups(resolution.order, dependents)
+    if len(resolution.order) < len(by_id):
+        unresolved = {mod_id for mod_id, degree in indegree.items() if degree > 0}
+        resolution.cycles = _find_cycles(
+            {
+                mod_id: [
+                    dependent
+                    for dependent in dependents[mod_id]
+                    if dependent in unresolved
+                ]
+                for mod_id in sorted(unresolved)
+            }
+        )
+        in_cycle = {mod_id for cycle in resolution.cycles for mod_id in cycle}
+        resolution.blocked = sorted(unresolved - in_cycle)
+    return resolution
@@ -1,12 +1,33 @@
-(async () => {
-    try {
-        const mod = await import('fs://game/<REL_PATH>');
-
-        // Transcrypt usually exports { <MOD> } or default, or direct names
-        // const ns = mod.test || mod.default || mod;
-        // optional: expose for non-module code
-        // window.<MOD> = ns;
-    } catch (e) {
-        console.error('Failed to import <MOD>', e);
+// Generated by pyciv7: bootstraps the modules transpiled by Transcrypt for a PythonGameScripts
+// action. Eager modules are imported when the UI starts, lazy modules on their first
+// `pyciv7.load('<mod directory name>/<module name>')`. Every mod shares the registry, so modules
+// are keyed by their mod. Each module is imported at most once and failures are logged.
+(() => {
+    const pyciv7 = (globalThis.pyciv7 = globalThis.pyciv7 || {});
+    const modules = (pyciv7.modules = pyciv7.modules || {});
+    pyciv7.load =
+        pyciv7.load ||
+        ((name) => {
+            const module = modules[name];
+            if (!module) {
+                return Promise.reject(new Error(`Unknown Python module ${name}`));
+            }
+            if (!module.promise) {
+                module.promise = import(`fs://game/${module.path}`).catch((e) => {
+                    console.error(`Failed to import ${name}`, e);
+                    // Lets a later load try again
+                    module.promise = null;
+                    throw e;
+                });
+            }
+            return module.promise;
+        });
+    // [key, path relative to fs://game/, lazy] of each module
+    for (const [name, path, lazy] of <MODULES>) {
+        modules[name] = modules[name] || { path, promise: null };
+        if (!lazy) {
+            // Already logged
+            pyciv7.load(name).catch(() => {});
+        }
     }
 })();
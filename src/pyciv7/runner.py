@@ -2,30 +2,58 @@
 Module pertaining to building Civilization 7 mods and running them in debug mode.
 """
 
+import asyncio
+import multiprocessing
+import os
+import pickle
+import runpy
 import subprocess
-from contextlib import contextmanager, nullcontext
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext, suppress
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Callable, Generator, Optional
+from threading import Event
+from typing import Any, Callable, Dict, Generator, Iterable, List, Optional
 import warnings
+from xml.etree import ElementTree
 
+import rich
 from rich import print
-from rich.status import Status
 
-from pyciv7.errors import ModExistsError
-from pyciv7.modinfo import Mod
-from pyciv7.settings import Settings
+from pyciv7.context import BuildContext
+from pyciv7.diagnostics import collect
+from pyciv7.errors import BuildCancelledError, ModExistsError
+from pyciv7.manifest import BuildManifest
+from pyciv7.modinfo import (
+    GENERATED_SQL_FILE_PATTERN,
+    ActionGroup,
+    ItemsAction,
+    Mod,
+)
+from pyciv7.settings import Settings, get_settings
+from pyciv7.tracing import PHASE, current_tracer, span, trace
+from pyciv7.utils import StrPath, status
+from pyciv7.watcher import create_watcher
 
 
 @contextmanager
-def debug_settings_enabled() -> Generator[None, None, None]:
+def debug_settings_enabled(
+    settings: Optional[Settings] = None,
+) -> Generator[None, None, None]:
     """
     Runs the game in debug mode with the app options suggested in the `Getting Started` guide
     enabled. The settings are reverted upon exiting the context manager.
 
+    Parameters:
+        settings: Common `Settings` for pyciv7. Defaults to the memoized `get_settings()`.
+
     Returns:
         A context manager with the debug app options enabled.
     """
-    app_options = Settings().civ7_settings_dir / "AppOptions.txt"
+    settings = settings or get_settings()
+    app_options = settings.civ7_settings_dir / "AppOptions.txt"
     old_options = app_options.read_text()
     new_options = []
     for line in old_options.splitlines():
@@ -45,33 +73,102 @@ def debug_settings_enabled() -> Generator[None, None, None]:
     app_options.write_text(old_options)
 
 
+def emit_artifacts(mod: Mod, manifest: Optional[BuildManifest] = None) -> None:
+    """
+    Generates the files planned by the actions of the `Mod`, such as SQL files compiled from SQL
+    statements and JavaScript transpiled from Python scripts. Serializing a `Mod` never touches
+    the disk, so this must be done before its `.modinfo` is usable.
+
+    Only `action_groups` and `items` are covered. `build` emits the files of lazy action groups
+    and items while it writes the `.modinfo`, since they are produced then.
+
+    Parameters:
+        mod: The `Mod` to generate the files of. Its `mod_dir` must be set.
+        manifest: The manifest of the build the files are recorded in, if any. Files that are
+            up to date according to the manifest are not generated again.
+    """
+    for action_group in mod.action_groups or []:
+        for action in action_group.actions:
+            if isinstance(action, ItemsAction):
+                action.emit(manifest)
+
+
+def remove_orphaned_sql_files(mod_dir: Path, sql_sub_dir: Path) -> List[Path]:
+    """
+    Deletes the SQL files generated from SQL statements that are no longer referenced by the
+    `.modinfo` of a mod. SQL files that were not generated by pyciv7 are left untouched.
+
+    Parameters:
+        mod_dir: The root directory of the mod.
+        sql_sub_dir: The sub-directory generated SQL files are written to.
+
+    Returns:
+        The deleted SQL files.
+    """
+    referenced = set()
+    for _, element in ElementTree.iterparse(mod_dir / ".modinfo"):
+        # The "ModInfo" xmlns places every element in a namespace
+        if element.tag.rsplit("}", 1)[-1] == "Item" and element.text:
+            referenced.add((mod_dir / element.text.strip()).resolve())
+        # Keeps memory flat for the .modinfo of generated mods
+        element.clear()
+    removed = []
+    for sql_file in (mod_dir / sql_sub_dir).glob("*.sql"):
+        if (
+            GENERATED_SQL_FILE_PATTERN.fullmatch(sql_file.name)
+            and sql_file.resolve() not in referenced
+        ):
+            sql_file.unlink()
+            removed.append(sql_file)
+    return removed
+
+
 def build(
     mod: Mod,
     path: Optional[Path] = None,
     overwrite: bool = False,
-    settings_factory: Callable[[], Settings] = lambda: Settings(),
-) -> None:
+    settings_factory: Callable[[], Settings] = get_settings,
+    context: Optional[BuildContext] = None,
+    trace_file: Optional[StrPath] = None,
+) -> BuildManifest:
     """
     Builds a new Civilization 7 mod from Python bindings. The root directory of the mod will be
     named as the `id` of the `Mod`.
 
+    Rebuilds are incremental: a manifest stored in the mod directory records the inputs and
+    outputs of every file, and only files whose inputs changed are written again. Unchanged
+    files keep their modification times.
+
     Parameters:
         mod: The `Mod` to build.
         path: Directory of where the mod should be stored under. Normally, this is the `Mods` subdirectory under the Civilization 7 settings directory (default.)
         overwrite: `True` if it is okay to overwrite the directory even if it already exists. This is needed for rebuilds.
-        settings: Common `Settings` for pyciv7.
+        settings_factory: Creates the common `Settings` for pyciv7. Defaults to the memoized
+            `get_settings()`, so settings are only resolved once per process.
+        context: The `BuildContext` of the build, shared by every action of the mod. Created from
+            `settings_factory` by default.
+        trace_file: A file to write the timings of the build to, in the Chrome trace event
+            format. Builds run inside `pyciv7.tracing.trace` are recorded by the active tracer
+            regardless.
+
+    Returns:
+        The manifest of the build. Its `changed` attribute lists the files that were written,
+        modified or removed since the previous build.
 
     Deprecated:
         path: This parameter will be removed in v2.0.0. Use `mod.mod_path` instead.
     """
-    settings = settings_factory()
-    if path:
-        warnings.warn(
-            'The "path" argument is deprecated. Use "mod.mod_dir" instead.',
-            DeprecationWarning,
-            stacklevel=2,
-        )
-        mod.mod_dir = path
+    if trace_file is not None and current_tracer() is None:
+        with trace() as tracer:
+            try:
+                return build(mod, path, overwrite, settings_factory, context)
+            finally:
+                tracer.write_chrome_trace(trace_file)
+    with span("build", PHASE, mod=mod.id):
+        return _build(mod, path, overwrite, settings_factory, context)
+
+
+def _prepare_mod_dir(mod: Mod, overwrite: bool, settings: Settings) -> Path:
     if not mod.mod_dir:
         mod.mod_dir = settings.civ7_settings_dir / "Mods" / mod.id
     mod_dir = Path(mod.mod_dir)
@@ -79,11 +176,406 @@ def build(
         raise ModExistsError(
             f'Mod "{mod.id}" already exists. Use "overwrite=True" to overwrite/rebuild it.'
         )
-    with Status(f'Building .modinfo for "{mod.id}"...'):
-        # Create .modinfo file
-        (mod_dir / ".modinfo").write_text(
-            mod.to_xml(encoding="unicode", exclude_none=True)  # type: ignore
+    return mod_dir
+
+
+def _build(
+    mod: Mod,
+    path: Optional[Path],
+    overwrite: bool,
+    settings_factory: Callable[[], Settings],
+    context: Optional[BuildContext],
+) -> BuildManifest:
+    if context is None:
+        with span("resolve settings"):
+            context = BuildContext(settings_factory())
+    settings = context.settings
+    if path:
+        warnings.warn(
+            'The "path" argument is deprecated. Use "mod.mod_dir" instead.',
+            DeprecationWarning,
+            stacklevel=3,
+        )
+        mod.mod_dir = path
+    mod_dir = _prepare_mod_dir(mod, overwrite, settings)
+    manifest = BuildManifest(mod_dir)
+
+    def emit(action: ItemsAction) -> None:
+        context.check_cancelled()  # type: ignore
+        action.emit(manifest)
+
+    with context.activate(), status(f'Building .modinfo for "{mod.id}"...'):
+        # Create .modinfo file, emitting the artifacts of each action before its items are
+        # written, so lazy action groups and items are produced only once
+        with span("write .modinfo"):
+            manifest.write_stream(mod_dir / ".modinfo", mod.iter_xml(emit=emit))
+        with span("remove orphaned sql files"):
+            for sql_file in remove_orphaned_sql_files(mod_dir, settings.sql_sub_dir):
+                manifest.forget(sql_file)
+        with span("save manifest"):
+            manifest.save()
+    return manifest
+
+
+async def build_async(
+    mod: Mod,
+    overwrite: bool = False,
+    settings_factory: Callable[[], Settings] = get_settings,
+    context: Optional[BuildContext] = None,
+) -> BuildManifest:
+    """
+    Builds a new Civilization 7 mod like `build`, without blocking the event loop, so several
+    mods can be built concurrently on one loop.
+
+    The Python scripts of the action groups are transpiled by `transcrypt` subprocesses the loop
+    waits on, then the rest of the build, which writes the files of the mod, runs in a worker
+    thread. Scripts of lazy action groups are only known once the `.modinfo` is written, so they
+    are transpiled in that thread.
+
+    Cancelling the task kills the running `transcrypt` subprocesses, or stops the worker thread
+    before its next action. The `.modinfo` is left as it was before the build either way.
+
+    Parameters:
+        mod: The `Mod` to build.
+        overwrite: `True` if it is okay to overwrite the directory even if it already exists.
+            This is needed for rebuilds.
+        settings_factory: Creates the common `Settings` for pyciv7. Called in a worker thread,
+            since resolving the settings may search the disk for the game.
+        context: The `BuildContext` of the build. Created from `settings_factory` by default.
+
+    Returns:
+        The manifest of the build, see `build`.
+    """
+    from pyciv7.modinfo_extensions import PythonGameScripts
+
+    if context is None:
+        context = BuildContext(await asyncio.to_thread(settings_factory))
+    _prepare_mod_dir(mod, overwrite, context.settings)
+    with context.activate():
+        with span("transpile", PHASE, mod=mod.id):
+            for action_group in mod.action_groups or []:
+                for action in action_group.actions:
+                    if isinstance(action, PythonGameScripts):
+                        await action.transpile_async()
+        # The thread runs in a copy of the current context, so it records the spans of the
+        # build in the active tracer, if any
+        task = asyncio.ensure_future(
+            asyncio.to_thread(
+                build, mod, overwrite=overwrite, context=context  # type: ignore
+            )
         )
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            context.cancel()
+            # Waits for the thread to stop, so the mod is not written after the task ends
+            with suppress(BuildCancelledError):
+                await task
+            raise
+
+
+@dataclass
+class BuildResult:
+    """
+    The outcome of building one mod with `build_many`.
+    """
+
+    mod_id: str
+    """
+    The `id` of the `Mod`.
+    """
+    mod_dir: Path
+    """
+    The directory the mod was built in.
+    """
+    duration: float
+    """
+    How long building the mod took, in seconds.
+    """
+    error: Optional[BaseException] = None
+    """
+    The exception that made the build fail, if any.
+    """
+    changed: List[Path] = field(default_factory=list)
+    """
+    The files that were written, modified or removed by the build.
+    """
+
+    @property
+    def ok(self) -> bool:
+        """
+        `True` if the mod was built successfully.
+        """
+        return self.error is None
+
+
+def _build_one(mod: Mod, overwrite: bool, settings: Settings) -> BuildResult:
+    mod_dir = Path(mod.mod_dir)  # type: ignore
+    start = time.perf_counter()
+    try:
+        manifest = build(mod, overwrite=overwrite, context=BuildContext(settings))
+    except Exception as e:
+        return BuildResult(mod.id, mod_dir, time.perf_counter() - start, e)
+    return BuildResult(
+        mod.id, mod_dir, time.perf_counter() - start, changed=manifest.changed
+    )
+
+
+def _init_worker(settings: Settings) -> None:
+    # Settings resolved from the environment skip the discovery of the game directories
+    for name, value in settings.model_dump().items():
+        os.environ[name.upper()] = str(value)
+    # Spinners of concurrent builds would overwrite each other
+    rich.reconfigure(quiet=True)
+
+
+def _is_picklable(mod: Mod) -> bool:
+    try:
+        pickle.dumps(mod)
+    except Exception:
+        return False
+    return True
+
+
+def build_many(
+    mods: Iterable[Mod],
+    jobs: Optional[int] = None,
+    overwrite: bool = False,
+    settings_factory: Callable[[], Settings] = get_settings,
+) -> List[BuildResult]:
+    """
+    Builds several Civilization 7 mods in parallel worker processes. Settings are resolved once
+    and shared by every build, and a failing build does not stop the others.
+
+    Mods that cannot be sent to a worker process (e.g. because they hold `Rows` backed by a
+    generator) are built in the current process. Worker processes import the script calling
+    `build_many`, so the call must be guarded by `if __name__ == "__main__":`.
+
+    Parameters:
+        mods: The `Mod`s to build.
+        jobs: The maximum number of mods built at the same time. Defaults to the number of CPUs.
+        overwrite: `True` if it is okay to overwrite mods that already exist. This is needed for
+            rebuilds.
+        settings_factory: Creates the common `Settings` for pyciv7.
+
+    Returns:
+        The result of every build, in the same order as `mods`.
+    """
+    mods = list(mods)
+    settings = settings_factory()
+    for mod in mods:
+        if not mod.mod_dir:
+            mod.mod_dir = settings.civ7_settings_dir / "Mods" / mod.id
+    jobs = jobs or os.cpu_count() or 1
+    results: List[Optional[BuildResult]] = [None] * len(mods)
+    local = []
+    with status(f"Building {len(mods)} mods..."):
+        if jobs > 1 and len(mods) > 1:
+            with ProcessPoolExecutor(
+                max_workers=min(jobs, len(mods)),
+                # Forking a process that may run threads (e.g. parallel transpilation) can
+                # deadlock, and "spawn" behaves the same on every platform
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(settings,),
+            ) as executor:
+                futures = {}
+                for i, mod in enumerate(mods):
+                    if _is_picklable(mod):
+                        futures[i] = executor.submit(
+                            _build_one, mod, overwrite, settings
+                        )
+                    else:
+                        local.append(i)
+                for i in local:
+                    results[i] = _build_one(mods[i], overwrite, settings)
+                for i, future in futures.items():
+                    try:
+                        results[i] = future.result()
+                    except Exception as e:
+                        # E.g. a worker that crashed or an error that could not be pickled
+                        results[i] = BuildResult(
+                            mods[i].id, Path(mods[i].mod_dir), 0.0, e  # type: ignore
+                        )
+        else:
+            for i, mod in enumerate(mods):
+                results[i] = _build_one(mod, overwrite, settings)
+    return results  # type: ignore
+
+
+def watched_sources(mod: Mod) -> Dict[Path, List[ItemsAction]]:
+    """
+    Finds the files the `.modinfo` of a `Mod` is built from: the files its actions use as-is,
+    such as XML, SQL and imported files, and the inputs of generated files, such as Python
+    scripts and the local modules they import.
+
+    Lazy action groups are included if they can be produced again (e.g. by a callable), since
+    the build consumes them. Those of an iterator, such as a generator, are left out.
+
+    Parameters:
+        mod: The `Mod` to inspect. Its `mod_dir` must be set.
+
+    Returns:
+        The absolute path of every source, mapped to the actions using it.
+    """
+    if mod.lazy_action_groups is None or mod.lazy_action_groups.reiterable:
+        action_groups: Iterable[ActionGroup] = mod.iter_action_groups()
+    else:
+        action_groups = mod.action_groups or []
+    sources: Dict[Path, List[ItemsAction]] = {}
+    for action_group in action_groups:
+        for action in action_group.actions:
+            if not isinstance(action, ItemsAction):
+                continue
+            plan = action.plan()
+            outputs = {
+                output for artifact in plan.artifacts for output in artifact.outputs
+            }
+            paths = [
+                artifact_input
+                for artifact in plan.artifacts
+                for artifact_input in artifact.inputs
+            ]
+            paths.extend(
+                Path(action.mod_dir) / item  # type: ignore
+                for item in plan.items
+                if Path(action.mod_dir) / item not in outputs  # type: ignore
+            )
+            for path in paths:
+                actions = sources.setdefault(path.absolute(), [])
+                # Actions are compared by identity since SQL statements overload "=="
+                if not any(other is action for other in actions):
+                    actions.append(action)
+    return sources
+
+
+def load_mods(script: Path) -> List[Mod]:
+    """
+    Runs a script defining `Mod`s. The script is run with `__name__` set to `__pyciv7_watch__`,
+    so code guarded by `if __name__ == "__main__":` (e.g. a call to `build`) is not run.
+
+    Parameters:
+        script: The Python script defining the `Mod`s.
+
+    Returns:
+        The `Mod`s among the global variables of the script.
+    """
+    namespace = runpy.run_path(str(script), run_name="__pyciv7_watch__")
+    return [value for value in namespace.values() if isinstance(value, Mod)]
+
+
+def reload_mod(script: Path, mod_id: str) -> Optional[Mod]:
+    """
+    Runs the script defining a `Mod` again and returns the new definition of the `Mod`. The
+    script is run with `__name__` set to `__pyciv7_watch__`, so code guarded by
+    `if __name__ == "__main__":` (e.g. a call to `watch`) is not run again.
+
+    Parameters:
+        script: The Python script defining the `Mod`.
+        mod_id: The `id` of the `Mod`.
+
+    Returns:
+        The `Mod` with the same `id` among the global variables of the script, or `None` if
+        there is none.
+    """
+    return next((mod for mod in load_mods(script) if mod.id == mod_id), None)
+
+
+def watch(
+    mod: Mod,
+    script: Optional[StrPath] = None,
+    polling: bool = False,
+    debounce: float = 0.1,
+    stop: Optional[Event] = None,
+    **build_kwargs: Any,
+) -> None:
+    """
+    Builds the `Mod`, then rebuilds it whenever one of its sources changes until interrupted.
+
+    Edited sources only regenerate the files of the actions using them, e.g. editing a Python
+    script only transpiles that script again. Editing the script defining the `Mod` runs it
+    again and rebuilds the new definition of the `Mod`. Changes saved together are batched into a
+    single rebuild. Combined with the `UIFileWatcher` app option set by `run(..., debug=True)`,
+    the game picks up the changes without being restarted. The sources of lazy action groups
+    are only watched if the groups can be produced again, i.e. `lazy_action_groups` is a
+    callable (such as a generator function) rather than a generator.
+
+    Parameters:
+        mod: The `Mod` to build and watch.
+        script: The Python script defining the `Mod`. Defaults to the script being run.
+        polling: `True` to poll the sources instead of using inotify, e.g. on network file
+            systems that do not report changes.
+        debounce: Seconds without changes after which a batch of changes is rebuilt.
+        stop: An event that stops watching when set. Watching otherwise stops on
+            `KeyboardInterrupt`.
+        build_kwargs: Keyword arguments to pass to `build`.
+    """
+    build_kwargs["overwrite"] = True
+    if build_kwargs.get("context") is None:
+        settings_factory = build_kwargs.pop("settings_factory", get_settings)
+        build_kwargs["context"] = BuildContext(settings_factory())
+    context = build_kwargs["context"]
+    if script is None:
+        script = getattr(sys.modules["__main__"], "__file__", None)
+    script_path = Path(script).absolute() if script else None
+    build(mod, **build_kwargs)
+    try:
+        with context.activate():
+            _watch(mod, script_path, polling, debounce, stop, build_kwargs)
+    except KeyboardInterrupt:
+        pass
+
+
+def _watch(
+    mod: Mod,
+    script_path: Optional[Path],
+    polling: bool,
+    debounce: float,
+    stop: Optional[Event],
+    build_kwargs: Dict[str, Any],
+) -> None:
+    while stop is None or not stop.is_set():
+        sources = watched_sources(mod)
+        paths = {*sources, script_path} if script_path else set(sources)
+        with create_watcher(paths, polling) as watcher:
+            for changed in watcher.batches(debounce, stop):
+                try:
+                    if script_path in changed:
+                        # Print the recommendations of the reloaded script once, not once
+                        # per validation
+                        with collect(render=True):
+                            new_mod = reload_mod(script_path, mod.id)  # type: ignore
+                        if new_mod is None:
+                            print(
+                                f'[yellow]"{script_path}" no longer defines "{mod.id}"'
+                            )
+                            continue
+                        if not new_mod.mod_dir:
+                            new_mod.mod_dir = mod.mod_dir  # type: ignore
+                        mod = new_mod
+                        build(mod, **build_kwargs)
+                    else:
+                        affected: List[ItemsAction] = []
+                        for path in changed:
+                            for action in sources.get(path, []):
+                                if not any(other is action for other in affected):
+                                    affected.append(action)
+                        manifest = BuildManifest(Path(mod.mod_dir))  # type: ignore
+                        for action in affected:
+                            action.emit(manifest)
+                        manifest.save()
+                except Exception as e:
+                    # Keep watching so the error can be fixed
+                    print(f'[red]Failed to rebuild "{mod.id}": {e}')
+                    continue
+                print(
+                    f'Rebuilt "{mod.id}": '
+                    + ", ".join(sorted(path.name for path in changed))
+                )
+                # The actions of the mod or their sources (e.g. the local modules a
+                # script imports) may have changed
+                if script_path in changed or set(watched_sources(mod)) != set(sources):
+                    break
 
 
 def run(mod: Mod, debug: bool = True, **build_kwargs: Any):
@@ -95,17 +587,79 @@ def run(mod: Mod, debug: bool = True, **build_kwargs: Any):
         debug: `True` if the game should be ran in debug mode.
         build_kwargs: Keyword arguments to pass to `build`.
     """
-    ctx = debug_settings_enabled() if debug else nullcontext()
+    if build_kwargs.get("context") is None:
+        settings_factory = build_kwargs.pop("settings_factory", get_settings)
+        build_kwargs["context"] = BuildContext(settings_factory())
+    context = build_kwargs["context"]
+    ctx = debug_settings_enabled(context.settings) if debug else nullcontext()
     with ctx:
         build(mod, **build_kwargs)
+        launch(context.settings, debug)
+
+
+def launch(settings: Settings, debug: bool = True) -> None:
+    """
+    Runs the Civilization 7 executable until it exits. The debug app options are not changed,
+    see `debug_settings_enabled`.
+
+    Parameters:
+        settings: Common `Settings` for pyciv7.
+        debug: `True` if the game is ran in debug mode.
+    """
+    try:
+        if debug:
+            print("Running Civilization 7 in debug mode")
+        else:
+            print("Running Civilization 7 in release mode")
+        subprocess.run(settings.civ7_release_bin)
+    except FileNotFoundError as e:
+        raise FileNotFoundError(
+            "Cannot the Civilization VII's release binary. Manually set this path via"
+            "CIV7_RELEASE_BIN"
+        ) from e
+
+
+async def run_async(mod: Mod, debug: bool = True, **build_kwargs: Any) -> int:
+    """
+    Builds the `Mod` with `build_async`, then runs the Civilization 7 executable without
+    blocking the event loop. Cancelling the task kills the game.
+
+    Parameters:
+        mod: `Mod` to build.
+        debug: `True` if the game should be ran in debug mode.
+        build_kwargs: Keyword arguments to pass to `build_async`.
+
+    Returns:
+        The exit code of the game.
+    """
+    if build_kwargs.get("context") is None:
+        settings_factory = build_kwargs.pop("settings_factory", get_settings)
+        build_kwargs["context"] = BuildContext(
+            await asyncio.to_thread(settings_factory)
+        )
+    context = build_kwargs["context"]
+    ctx = debug_settings_enabled(context.settings) if debug else nullcontext()
+    await asyncio.to_thread(ctx.__enter__)
+    try:
+        await build_async(mod, **build_kwargs)
+        if debug:
+            print("Running Civilization 7 in debug mode")
+        else:
+            print("Running Civilization 7 in release mode")
         try:
-            if debug:
-                print("Running Civilization 7 in debug mode")
-            else:
-                print("Running Civilization 7 in release mode")
-            subprocess.run(Settings().civ7_release_bin)
+            process = await asyncio.create_subprocess_exec(
+                context.settings.civ7_release_bin
+            )
         except FileNotFoundError as e:
             raise FileNotFoundError(
                 "Cannot the Civilization VII's release binary. Manually set this path via"
                 "CIV7_RELEASE_BIN"
             ) from e
+        try:
+            return await process.wait()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+    finally:
+        await asyncio.to_thread(ctx.__exit__, None, None, None)
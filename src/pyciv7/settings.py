@@ -1,7 +1,9 @@
+import json
 import os
+from functools import lru_cache
 from pathlib import Path
 import platform
-from typing import Optional
+from typing import Dict, Optional
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -56,18 +58,74 @@ def guess_posix_steam_root(is_darwin: bool) -> Optional[Path]:
                 return path
 
 
-def steam_settings_dir() -> Path:
+def cache_dir() -> Path:
+    """
+    Returns:
+        The directory pyciv7 caches data in between runs. Set `PYCIV7_CACHE_DIR` to override
+        it.
+    """
+    if os.getenv("PYCIV7_CACHE_DIR"):
+        return Path(os.environ["PYCIV7_CACHE_DIR"])
+    if platform.system() == "Windows" and os.getenv("LOCALAPPDATA"):
+        return Path(os.environ["LOCALAPPDATA"]) / "pyciv7" / "Cache"
+    xdg_cache_home = os.getenv("XDG_CACHE_HOME")
+    return (
+        Path(xdg_cache_home) if xdg_cache_home else Path.home() / ".cache"
+    ) / "pyciv7"
+
+
+def _discovery_cache_file() -> Path:
+    return cache_dir() / "discovery.json"
+
+
+def _read_discovery_cache() -> Dict[str, str]:
+    try:
+        data = json.loads(_discovery_cache_file().read_text())
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _write_discovery_cache(data: Dict[str, str]) -> None:
+    try:
+        _discovery_cache_file().parent.mkdir(parents=True, exist_ok=True)
+        _discovery_cache_file().write_text(json.dumps(data, indent=2))
+    except OSError:
+        # Caching is only an optimization
+        pass
+
+
+def steam_root() -> Optional[Path]:
+    """
+    Finds the root directory of Steam. The result is cached on disk, so the registry or the
+    common Steam locations are only probed again once the cached directory no longer exists.
+
+    Returns:
+        The root directory of Steam, or `None` if it cannot be found.
+    """
+    cache = _read_discovery_cache()
+    cached = cache.get("steam_root")
+    if cached and Path(cached).is_dir():
+        return Path(cached)
     system = platform.system()
     if system == "Windows":
-        steam_root = get_windows_steam_root()
+        root = get_windows_steam_root()
     else:
-        steam_root = guess_posix_steam_root(system == "Darwin")
-    if not steam_root:
+        root = guess_posix_steam_root(system == "Darwin")
+    if root:
+        _write_discovery_cache({**cache, "steam_root": str(root)})
+    return root
+
+
+def steam_settings_dir() -> Path:
+    system = platform.system()
+    steam_root_dir = steam_root()
+    if not steam_root_dir:
         raise FileNotFoundError(
             "Cannot determine the common steam location of Civilization VII's "
             f"settings on {system}. Manually set this path via CIV7_SETTINGS_DIR"
         )
-    return steam_root / "steamapps/common/Sid Meier's Civilization VII"
+    return steam_root_dir / "steamapps/common/Sid Meier's Civilization VII"
 
 
 def steam_release_bin() -> Path:
@@ -88,3 +146,27 @@ class Settings(BaseSettings):
     civ7_release_bin: Path = Field(default_factory=steam_release_bin)
     transcrypt_sub_dir: Path = Field(default=Path("transcrypt"))
     sql_sub_dir: Path = Field(default=Path("sql"))
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """
+    Resolves the `Settings` once and returns the same instance afterwards, so the `.env` file is
+    read and the game directories are discovered only once per process.
+
+    Returns:
+        The resolved `Settings`.
+    """
+    return Settings()
+
+
+def clear_settings_cache(discovery: bool = False) -> None:
+    """
+    Forgets the `Settings` resolved by `get_settings`, e.g. after the environment changed.
+
+    Parameters:
+        discovery: `True` to also delete the Steam directory cached on disk by `steam_root`.
+    """
+    get_settings.cache_clear()
+    if discovery:
+        _discovery_cache_file().unlink(missing_ok=True)
@@ -0,0 +1,386 @@
+"""
+Compilation of SQLAlchemy statements into the SQL written to a mod's SQL files.
+"""
+
+from collections import OrderedDict
+from functools import lru_cache
+from typing import (
+    Any,
+    Dict,
+    Final,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from sqlalchemy import inspect, literal
+from sqlalchemy import table as table_clause
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.sql.compiler import SQLCompiler
+from sqlalchemy.sql.elements import CompilerElement
+from sqlalchemy.sql.expression import TableClause
+from sqlalchemy.types import NullType, TypeEngine
+
+DEFAULT_CACHE_SIZE: Final[int] = 1024
+DEFAULT_CHUNK_SIZE: Final[int] = 500
+"""
+Default number of rows per `INSERT` statement generated from `Rows`. Older SQLite versions
+limit a `VALUES` clause to 500 rows.
+"""
+
+Table = Union[TableClause, type, str]
+"""
+A SQLAlchemy table, a SQLModel class with `table=True`, or the name of a table.
+"""
+
+_Template = Tuple[SQLCompiler, Dict[str, TypeEngine]]
+_Header = Tuple[str, List[TypeEngine]]
+
+
+class StatementCompiler:
+    """
+    Compiles SQL statements for SQLite, the database engine used by Civilization 7, with every
+    parameter rendered as a literal.
+
+    Statements sharing a structure (e.g. `INSERT`s into the same columns of the same table)
+    only differ by their parameters. Each distinct structure is compiled once and cached, after
+    which only the parameters of a statement are rendered. Statements SQLAlchemy cannot cache
+    are compiled in full.
+    """
+
+    def __init__(self, cache_size: int = DEFAULT_CACHE_SIZE) -> None:
+        """
+        Parameters:
+            cache_size: The maximum number of statement structures kept in the cache.
+        """
+        self.cache_size = cache_size
+        # Placeholders are rendered as "%(name)s" with any literal "%" escaped, so templates
+        # can be filled in with Python's "%" operator
+        self._template_dialect = sqlite.dialect(paramstyle="pyformat")
+        self._literal_dialect = sqlite.dialect()
+        self._literal_compiler = SQLCompiler(self._literal_dialect, None)
+        self._templates: "OrderedDict[Any, _Template]" = OrderedDict()
+        self._headers: Dict[Tuple[TableClause, Tuple[str, ...]], _Header] = {}
+        self._inferred_types: Dict[type, TypeEngine] = {}
+
+    def compile(self, statement: CompilerElement) -> str:
+        """
+        Compiles a SQL statement with its parameters rendered as literals.
+
+        Parameters:
+            statement: The SQLAlchemy statement to compile.
+
+        Returns:
+            The compiled SQL.
+        """
+        generate_cache_key = getattr(statement, "_generate_cache_key", None)
+        cache_key = generate_cache_key() if generate_cache_key else None
+        if cache_key is None:
+            return self.compile_uncached(statement)
+        try:
+            compiled, types = self._templates[cache_key.key]
+            self._templates.move_to_end(cache_key.key)
+        except KeyError:
+            compiled = statement.compile(
+                dialect=self._template_dialect, cache_key=cache_key
+            )
+            if compiled.post_compile_params or compiled.literal_execute_params:
+                # Expanding parameters (e.g. "IN" lists) change the structure of the SQL
+                return self.compile_uncached(statement)
+            types = {
+                compiled.escaped_bind_names.get(name, name): bind.type
+                for bind, name in compiled.bind_names.items()
+            }
+            self._templates[cache_key.key] = (compiled, types)
+            if len(self._templates) > self.cache_size:
+                self._templates.popitem(last=False)
+        params = compiled.construct_params(extracted_parameters=cache_key.bindparams)
+        render = self._literal_compiler.render_literal_value
+        return compiled.string % {
+            name: render(value, types[name]) for name, value in params.items()
+        }
+
+    def compile_uncached(self, statement: CompilerElement) -> str:
+        """
+        Compiles a SQL statement in full, bypassing the cache.
+
+        Parameters:
+            statement: The SQLAlchemy statement to compile.
+
+        Returns:
+            The compiled SQL.
+        """
+        return str(
+            statement.compile(
+                dialect=self._literal_dialect, compile_kwargs={"literal_binds": True}
+            )
+        )
+
+    def compile_rows(
+        self,
+        table: TableClause,
+        columns: Sequence[str],
+        rows: Iterable[Sequence[Any]],
+    ) -> str:
+        """
+        Compiles a multi-row `INSERT` statement with every value rendered as a literal. The
+        result is identical to compiling `insert(table).values([...])` in full, but only the
+        values are rendered for every row.
+
+        Parameters:
+            table: The table the rows are inserted into.
+            columns: The names of the inserted columns.
+            rows: The values of every row, in the order of `columns`.
+
+        Returns:
+            The compiled SQL.
+        """
+        key = (table, tuple(columns))
+        try:
+            header, types = self._headers[key]
+        except KeyError:
+            preparer = self._literal_dialect.identifier_preparer
+            header = (
+                f"INSERT INTO {preparer.format_table(table)} "
+                f"({', '.join(preparer.quote(name) for name in columns)}) VALUES "
+            )
+            types = [
+                table.c[name].type if name in table.c else NullType()
+                for name in columns
+            ]
+            self._headers[key] = header, types
+        render = self.render_literal
+        return header + ", ".join(
+            f"({', '.join(render(value, type_) for value, type_ in zip(row, types))})"
+            for row in rows
+        )
+
+    def render_literal(self, value: Any, type_: Optional[TypeEngine] = None) -> str:
+        """
+        Renders a value as a SQLite literal.
+
+        Parameters:
+            value: The value to render.
+            type_: The SQL type of the value. If it is not provided, the type is inferred from
+                the Python type of the value.
+
+        Returns:
+            The rendered literal.
+        """
+        if type_ is None or isinstance(type_, NullType):
+            if value is None:
+                return "NULL"
+            python_type = type(value)
+            type_ = self._inferred_types.get(python_type)
+            if type_ is None:
+                type_ = self._inferred_types[python_type] = literal(value).type
+        return self._literal_compiler.render_literal_value(value, type_)
+
+    def clear(self) -> None:
+        """
+        Removes every cached statement structure.
+        """
+        self._templates.clear()
+        self._headers.clear()
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+
+def _resolve_table(table: Table) -> TableClause:
+    if isinstance(table, str):
+        return table_clause(table)
+    return getattr(table, "__table__", table)
+
+
+@lru_cache(maxsize=None)
+def _model_columns(model: type) -> List[Tuple[str, str]]:
+    """
+    Returns the `(attribute, column)` name pairs of a SQLModel class with `table=True`.
+    """
+    return [
+        (attribute.key, attribute.columns[0].name)
+        for attribute in inspect(model).column_attrs
+    ]
+
+
+class Rows:
+    """
+    Rows inserted in bulk by a `DatabaseItemsAction` (e.g. `UpdateDatabase` or `UpdateText`).
+
+    The rows are streamed into multi-row `INSERT` statements of at most `chunk_size` rows
+    instead of creating a SQL statement for every row. Rows can be SQLModel instances of
+    `table=True` models, or mappings of column names to values when `table` is provided. Only
+    consecutive rows inserting the same columns of the same table share a statement, so rows are
+    inserted in their original order (e.g. parent rows before the rows referencing them).
+
+    Rows backed by an iterator (e.g. a generator) can only be consumed once.
+
+    Example:
+
+        ```python
+        UpdateText(
+            items=[
+                Rows(
+                    {"Tag": f"LOC_UNIT_{i}_NAME", "Language": "en_US", "Text": f"Unit {i}"}
+                    for i in range(100_000)
+                ),
+            ]
+        )
+        ```
+    """
+
+    def __init__(
+        self,
+        rows: Iterable[Any],
+        table: Optional[Table] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        """
+        Parameters:
+            rows: SQLModel instances, or mappings of column names to values.
+            table: The table mappings are inserted into. Not needed for SQLModel instances.
+            chunk_size: The maximum number of rows per `INSERT` statement.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be greater than 0")
+        self.rows = rows
+        self.table = None if table is None else _resolve_table(table)
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def from_columns(
+        cls,
+        table: Table,
+        columns: Mapping[str, Sequence[Any]],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> "Rows":
+        """
+        Creates rows from columnar data, such as lists or NumPy arrays.
+
+        Parameters:
+            table: The table the rows are inserted into.
+            columns: Mapping of column names to the values of that column. Every column must
+                have the same length.
+            chunk_size: The maximum number of rows per `INSERT` statement.
+
+        Returns:
+            The rows of the columns.
+        """
+        # Converts NumPy arrays (and similar) to Python values SQLAlchemy can render
+        values = [
+            column.tolist() if hasattr(column, "tolist") else column
+            for column in columns.values()
+        ]
+        if len({len(column) for column in values}) > 1:
+            raise ValueError("Every column must have the same length")
+        names = list(columns)
+        return cls(
+            (dict(zip(names, row)) for row in zip(*values)),
+            table=table,
+            chunk_size=chunk_size,
+        )
+
+    def _table_and_values(self, row: Any) -> Tuple[TableClause, Dict[str, Any]]:
+        if isinstance(row, Mapping):
+            if self.table is None:
+                raise ValueError(
+                    "A table must be provided to insert rows that are not SQLModel instances"
+                )
+            return self.table, dict(row)
+        model = type(row)
+        if not hasattr(model, "__table__"):
+            raise TypeError(
+                f"Cannot insert {model.__name__}: rows must be mappings or instances of a "
+                "SQLModel with table=True"
+            )
+        fields_set = getattr(row, "model_fields_set", ())
+        values = {}
+        for attribute, column in _model_columns(model):
+            value = getattr(row, attribute)
+            # Leave unset columns to the database's defaults
+            if value is not None or attribute in fields_set:
+                values[column] = value
+        return model.__table__, values
+
+    def chunks(self) -> Iterator[Tuple[TableClause, List[str], List[List[Any]]]]:
+        """
+        Groups consecutive rows inserting the same columns of the same table into chunks of at
+        most `chunk_size` rows.
+
+        Returns:
+            An iterator of `(table, columns, rows)` chunks, in the order of the rows. A chunk is
+            yielded as soon as it is full or the next row inserts into another table or other
+            columns.
+        """
+        key: Optional[Tuple[TableClause, Tuple[str, ...]]] = None
+        chunk: List[List[Any]] = []
+        for row in self.rows:
+            table, values = self._table_and_values(row)
+            columns = tuple(values)
+            if chunk and ((table, columns) != key or len(chunk) >= self.chunk_size):
+                yield key[0], list(key[1]), chunk
+                chunk = []
+            key = (table, columns)
+            chunk.append(list(values.values()))
+        if chunk:
+            yield key[0], list(key[1]), chunk
+
+    def statements(self, compiler: Optional[StatementCompiler] = None) -> Iterator[str]:
+        """
+        Compiles the rows into multi-row `INSERT` statements.
+
+        Parameters:
+            compiler: The compiler to use. Defaults to the `default_compiler`.
+
+        Returns:
+            An iterator of compiled SQL statements, one per chunk.
+        """
+        compiler = compiler or default_compiler
+        for table, columns, rows in self.chunks():
+            yield compiler.compile_rows(table, columns, rows)
+
+
+def bundle_statements(statements: Iterable[str], transaction: bool = False) -> str:
+    """
+    Joins compiled SQL statements, in order, into the contents of a single SQL file.
+
+    Parameters:
+        statements: The compiled SQL statements.
+        transaction: `True` if the statements should be wrapped in a single transaction.
+
+    Returns:
+        The SQL of every statement, each terminated by a semicolon.
+    """
+    lines = ["BEGIN TRANSACTION;"] if transaction else []
+    for sql in statements:
+        sql = sql.strip().rstrip(";").rstrip()
+        if sql:
+            lines.append(f"{sql};")
+    if transaction:
+        lines.append("COMMIT;")
+    return "\n".join(lines) + "\n"
+
+
+default_compiler = StatementCompiler()
+"""
+The `StatementCompiler` used when serializing `DatabaseItemsAction`s.
+"""
+
+
+def compile_statement(statement: CompilerElement) -> str:
+    """
+    Compiles a SQL statement for SQLite with the `default_compiler`.
+
+    Parameters:
+        statement: The SQLAlchemy statement to compile.
+
+    Returns:
+        The compiled SQL.
+    """
+    return default_compiler.compile(statement)
@@ -0,0 +1,276 @@
+"""
+Module timing the phases of a build, such as resolving `Settings`, planning and emitting each
+action, compiling SQL statements, transpiling scripts and writing files.
+
+Spans are only recorded while a `Tracer` is active. Otherwise `span` returns a shared no-op
+context manager after a single context variable lookup, so instrumented code costs next to
+nothing outside of a trace, even for the spans recorded per item.
+
+Example:
+
+    with trace() as tracer:
+        pyciv7.build(mod, overwrite=True)
+    tracer.write_chrome_trace("build.trace.json")  # Open with chrome://tracing or Perfetto
+    tracer.write_report("build.report.json")
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Final, Generator, List, Optional, Tuple
+
+from pyciv7.utils import StrPath, atomic_write_text
+
+PHASE: Final[str] = "phase"
+"""
+Category of the spans of the steps of a build, e.g. resolving settings or writing the `.modinfo`.
+"""
+ACTION: Final[str] = "action"
+"""
+Category of the spans of a single action, e.g. planning or emitting it.
+"""
+ITEM: Final[str] = "item"
+"""
+Category of the spans of a single item of an action, e.g. compiling a SQL statement.
+"""
+VALIDATION: Final[str] = "validation"
+"""
+Category of the spans of models validated during a build, e.g. lazy action groups.
+"""
+
+_NO_SPAN: Final[AbstractContextManager] = nullcontext()
+
+
+@dataclass
+class Span:
+    """
+    A timed step of a build.
+    """
+
+    name: str
+    """
+    What was timed, e.g. `plan` or `transcrypt`.
+    """
+    category: str
+    """
+    The granularity of the span, e.g. `PHASE`, `ACTION` or `ITEM`.
+    """
+    start: int
+    """
+    When the span started, in nanoseconds since the tracer started.
+    """
+    duration: int = 0
+    """
+    How long the span lasted, in nanoseconds.
+    """
+    thread: int = 0
+    """
+    The identifier of the thread the span was recorded in.
+    """
+    parent: Optional[int] = None
+    """
+    The index of the enclosing span in `Tracer.spans`, if any.
+    """
+    args: Dict[str, Any] = field(default_factory=dict)
+    """
+    Details about the span, e.g. the path of a transpiled script.
+    """
+
+
+class Tracer:
+    """
+    Records the spans of the builds run while it is active, see `trace`.
+    """
+
+    def __init__(self, items: bool = True) -> None:
+        """
+        Parameters:
+            items: `True` to record a span per item of each action. Builds of very large mods
+                record fewer spans without them.
+        """
+        self.items = items
+        self.spans: List[Span] = []
+        self.origin = time.perf_counter_ns()
+        self._lock = threading.Lock()
+        # The indexes of the open spans. Tasks and threads started with a copy of the current
+        # context, like `asyncio.to_thread`, nest their spans in the span that started them
+        self._open: ContextVar[Tuple[int, ...]] = ContextVar(
+            "pyciv7_open_spans", default=()
+        )
+
+    @contextmanager
+    def span(
+        self, name: str, category: str = PHASE, **args: Any
+    ) -> Generator[Span, None, None]:
+        """
+        Times the body of the context manager.
+
+        Parameters:
+            name: What is timed.
+            category: The granularity of the span.
+            args: Details about the span. Values are converted to strings when exported if
+                they are not JSON serializable.
+
+        Returns:
+            A context manager yielding the span, so details can be added to its `args`.
+        """
+        open_spans = self._open.get()
+        record = Span(
+            name,
+            category,
+            start=time.perf_counter_ns() - self.origin,
+            thread=threading.get_ident(),
+            parent=open_spans[-1] if open_spans else None,
+            args=args,
+        )
+        with self._lock:
+            index = len(self.spans)
+            self.spans.append(record)
+        token = self._open.set((*open_spans, index))
+        try:
+            yield record
+        finally:
+            record.duration = time.perf_counter_ns() - self.origin - record.start
+            self._open.reset(token)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns:
+            For each span name, the `category`, the number of spans, their `total` duration and
+            their `self` duration excluding nested spans, in seconds, from the longest `self`
+            duration to the shortest.
+        """
+        child_time = [0] * len(self.spans)
+        for record in self.spans:
+            if record.parent is not None:
+                child_time[record.parent] += record.duration
+        totals: Dict[str, Dict[str, Any]] = {}
+        for record, children in zip(self.spans, child_time):
+            entry = totals.setdefault(
+                record.name,
+                {"category": record.category, "count": 0, "total": 0, "self": 0},
+            )
+            entry["count"] += 1
+            entry["total"] += record.duration
+            entry["self"] += record.duration - children
+        for entry in totals.values():
+            entry["total"] /= 1e9
+            entry["self"] /= 1e9
+        return dict(sorted(totals.items(), key=lambda item: -item[1]["self"]))
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Returns:
+            The `summary` and every span, with times in seconds, as JSON serializable data.
+        """
+        return {
+            "summary": self.summary(),
+            "spans": [
+                {
+                    "name": record.name,
+                    "category": record.category,
+                    "start": record.start / 1e9,
+                    "duration": record.duration / 1e9,
+                    "thread": record.thread,
+                    "parent": record.parent,
+                    "args": record.args,
+                }
+                for record in self.spans
+            ],
+        }
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """
+        Returns:
+            The spans in the Chrome trace event format, as JSON serializable data. Can be opened
+            with `chrome://tracing` or https://ui.perfetto.dev.
+        """
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {
+                    "name": record.name,
+                    "cat": record.category,
+                    "ph": "X",
+                    "ts": record.start / 1e3,
+                    "dur": record.duration / 1e3,
+                    "pid": pid,
+                    "tid": record.thread,
+                    "args": record.args,
+                }
+                for record in self.spans
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def write_report(self, path: StrPath) -> None:
+        """
+        Writes the `report` to a JSON file.
+
+        Parameters:
+            path: The JSON file.
+        """
+        atomic_write_text(path, json.dumps(self.report(), indent=2, default=str))
+
+    def write_chrome_trace(self, path: StrPath) -> None:
+        """
+        Writes the `chrome_trace` to a JSON file.
+
+        Parameters:
+            path: The JSON file.
+        """
+        atomic_write_text(path, json.dumps(self.chrome_trace(), default=str))
+
+
+_current_tracer: ContextVar[Optional[Tracer]] = ContextVar(
+    "pyciv7_tracer", default=None
+)
+
+
+def current_tracer() -> Optional[Tracer]:
+    """
+    Returns:
+        The active tracer, or `None` when nothing is traced.
+    """
+    return _current_tracer.get()
+
+
+def span(name: str, category: str = PHASE, **args: Any) -> AbstractContextManager:
+    """
+    Times the body of the context manager with the active tracer, if any.
+
+    Parameters:
+        name: What is timed.
+        category: The granularity of the span.
+        args: Details about the span.
+
+    Returns:
+        A context manager yielding the `Span`, or `None` when nothing is traced.
+    """
+    tracer = _current_tracer.get()
+    if tracer is None or (category == ITEM and not tracer.items):
+        return _NO_SPAN
+    return tracer.span(name, category, **args)
+
+
+@contextmanager
+def trace(tracer: Optional[Tracer] = None) -> Generator[Tracer, None, None]:
+    """
+    Records the spans of the builds run until the context manager exits.
+
+    Parameters:
+        tracer: The tracer to record the spans with. A new tracer by default.
+
+    Returns:
+        A context manager yielding the tracer.
+    """
+    tracer = tracer or Tracer()
+    token = _current_tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current_tracer.reset(token)
@@ -0,0 +1,202 @@
+"""
+Persistent cache that lets `PythonGameScripts` skip Python scripts whose transpiled JavaScript is
+still up to date.
+"""
+
+import ast
+import hashlib
+import json
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Dict, Final, Iterator, List, Sequence, Set, Tuple
+
+from pyciv7.utils import sha256_file
+
+CACHE_FILE_NAME: Final[str] = ".pyciv7-cache.json"
+CACHE_FORMAT_VERSION: Final[int] = 1
+
+
+def transcrypt_version() -> str:
+    """
+    Returns:
+        The installed version of Transcrypt, or `unknown` if it is not installed.
+    """
+    try:
+        return version("transcrypt")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def _imported_modules(tree: ast.AST) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Yields `(level, module path)` pairs for every import of a parsed Python module, including
+    `from package import submodule` imports.
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                yield 0, alias.name.split(".")
+        elif isinstance(node, ast.ImportFrom):
+            parts = node.module.split(".") if node.module else []
+            yield node.level, parts
+            for alias in node.names:
+                if alias.name != "*":
+                    yield node.level, parts + [alias.name]
+
+
+def _resolve_module(parts: List[str], search_dirs: Sequence[Path]) -> List[Path]:
+    """
+    Finds the local files making up a (possibly dotted) module, i.e. every package `__init__.py`
+    along the way and the module itself.
+    """
+    for search_dir in search_dirs:
+        files = []
+        current = search_dir
+        for part in parts:
+            if (current / part / "__init__.py").is_file():
+                current = current / part
+                files.append(current / "__init__.py")
+            elif (current / f"{part}.py").is_file():
+                files.append(current / f"{part}.py")
+                break
+            else:
+                break
+        if files:
+            return files
+    return []
+
+
+def local_imports(source: Path) -> Set[Path]:
+    """
+    Finds the local modules a Python script imports, directly or transitively. Modules are
+    searched relative to the directory of `source`, the same way Transcrypt looks them up.
+    Imports that cannot be resolved to a local file (e.g. Transcrypt's own modules) are ignored.
+
+    Parameters:
+        source: The Python script to scan.
+
+    Returns:
+        The resolved paths of every local module `source` depends on.
+    """
+    source = source.resolve()
+    root = source.parent
+    found: Set[Path] = set()
+    pending = [source]
+    while pending:
+        module = pending.pop()
+        try:
+            tree = ast.parse(module.read_bytes(), filename=str(module))
+        except (OSError, SyntaxError):
+            # Let Transcrypt report unreadable or invalid modules
+            continue
+        for level, parts in _imported_modules(tree):
+            if level:
+                base = module.parent
+                for _ in range(level - 1):
+                    base = base.parent
+                search_dirs = [base]
+            else:
+                search_dirs = [root]
+            for dependency in _resolve_module(parts, search_dirs):
+                dependency = dependency.resolve()
+                if dependency != source and dependency not in found:
+                    found.add(dependency)
+                    pending.append(dependency)
+    return found
+
+
+class TranspileCache:
+    """
+    Records the inputs each transpiled script was built from. A script is only transpiled again
+    when its source, the local modules it (transitively) imports, the Transcrypt version or the
+    Transcrypt flags change.
+
+    The cache is stored as `.pyciv7-cache.json` in the directory holding the transpiled
+    JavaScript.
+    """
+
+    def __init__(self, cache_dir: Path, flags: Sequence[str] = ()) -> None:
+        """
+        Parameters:
+            cache_dir: The directory the transpiled JavaScript is written to.
+            flags: The command line flags passed to Transcrypt.
+        """
+        self.path = cache_dir / CACHE_FILE_NAME
+        self.flags = list(flags)
+        self.entries: Dict[str, str] = {}
+        self._hashes: Dict[Path, str] = {}
+        self._keys: Dict[Path, str] = {}
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("version") == CACHE_FORMAT_VERSION:
+            self.entries = dict(data.get("entries", {}))
+
+    def _hash(self, path: Path) -> str:
+        if path not in self._hashes:
+            self._hashes[path] = sha256_file(path)
+        return self._hashes[path]
+
+    def key(self, source: Path) -> str:
+        """
+        Computes the cache key of a Python script.
+
+        Parameters:
+            source: The Python script.
+
+        Returns:
+            A digest of every input the transpiled JavaScript depends on.
+        """
+        source = source.resolve()
+        if source not in self._keys:
+            inputs = {
+                "source": self._hash(source),
+                "imports": {
+                    dependency.as_posix(): self._hash(dependency)
+                    for dependency in sorted(local_imports(source))
+                },
+                "transcrypt": transcrypt_version(),
+                "flags": self.flags,
+            }
+            self._keys[source] = hashlib.sha256(
+                json.dumps(inputs, sort_keys=True).encode()
+            ).hexdigest()
+        return self._keys[source]
+
+    def is_fresh(self, source: Path, output: Path) -> bool:
+        """
+        Parameters:
+            source: The Python script.
+            output: The JavaScript file `source` is transpiled to.
+
+        Returns:
+            `True` if `output` exists and was transpiled from the current inputs of `source`.
+        """
+        try:
+            key = self.key(source)
+        except OSError:
+            return False
+        return output.exists() and self.entries.get(source.resolve().as_posix()) == key
+
+    def update(self, source: Path) -> None:
+        """
+        Records that `source` was successfully transpiled from its current inputs.
+
+        Parameters:
+            source: The Python script.
+        """
+        self.entries[source.resolve().as_posix()] = self.key(source)
+
+    def save(self) -> None:
+        """
+        Writes the cache to disk.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(
+            json.dumps(
+                {"version": CACHE_FORMAT_VERSION, "entries": self.entries},
+                indent=2,
+                sort_keys=True,
+            )
+        )
@@ -1,8 +1,151 @@
+import hashlib
+import os
+import secrets
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Union
-
+from typing import Any, Callable, Generator, Iterable, Optional, Tuple, Union
 
 StrPath = Union[str, Path]
 """
 `str` or a `pathlib.Path` instance.
 """
+
+
+@contextmanager
+def status(message: str) -> Generator[None, None, None]:
+    """
+    Shows a spinner with the provided message while the context manager is active. Nothing is
+    shown if another spinner (e.g. the one of `pyciv7.runner.build`) is already active.
+
+    Parameters:
+        message: The message to display next to the spinner.
+
+    Returns:
+        A context manager displaying the spinner.
+    """
+    from rich.errors import LiveError
+    from rich.status import Status
+
+    spinner = Status(message)
+    try:
+        spinner.start()
+    except LiveError:
+        yield
+        return
+    try:
+        yield
+    finally:
+        spinner.stop()
+
+
+def rich_print(*objects: Any, **kwargs: Any) -> None:
+    """
+    Prints with `rich.print`. Rich is only imported once something is printed, which keeps
+    `import pyciv7` fast.
+
+    Parameters:
+        objects: The objects to print.
+        kwargs: Keyword arguments to pass to `rich.print`.
+    """
+    from rich import print
+
+    print(*objects, **kwargs)
+
+
+def sha256_file(path: StrPath) -> str:
+    """
+    Hashes the contents of a file.
+
+    Parameters:
+        path: The file to hash.
+
+    Returns:
+        The hexadecimal SHA-256 digest of the file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _create_temporary(path: Path) -> Tuple[int, str]:
+    # Unlike tempfile.mkstemp (mode 0600), the kernel applies the umask to the mode a new file
+    # gets, without the umask having to be read
+    flags = os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, "O_BINARY", 0)
+    while True:
+        tmp = os.path.join(path.parent, f".{path.name}.{secrets.token_hex(4)}.tmp")
+        try:
+            return os.open(tmp, flags, 0o666), tmp
+        except FileExistsError:
+            continue
+
+
+def _replace(tmp: StrPath, path: Path) -> None:
+    # The temporary file takes the mode of the file it replaces
+    try:
+        os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+    except FileNotFoundError:
+        pass
+    os.replace(tmp, path)
+
+
+def atomic_write_text(path: StrPath, text: str, encoding: str = "utf-8") -> None:
+    """
+    Writes text to a file by writing a temporary file in the same directory and renaming it, so
+    readers never see a partially written file.
+
+    Parameters:
+        path: The file to write.
+        text: The text to write.
+        encoding: The encoding of the file.
+    """
+    path = Path(path)
+    fd, tmp = _create_temporary(path)
+    try:
+        with os.fdopen(fd, "w", encoding=encoding, newline="") as f:
+            f.write(text)
+        _replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def atomic_write_chunks(
+    path: StrPath,
+    chunks: Iterable[str],
+    encoding: str = "utf-8",
+    unchanged: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """
+    Writes text to a file chunk by chunk, through a temporary file in the same directory that
+    replaces the file once every chunk was written. Readers never see a partially written file,
+    and the text never has to be held in memory at once.
+
+    Parameters:
+        path: The file to write.
+        chunks: The text to write, in chunks.
+        encoding: The encoding of the file.
+        unchanged: Called with the digest of the written text. If it returns `True`, the
+            existing file is left untouched and the temporary file is discarded.
+
+    Returns:
+        The hexadecimal SHA-256 digest of the written file's contents.
+    """
+    path = Path(path)
+    digest = hashlib.sha256()
+    fd, tmp = _create_temporary(path)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                data = chunk.encode(encoding)
+                digest.update(data)
+                f.write(data)
+        if unchanged is not None and unchanged(digest.hexdigest()):
+            os.unlink(tmp)
+        else:
+            _replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return digest.hexdigest()
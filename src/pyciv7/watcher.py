@@ -0,0 +1,248 @@
+"""
+File watchers used by `pyciv7.runner.watch` to wait for changes to the sources of a mod. Linux's
+inotify is used when it is available, otherwise files are polled.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from threading import Event
+from typing import Dict, Final, Iterable, Iterator, Optional, Set, Tuple
+
+DEFAULT_POLL_INTERVAL: Final[float] = 0.25
+"""
+Seconds between two scans of the watched files by `PollingWatcher`.
+"""
+
+_IN_MODIFY: Final[int] = 0x002
+_IN_ATTRIB: Final[int] = 0x004
+_IN_CLOSE_WRITE: Final[int] = 0x008
+_IN_MOVED_FROM: Final[int] = 0x040
+_IN_MOVED_TO: Final[int] = 0x080
+_IN_CREATE: Final[int] = 0x100
+_IN_DELETE: Final[int] = 0x200
+_IN_MASK: Final[int] = (
+    _IN_MODIFY
+    | _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class FileWatcher(ABC):
+    """
+    Waits for changes to a set of files. Files are identified by their absolute path and do not
+    need to exist; creating a watched file counts as a change.
+    """
+
+    def __init__(self, paths: Iterable[Path]) -> None:
+        """
+        Parameters:
+            paths: The files to watch.
+        """
+        self.paths: Set[Path] = {Path(path).absolute() for path in paths}
+
+    @abstractmethod
+    def wait(self, timeout: Optional[float] = None) -> Set[Path]:
+        """
+        Waits for some of the watched files to change.
+
+        Parameters:
+            timeout: The maximum number of seconds to wait, or `None` to wait indefinitely.
+
+        Returns:
+            The files that changed. Empty if the timeout expired first.
+        """
+
+    def close(self) -> None:
+        """
+        Releases the resources of the watcher.
+        """
+
+    def batches(
+        self, debounce: float = 0.1, stop: Optional[Event] = None
+    ) -> Iterator[Set[Path]]:
+        """
+        Yields the changed files in batches. A batch is complete once no file changed for
+        `debounce` seconds, so saving several files at once triggers a single rebuild.
+
+        Parameters:
+            debounce: Seconds without changes that end a batch.
+            stop: An event that ends the iteration when set.
+
+        Returns:
+            An iterator of changed files.
+        """
+        while stop is None or not stop.is_set():
+            # Wake up regularly to honor "stop"
+            changed = self.wait(0.5 if stop is not None else None)
+            if not changed:
+                continue
+            while True:
+                more = self.wait(debounce)
+                if not more:
+                    break
+                changed |= more
+            yield changed
+
+    def __enter__(self) -> "FileWatcher":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+class PollingWatcher(FileWatcher):
+    """
+    Detects changes by comparing the size and modification time of every watched file at a
+    regular interval.
+    """
+
+    def __init__(
+        self, paths: Iterable[Path], interval: float = DEFAULT_POLL_INTERVAL
+    ) -> None:
+        """
+        Parameters:
+            paths: The files to watch.
+            interval: Seconds between two scans of the watched files.
+        """
+        super().__init__(paths)
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[Path, Optional[Tuple[int, int]]]:
+        snapshot: Dict[Path, Optional[Tuple[int, int]]] = {}
+        for path in self.paths:
+            try:
+                stat = path.stat()
+            except OSError:
+                snapshot[path] = None
+            else:
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self, timeout: Optional[float] = None) -> Set[Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            changed = {
+                path for path in self.paths if snapshot[path] != self._snapshot[path]
+            }
+            self._snapshot = snapshot
+            if changed:
+                return changed
+            if deadline is None:
+                time.sleep(self.interval)
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return set()
+                time.sleep(min(self.interval, remaining))
+
+
+class InotifyWatcher(FileWatcher):
+    """
+    Detects changes with Linux's inotify API. The directories holding the watched files are
+    watched rather than the files themselves, so editors that save by replacing a file are
+    handled too.
+    """
+
+    def __init__(self, paths: Iterable[Path]) -> None:
+        """
+        Parameters:
+            paths: The files to watch.
+
+        Raises:
+            OSError: If inotify is not available.
+        """
+        super().__init__(paths)
+        self._fd = -1
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._dirs: Dict[int, Path] = {}
+        try:
+            for directory in {path.parent for path in self.paths}:
+                if not directory.is_dir():
+                    continue
+                wd = self._libc.inotify_add_watch(
+                    self._fd, os.fsencode(directory), _IN_MASK
+                )
+                if wd < 0:
+                    errno = ctypes.get_errno()
+                    raise OSError(errno, os.strerror(errno), str(directory))
+                self._dirs[wd] = directory
+        except BaseException:
+            self.close()
+            raise
+
+    def _read_events(self) -> Set[Path]:
+        changed: Set[Path] = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if wd in self._dirs and name:
+                    path = self._dirs[wd] / os.fsdecode(name)
+                    if path in self.paths:
+                        changed.add(path)
+
+    def wait(self, timeout: Optional[float] = None) -> Set[Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = (
+                None if deadline is None else max(deadline - time.monotonic(), 0)
+            )
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if not readable:
+                return set()
+            changed = self._read_events()
+            # Events of unwatched files in the same directories are ignored
+            if changed:
+                return changed
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def create_watcher(paths: Iterable[Path], polling: bool = False) -> FileWatcher:
+    """
+    Creates the most efficient watcher available on the current platform.
+
+    Parameters:
+        paths: The files to watch.
+        polling: `True` to always poll the files, e.g. on network file systems that do not
+            report changes.
+
+    Returns:
+        An `InotifyWatcher` on Linux, otherwise a `PollingWatcher`.
+    """
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError):
+            # AttributeError: a libc without inotify
+            pass
+    return PollingWatcher(paths)
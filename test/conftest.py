@@ -1,7 +1,11 @@
 import os
+import subprocess
+from pathlib import Path
+from typing import List
 
 import pytest
 
+from pyciv7 import modinfo_extensions
 from pyciv7.modinfo import (
     ActionGroup,
     AgeInUse,
@@ -10,7 +14,7 @@ from pyciv7.modinfo import (
     Properties,
     UpdateDatabase,
 )
-from pyciv7.settings import Settings
+from pyciv7.settings import Settings, clear_settings_cache
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -26,6 +30,8 @@ def settings(tmp_path_factory) -> Settings:
     os.environ["CIV7_INSTALLATION_DIR"] = str(installation_dir)
     os.environ["CIV7_SETTINGS_DIR"] = str(settings_dir)
     os.environ["CIV7_RELEASE_BIN"] = "baz"
+    os.environ["PYCIV7_CACHE_DIR"] = str(civ7_dir / "cache")
+    clear_settings_cache()
     return Settings()
 
 
@@ -61,3 +67,27 @@ def fxs_new_policies_sample(tmp_path) -> Mod:
     )
     mod.mod_dir = mod_dir
     return mod
+
+
+@pytest.fixture
+def fake_transcrypt(monkeypatch) -> List[Path]:
+    """
+    Replaces the `transcrypt` subprocess with a stub that writes an empty `.js` file for every
+    transpiled source. Sources containing `raise` fail to transpile.
+    """
+    transpiled: List[Path] = []
+
+    def run_transcrypt(source: Path, outdir: Path, flags=()):
+        transpiled.append(source)
+        if "raise" in source.read_text():
+            return subprocess.CalledProcessError(1, "transcrypt", stderr="SyntaxError")
+        (outdir / source.with_suffix(".js").name).write_text(f"// {source.name}")
+
+    async def run_transcrypt_async(source: Path, outdir: Path, flags=()):
+        return run_transcrypt(source, outdir, flags)
+
+    monkeypatch.setattr(modinfo_extensions, "run_transcrypt", run_transcrypt)
+    monkeypatch.setattr(
+        modinfo_extensions, "run_transcrypt_async", run_transcrypt_async
+    )
+    return transpiled
@@ -0,0 +1,102 @@
+import pytest
+
+from pyciv7.criteria import (
+    ConfigurationBatch,
+    GameConfiguration,
+    activation,
+    compile_criteria,
+    configuration_grid,
+)
+from pyciv7.modinfo import (
+    ActionGroup,
+    AgeEverInUse,
+    AgeInUse,
+    ConfigurationValueContains,
+    Criteria,
+    LeaderPlayable,
+    Mod,
+    ModInUse,
+    NeverMet,
+)
+
+AGES = ["AGE_ANTIQUITY", "AGE_EXPLORATION", "AGE_MODERN"]
+
+
+@pytest.mark.parametrize(
+    "criteria",
+    [
+        Criteria(
+            id="antiquity-ashoka",
+            conditions=[
+                AgeInUse(age="AGE_ANTIQUITY"),
+                LeaderPlayable(leader="LEADER_ASHOKA"),
+            ],
+        ),
+        Criteria(
+            id="modern-or-dlc",
+            any=True,
+            conditions=[
+                AgeEverInUse(age="AGE_MODERN"),
+                ModInUse(value="shawnee-tecumseh", version="1"),
+            ],
+        ),
+        Criteria(
+            id="large-maps",
+            conditions=[
+                ConfigurationValueContains(
+                    group="Map", configuration_id="MapSize", value=["LARGE", "HUGE"]
+                )
+            ],
+        ),
+        Criteria(id="never", conditions=[NeverMet()]),
+        Criteria(id="empty", conditions=[]),
+    ],
+)
+def test_batch_evaluation_matches_predicates(criteria):
+    configurations = list(
+        configuration_grid(
+            ages=AGES,
+            leaders=["LEADER_ASHOKA", "LEADER_AMINA", None],
+            mod_sets=[{}, {"shawnee-tecumseh": "1"}, {"shawnee-tecumseh": "2"}],
+            values={("Map", "MapSize"): "HUGE"},
+        )
+    ) + [GameConfiguration(age="AGE_EXPLORATION", ages_played=frozenset(AGES[2:]))]
+    compiled = compile_criteria(criteria)
+    mask = compiled.mask(ConfigurationBatch(configurations))
+    assert [bool(mask >> i & 1) for i in range(len(configurations))] == [
+        compiled(configuration) for configuration in configurations
+    ]
+
+
+def test_activation_reports_the_action_groups_of_each_configuration():
+    mod = Mod(
+        id="fxs-criteria",
+        version="1",
+        action_criteria=[
+            Criteria(id="antiquity", conditions=[AgeInUse(age="AGE_ANTIQUITY")]),
+            Criteria(id="never", conditions=[NeverMet()]),
+        ],
+        action_groups=[
+            ActionGroup(id=group_id, scope="game", criteria=criteria, actions=[])
+            for group_id, criteria in [
+                ("antiquity-game", "antiquity"),
+                ("dead", "never"),
+                ("typo", "antiquty"),
+            ]
+        ],
+    )
+    report = activation(mod, configuration_grid(ages=AGES))
+    assert report.fired(0) == ["antiquity-game"]
+    assert report.fired(1) == []
+    assert report.configurations_of("antiquity-game") == [report.configurations[0]]
+    assert report.never_fired() == ["dead", "typo"]
+    assert report.unknown_criteria == {"typo": "antiquty"}
+
+
+def test_configurations_are_hashable():
+    configurations = list(
+        configuration_grid(ages=AGES, mod_sets=[{}, {"shawnee-tecumseh": "1"}])
+    )
+    assert len(set(configurations)) == len(configurations) == 2 * len(AGES)
+    copy = GameConfiguration(age=AGES[0], mods={"shawnee-tecumseh": "1"})
+    assert copy in set(configurations)
@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+
+from pyciv7.daemon import Client, Daemon
+from pyciv7.errors import DaemonError
+
+SCRIPT = """
+from pyciv7.modinfo import ActionGroup, Criteria, AlwaysMet, Mod, UpdateText
+
+mod = Mod(
+    id="fxs-daemon",
+    version="1",
+    action_criteria=[Criteria(id="always", conditions=[AlwaysMet()])],
+    action_groups=[
+        ActionGroup(
+            id="text",
+            scope="game",
+            criteria="always",
+            actions=[UpdateText(items=["text/{name}.xml"])],
+        )
+    ],
+)
+mod.mod_dir = "mods/fxs-daemon"
+"""
+
+
+@pytest.fixture
+def daemon(tmp_path, settings):
+    daemon = Daemon(tmp_path / "pyciv7.sock", settings_factory=lambda: settings)
+    ready = threading.Event()
+    thread = threading.Thread(target=daemon.serve, args=(ready,))
+    thread.start()
+    ready.wait(10)
+    yield daemon
+    daemon.shutdown()
+    thread.join()
+
+
+def test_daemon_builds_scripts_and_keeps_them_until_they_change(
+    daemon, tmp_path, monkeypatch
+):
+    script = tmp_path / "my_mod.py"
+    script.write_text(SCRIPT.format(name="a"))
+    monkeypatch.chdir(tmp_path)
+    with Client(daemon.socket_path) as client:
+        result = client.build(script)
+        assert result["mod"] == "fxs-daemon"
+        assert result["mod_dir"] == "mods/fxs-daemon"
+        assert (tmp_path / "mods" / "fxs-daemon" / ".modinfo").exists()
+        assert {d["code"] for d in result["diagnostics"]} == {"mod-missing-properties"}
+        mod = daemon.snapshots[script].mods["fxs-daemon"]
+        assert client.build(script)["changed"] == []
+        # The script did not change, so neither did its mod
+        assert daemon.snapshots[script].mods["fxs-daemon"] is mod
+        script.write_text(SCRIPT.format(name="b"))
+        assert client.build(script, reload=True)["changed"]
+        assert "text/b.xml" in (tmp_path / "mods/fxs-daemon/.modinfo").read_text()
+        assert client.validate(script)["mods"] == [
+            {"id": "fxs-daemon", "version": "1", "action_groups": 1}
+        ]
+        with pytest.raises(DaemonError, match='does not define "fxs-missing"'):
+            client.build(script, mod="fxs-missing")
+        assert client.ping()["scripts"] == 1
+
+
+def test_daemon_stops_on_shutdown(tmp_path, settings):
+    daemon = Daemon(tmp_path / "pyciv7.sock", settings_factory=lambda: settings)
+    ready = threading.Event()
+    thread = threading.Thread(target=daemon.serve, args=(ready,))
+    thread.start()
+    ready.wait(10)
+    with pytest.raises(DaemonError, match="already listens"):
+        Daemon(daemon.socket_path, settings_factory=lambda: settings).serve()
+    with Client(daemon.socket_path) as client:
+        client.shutdown()
+    thread.join(10)
+    assert not thread.is_alive()
+    assert not daemon.socket_path.exists()
+
+
+def test_daemon_runs_scripts_again_when_their_local_imports_change(
+    daemon, tmp_path, monkeypatch
+):
+    script = tmp_path / "my_mod.py"
+    script.write_text(
+        "from text_names import NAME\n"
+        + SCRIPT.format(name="{NAME}").replace('"text/', 'f"text/')
+    )
+    (tmp_path / "text_names.py").write_text('NAME = "a"\n')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    with Client(daemon.socket_path) as client:
+        client.build(script)
+        assert "text/a.xml" in (tmp_path / "mods/fxs-daemon/.modinfo").read_text()
+        (tmp_path / "text_names.py").write_text('NAME = "bb"\n')
+        assert client.build(script)["changed"]
+        assert "text/bb.xml" in (tmp_path / "mods/fxs-daemon/.modinfo").read_text()
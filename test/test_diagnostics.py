@@ -0,0 +1,35 @@
+from pyciv7.diagnostics import Diagnostic, collect, silence
+from pyciv7.modinfo import Mod, Properties
+
+
+def test_collect_deduplicates_diagnostics(capsys):
+    with collect() as diagnostics:
+        mod = Mod(id="Fxs_Diagnostics", version="1")
+        mod.properties = None
+        mod.properties = None
+    assert capsys.readouterr().out == ""
+    assert diagnostics.by_code("mod-id-not-lowercase") == [
+        Diagnostic("mod-id-not-lowercase", "Mod.id", "Fxs_Diagnostics")
+    ]
+    (missing,) = diagnostics.by_code("mod-missing-properties")
+    assert missing.model_id == "Fxs_Diagnostics"
+    assert diagnostics.counts[missing] == 3
+    diagnostics.render()
+    out = capsys.readouterr().out
+    assert out.count("Properties") == 1
+    assert "(x3)" in out
+
+
+def test_silence_drops_diagnostics(capsys):
+    with silence():
+        Properties()
+        Mod(id="Fxs Diagnostics", version="1")
+    assert capsys.readouterr().out == ""
+
+
+def test_collect_renders_on_exit(capsys):
+    with collect(render=True):
+        Properties()
+    out = capsys.readouterr().out
+    assert "includes a name" in out
+    assert "properties-missing-authors" in out
@@ -0,0 +1,46 @@
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = ["sqlalchemy", "sqlmodel", "rich", "pydantic_settings", "transcrypt"]
+
+
+def loaded_heavy_modules(code: str, modules: list = HEAVY_MODULES) -> list:
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"{code}\nimport json, sys\n"
+            f"print(json.dumps([m for m in {modules!r} if m in sys.modules]))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def test_import_pyciv7_is_lazy():
+    assert loaded_heavy_modules("import pyciv7", [*HEAVY_MODULES, "pydantic_xml"]) == []
+
+
+def test_serializing_a_simple_modinfo_skips_heavy_imports(tmp_path):
+    code = (
+        "from pyciv7.modinfo import *\n"
+        "mod = Mod(id='fxs-a', version='1', properties=Properties(name='A',\n"
+        "    description='A', authors='A'), action_groups=[ActionGroup(id='g',\n"
+        "    scope='game', criteria='c', actions=[UpdateDatabase(items=['a.xml'])])])\n"
+        f"mod.mod_dir = {str(tmp_path)!r}\n"
+        "mod.to_xml()\n"
+    )
+    assert loaded_heavy_modules(code) == []
+
+
+def test_lazy_attributes_resolve():
+    import pyciv7
+    from pyciv7.modinfo import SQLStatement
+    from sqlalchemy.sql.elements import CompilerElement
+
+    assert pyciv7.build is pyciv7.runner.build
+    assert pyciv7.Mod.__name__ == "Mod"
+    assert SQLStatement is CompilerElement
@@ -0,0 +1,117 @@
+import json
+import os
+
+import pytest
+
+from pyciv7 import index
+from pyciv7.index import IndexedActionGroup, ModIndex, read_modinfo
+from pyciv7.modinfo import ChildMod, Mod, Properties
+
+
+def install(mods_dir, mod: Mod):
+    path = mods_dir / mod.id / f"{mod.id}.modinfo"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(mod.to_xml(encoding="unicode", exclude_none=True))  # type: ignore
+    return path
+
+
+@pytest.fixture
+def mods_dir(tmp_path, fxs_new_policies_sample):
+    mods_dir = tmp_path / "Mods"
+    install(mods_dir, fxs_new_policies_sample)
+    install(
+        mods_dir,
+        Mod(
+            id="fxs-addon",
+            version="2",
+            properties=Properties(name="Addon"),
+            dependencies=[ChildMod(id="fxs-new-policies", title="New Policies")],
+            references=[ChildMod(id="fxs-missing", title="Missing")],
+        ),
+    )
+    return mods_dir
+
+
+def test_read_modinfo_extracts_the_summary(mods_dir):
+    mod = read_modinfo(mods_dir / "fxs-new-policies" / "fxs-new-policies.modinfo")
+    assert (mod.id, mod.version, mod.name) == (
+        "fxs-new-policies",
+        "1",
+        "Antiquity Policies",
+    )
+    assert mod.dependencies == ()
+    assert mod.action_groups == (
+        IndexedActionGroup("antiquity-game", "game", "antiquity-age-current"),
+    )
+    assert mod.scopes == ("game",)
+
+
+def test_scan_answers_queries_and_reuses_the_cache(mods_dir, tmp_path):
+    (mods_dir / "broken").mkdir()
+    (mods_dir / "broken" / "broken.modinfo").write_text("<Mod")
+    cache_file = tmp_path / "index.json"
+    index = ModIndex.scan([mods_dir], cache_file=cache_file)
+    assert len(index) == 2
+    assert "fxs-addon" in index
+    assert [mod.id for mod in index.dependents("fxs-new-policies")] == ["fxs-addon"]
+    assert [mod.id for mod in index.referrers("fxs-missing")] == ["fxs-addon"]
+    assert list(index.errors) == [mods_dir / "broken" / "broken.modinfo"]
+    assert cache_file.exists()
+    # Unchanged files are not read again
+    addon = mods_dir / "fxs-addon" / "fxs-addon.modinfo"
+    stat = addon.stat()
+    addon.write_text(addon.read_text().replace('version="2"', 'version="3"'))
+    os.utime(addon, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert (
+        ModIndex.scan([mods_dir], cache_file=cache_file).get("fxs-addon").version == "2"
+    )
+    os.utime(addon, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert (
+        ModIndex.scan([mods_dir], cache_file=cache_file).get("fxs-addon").version == "3"
+    )
+
+
+def test_scan_in_parallel_matches_serial_scan(mods_dir, monkeypatch):
+    serial = ModIndex.scan([mods_dir], use_cache=False, max_workers=1)
+    monkeypatch.setattr(index, "PARALLEL_SCAN_MIN_FILES", 1)
+    parallel = ModIndex.scan([mods_dir], use_cache=False, max_workers=2)
+    assert sorted(parallel, key=lambda mod: mod.id) == sorted(
+        serial, key=lambda mod: mod.id
+    )
+
+
+def test_scans_of_other_roots_keep_the_cached_entries(mods_dir, tmp_path):
+    dlc_dir = tmp_path / "DLC"
+    install(dlc_dir, Mod(id="fxs-dlc", version="1", properties=Properties(name="DLC")))
+    cache_file = tmp_path / "index.json"
+    ModIndex.scan([mods_dir], cache_file=cache_file)
+    ModIndex.scan([dlc_dir], cache_file=cache_file)
+    cached = json.loads(cache_file.read_text())["entries"]
+    assert sorted(entry["mod"]["id"] for entry in cached.values()) == [
+        "fxs-addon",
+        "fxs-dlc",
+        "fxs-new-policies",
+    ]
+    # Removed files are forgotten
+    (dlc_dir / "fxs-dlc" / "fxs-dlc.modinfo").unlink()
+    ModIndex.scan([dlc_dir], cache_file=cache_file)
+    assert len(json.loads(cache_file.read_text())["entries"]) == 2
+
+
+def test_mods_installed_twice_resolve_to_the_first_path(mods_dir, tmp_path):
+    for name in ["b-copy", "a-copy"]:
+        install(
+            mods_dir / name, Mod(id="fxs-twice", version=name, properties=Properties())
+        )
+    cache_file = tmp_path / "index.json"
+    assert ModIndex.scan([mods_dir], use_cache=False).get("fxs-twice").version == (
+        "a-copy"
+    )
+    ModIndex.scan([mods_dir / "b-copy"], cache_file=cache_file)
+    # Cached entries come in the same order as the files that are read
+    index = ModIndex.scan([mods_dir], cache_file=cache_file)
+    assert index.get("fxs-twice").version == "a-copy"
+    assert [mod.version for mod in index if mod.id == "fxs-twice"] == [
+        "a-copy",
+        "b-copy",
+    ]
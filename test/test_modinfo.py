@@ -2,6 +2,7 @@ from xml.dom import minidom
 
 import pytest
 
+from pyciv7.errors import LazySourceConsumedError
 from pyciv7.modinfo import *
 
 
@@ -87,3 +88,199 @@ def test_sample_modinfo_to_xml_matches(fxs_new_policies_sample):
     expected = to_xml_lines(expected)
     actual = to_xml_lines(fxs_new_policies_sample.to_xml(encoding="unicode", exclude_none=True))  # type: ignore
     assert actual == expected
+
+
+def test_items_action_serializes_every_item(tmp_path):
+    action = ImportFiles(items=["a.png", "b/c.png"], mod_dir=tmp_path)
+    xml: str = action.to_xml(encoding="unicode")  # type: ignore
+    assert xml == "<ImportFiles><Item>a.png</Item><Item>b/c.png</Item></ImportFiles>"
+
+
+def test_database_items_action_wraps_bulk_rows(tmp_path):
+    from pyciv7.sql import Rows
+    from sqlmodel import Field, SQLModel
+
+    class Kinds(SQLModel, table=True):
+        __tablename__ = "Kinds"
+        kind: str = Field(primary_key=True, sa_column_kwargs={"name": "Kind"})
+
+    action = UpdateDatabase(
+        items=[
+            "data/a.xml",
+            [Kinds(kind="KIND_A"), Kinds(kind="KIND_B")],
+            Kinds(kind="KIND_C"),
+        ],
+        mod_dir=tmp_path,
+    )
+    assert isinstance(action.items[1], Rows)
+    assert isinstance(action.items[2], Rows)
+    xml: str = action.to_xml(encoding="unicode")  # type: ignore
+    assert xml.count("<Item>") == 3
+
+
+def test_database_items_action_serialization_is_pure(tmp_path):
+    from sqlalchemy import text
+
+    action = UpdateDatabase(
+        items=[text("SELECT * FROM Types"), "data/a.xml"], mod_dir=tmp_path
+    )
+    xml: str = action.to_xml(encoding="unicode")  # type: ignore
+    assert action.to_xml(encoding="unicode") == xml
+    assert action.model_dump()["items"][1] == "data/a.xml"
+    assert not list(tmp_path.iterdir())
+    action.emit()
+    action.emit()
+    sql_files = list((tmp_path / "sql").iterdir())
+    assert [f"sql/{file.name}" for file in sql_files] == action.plan().items[:1]
+    # Changing the items invalidates the plan
+    action.items = [text("SELECT * FROM Kinds")]
+    assert action.plan().items != [f"sql/{sql_files[0].name}"]
+
+
+def test_iter_xml_matches_to_xml(fxs_new_policies_sample, tmp_path):
+    def assert_identical(mod):
+        expected = mod.to_xml(encoding="unicode", exclude_none=True)
+        assert "".join(mod.iter_xml()) == expected
+        mod.write_xml(tmp_path / ".modinfo")
+        assert (tmp_path / ".modinfo").read_bytes() == expected.encode()
+
+    assert_identical(fxs_new_policies_sample)
+    mod = fxs_new_policies_sample
+    mod.action_groups = [
+        ActionGroup(
+            id=f"group-{i}",
+            scope="shell" if i % 2 else "game",
+            criteria="antiquity-age-current",
+            actions=[
+                UpdateDatabase(items=[f"data/{i}-{j}&<>.xml" for j in range(3000)]),
+                ImportFiles(items=[]),
+                UIScripts(items=[f"ui/{i}.js", "ui/carriage\rreturn.js"]),
+            ],
+            load_order=i if i % 3 else None,
+        )
+        for i in range(5)
+    ]
+    mod.action_groups.append(
+        ActionGroup(id="empty", scope="game", criteria="always", actions=[])
+    )
+    mod.mod_dir = tmp_path
+    assert_identical(mod)
+    assert len(list(mod.iter_xml())) > len(mod.action_groups) * 3
+    assert_identical(Mod(id="fxs-empty", version="1"))
+
+
+def test_lazy_action_groups_and_items_match_eager_ones(tmp_path):
+    def action_groups(lazy):
+        for i in range(3):
+            items = [f"text/{i}-{j}.xml" for j in range(2500)]
+            yield ActionGroup(
+                id=f"group-{i}",
+                scope="game",
+                criteria="always",
+                actions=[
+                    (
+                        UpdateText(items=["text/first.xml"], lazy_items=iter(items))
+                        if lazy
+                        else UpdateText(items=["text/first.xml", *items])
+                    ),
+                    ImportFiles(lazy_items=[]) if lazy else ImportFiles(items=[]),
+                ],
+            )
+        yield {
+            "id": "from-dict",
+            "scope": "shell",
+            "criteria": "always",
+            "actions": [{"items": ["ui/shell.js"]}],
+        }
+
+    lazy = Mod(
+        id="fxs-lazy", version="1", lazy_action_groups=lambda: action_groups(True)
+    )
+    lazy.mod_dir = tmp_path
+    eager = Mod(id="fxs-lazy", version="1", action_groups=list(action_groups(False)))
+    eager.mod_dir = tmp_path
+    expected = eager.to_xml(encoding="unicode", exclude_none=True)
+    assert "".join(lazy.iter_xml()) == expected
+    # Callables are called again for every serialization
+    assert "".join(lazy.iter_xml()) == expected
+    assert (
+        lazy.to_xml(encoding="unicode")
+        == '<Mod id="fxs-lazy" version="1" xmlns="ModInfo" />'
+    )
+
+
+def test_lazy_generators_are_consumed_once(tmp_path):
+    mod = Mod(
+        id="fxs-lazy",
+        version="1",
+        lazy_action_groups=(
+            ActionGroup(id=f"group-{i}", scope="game", criteria="always", actions=[])
+            for i in range(2)
+        ),
+    )
+    assert "".join(mod.iter_xml()).count("<ActionGroup ") == 2
+    with pytest.raises(LazySourceConsumedError):
+        "".join(mod.iter_xml())
+
+
+def test_bundle_cannot_be_lazy():
+    with pytest.raises(ValueError):
+        UpdateDatabase(lazy_items=iter(["a.sql"]), bundle=True)
+
+
+def test_union_members_are_picked_by_kind(tmp_path):
+    group = ActionGroup.model_validate(
+        {
+            "id": "scripts",
+            "scope": "game",
+            "criteria": "always",
+            "actions": [
+                {"kind": "UIScripts", "items": ["ui/a.js"]},
+                {"kind": "UpdateArt", "items": ["art/a.xml"]},
+                ImportFiles(items=["a.png"]),
+            ],
+        }
+    )
+    assert [type(action) for action in group.actions] == [
+        UIScripts,
+        UpdateArt,
+        ImportFiles,
+    ]
+    criteria = Criteria.model_validate(
+        {"id": "c", "conditions": [{"kind": "AgeWasUsed", "age": "AGE_MODERN"}]}
+    )
+    assert isinstance(criteria.conditions[0], AgeWasUsed)
+    with pytest.raises(ValueError, match="Unknown kind"):
+        Criteria.model_validate({"id": "c", "conditions": [{"kind": "AgeInUsed"}]})
+
+
+def test_construct_trusted_matches_validation(fxs_new_policies_sample):
+    data = {
+        "id": "fxs-trusted",
+        "version": "1",
+        "properties": {"name": "Trusted", "affects_saved_games": True},
+        "action_criteria": [
+            {
+                "id": "antiquity",
+                "any": True,
+                "conditions": [
+                    {"kind": "AgeInUse", "age": "AGE_ANTIQUITY"},
+                    {"kind": "ModInUse", "value": "fxs-base", "version": "1"},
+                ],
+            }
+        ],
+        "action_groups": [
+            {
+                "id": "scripts",
+                "scope": "game",
+                "criteria": "antiquity",
+                "actions": [{"kind": "UIScripts", "items": ["ui/a.js"]}],
+                "load_order": 3,
+            }
+        ],
+    }
+    trusted = construct_trusted(Mod, data)
+    validated = Mod.model_validate(data)
+    assert type(trusted.action_groups[0].actions[0]) is UIScripts
+    trusted.mod_dir = validated.mod_dir = fxs_new_policies_sample.mod_dir
+    assert trusted.to_xml() == validated.to_xml()
@@ -0,0 +1,214 @@
+from pathlib import Path
+
+import pytest
+
+from pyciv7 import modinfo_extensions
+from pyciv7.errors import TranspileError
+from pyciv7.modinfo import ActionGroup, Mod
+from pyciv7.modinfo_extensions import PythonGameScripts
+from pyciv7.transpile_cache import local_imports
+
+
+@pytest.fixture
+def scripts_dir(tmp_path):
+    for name in ["a", "b", "c", "d"]:
+        (tmp_path / f"{name}.py").write_text(f"print('{name}')")
+    return tmp_path
+
+
+@pytest.mark.parametrize("mode", ["sequential", "parallel"])
+def test_transpile_keeps_item_order(scripts_dir, fake_transcrypt, mode):
+    scripts = PythonGameScripts(
+        items=["c.py", "a.py", "d.py", "b.py"],
+        mod_dir=scripts_dir,
+        mode=mode,
+        max_workers=3,
+    )
+    scripts.emit()
+    assert scripts.model_dump() == {
+        "items": [
+            "transcrypt/c.js",
+            "transcrypt/a.js",
+            "transcrypt/d.js",
+            "transcrypt/b.js",
+        ]
+    }
+    assert sorted(source.name for source in fake_transcrypt) == [
+        "a.py",
+        "b.py",
+        "c.py",
+        "d.py",
+    ]
+
+
+def test_parallel_transpile_reports_all_failures(scripts_dir, fake_transcrypt):
+    (scripts_dir / "b.py").write_text("raise ValueError")
+    (scripts_dir / "d.py").write_text("raise ValueError")
+    scripts = PythonGameScripts(
+        items=["a.py", "b.py", "c.py", "d.py"], mod_dir=scripts_dir, mode="parallel"
+    )
+    with pytest.raises(TranspileError, match="b.py, d.py"):
+        scripts.emit()
+    # Independent items are still transpiled
+    assert len(fake_transcrypt) == 4
+
+
+def test_transpile_cache_skips_unchanged_scripts(scripts_dir, fake_transcrypt):
+    (scripts_dir / "helper.py").write_text("def f():\n    return 1\n")
+    (scripts_dir / "a.py").write_text("from helper import f\nprint(f())\n")
+    scripts = PythonGameScripts(items=["a.py", "b.py"], mod_dir=scripts_dir)
+    scripts.emit()
+    assert len(fake_transcrypt) == 2
+    # Nothing changed
+    scripts.emit()
+    assert len(fake_transcrypt) == 2
+    # Editing a script only re-transpiles that script
+    (scripts_dir / "b.py").write_text("print('edited')")
+    scripts.emit()
+    assert [source.name for source in fake_transcrypt[2:]] == ["b.py"]
+    # Editing an imported module re-transpiles the scripts importing it
+    (scripts_dir / "helper.py").write_text("def f():\n    return 2\n")
+    scripts.emit()
+    assert [source.name for source in fake_transcrypt[3:]] == ["a.py"]
+    # Changing the flags invalidates every script
+    scripts.flags = ["--esv", "6"]
+    scripts.emit()
+    assert sorted(source.name for source in fake_transcrypt[4:]) == ["a.py", "b.py"]
+
+
+def test_serialization_does_not_transpile(scripts_dir, fake_transcrypt):
+    scripts = PythonGameScripts(items=["a.py", "b.py"], mod_dir=scripts_dir)
+    scripts.model_dump()
+    scripts.to_xml()
+    assert not fake_transcrypt
+    assert not (scripts_dir / "transcrypt").exists()
+
+
+def test_to_xml_writes_python_game_scripts(scripts_dir, fake_transcrypt):
+    action_group = ActionGroup(
+        id="scripts",
+        scope="game",
+        criteria="always",
+        actions=[PythonGameScripts(items=["a.py"], mod_dir=scripts_dir)],
+    )
+    xml = action_group.to_xml(encoding="unicode")
+    assert (
+        "<Actions><UIScripts><Item>transcrypt/a.js</Item></UIScripts></Actions>" in xml
+    )
+    assert not fake_transcrypt
+
+
+def test_iter_xml_matches_to_xml_with_python_game_scripts(
+    fxs_new_policies_sample: Mod, scripts_dir, fake_transcrypt
+):
+    mod = fxs_new_policies_sample
+    mod.action_groups[0].actions.append(PythonGameScripts(items=[scripts_dir / "a.py"]))
+    mod.mod_dir = scripts_dir
+    expected = mod.to_xml(encoding="unicode", exclude_none=True)
+    assert "<UIScripts><Item>transcrypt/a.js</Item></UIScripts>" in expected
+    assert "".join(mod.iter_xml()) == expected
+
+
+def test_local_imports_are_transitive(tmp_path):
+    package = tmp_path / "pkg"
+    package.mkdir()
+    (package / "__init__.py").touch()
+    (package / "util.py").write_text("import json\nfrom . import consts\n")
+    (package / "consts.py").touch()
+    script = tmp_path / "script.py"
+    script.write_text("from pkg.util import *\nimport os\n")
+    assert local_imports(script) == {
+        (package / "__init__.py").resolve(),
+        (package / "util.py").resolve(),
+        (package / "consts.py").resolve(),
+    }
+
+
+def test_batch_transpile_runs_one_session(scripts_dir, monkeypatch):
+    sessions = []
+
+    def run_transcrypt_in_process(args):
+        sessions.append(args)
+        outdir = Path(args[args.index("--outdir") + 1])
+        entry = Path(args[-1])
+        outdir.mkdir(parents=True)
+        for module in [entry.stem, "org.transcrypt.__runtime__"] + [
+            line.split()[1] for line in entry.read_text().splitlines()
+        ]:
+            (outdir / f"{module}.js").write_text(f"// {module}")
+        (outdir / f"{entry.stem}.project").write_text("{}")
+        return 0, ""
+
+    monkeypatch.setattr(
+        modinfo_extensions, "run_transcrypt_in_process", run_transcrypt_in_process
+    )
+    scripts = PythonGameScripts(
+        items=["b.py", "a.py", "c.py"], mod_dir=scripts_dir, mode="batch"
+    )
+    scripts.emit()
+    assert scripts.model_dump() == {
+        "items": ["transcrypt/b.js", "transcrypt/a.js", "transcrypt/c.js"]
+    }
+    assert len(sessions) == 1
+    assert sorted(file.name for file in (scripts_dir / "transcrypt").iterdir()) == [
+        ".pyciv7-cache.json",
+        "a.js",
+        "b.js",
+        "c.js",
+        "org.transcrypt.__runtime__.js",
+    ]
+
+
+def test_bootstrap_imports_lazy_items_on_demand(scripts_dir, fake_transcrypt):
+    scripts = PythonGameScripts(
+        items=["a.py", "b.py", "a.py", "c.py"],
+        mod_dir=scripts_dir,
+        bootstrap=True,
+        lazy=["c.py"],
+    )
+    scripts.emit()
+    (bootstrap,) = scripts.model_dump()["items"]
+    assert bootstrap.startswith("transcrypt/bootstrap-")
+    assert len(fake_transcrypt) == 3
+    script = (scripts_dir / bootstrap).read_text()
+    assert "<MODULES>" not in script
+    game_dir = scripts_dir.name
+    assert (
+        f'[["{game_dir}/a", "{game_dir}/transcrypt/a.js", false], '
+        f'["{game_dir}/b", "{game_dir}/transcrypt/b.js", false], '
+        f'["{game_dir}/c", "{game_dir}/transcrypt/c.js", true]]'
+    ) in script
+
+
+def test_bootstrap_keys_are_qualified_by_mod(tmp_path):
+    scripts = []
+    for mod in ["fxs-first", "fxs-second"]:
+        (tmp_path / mod).mkdir()
+        (tmp_path / mod / "main.py").write_text("print('main')")
+        action = PythonGameScripts(
+            items=["main.py"], mod_dir=tmp_path / mod, bootstrap=True
+        )
+        (bootstrap,) = action.plan().artifacts[1:]
+        scripts.append(bootstrap.script)
+    # Both bootstraps run in the same JavaScript context, so their keys must not collide
+    first, second = scripts
+    assert '["fxs-first/main", "fxs-first/transcrypt/main.js", false]' in first
+    assert '["fxs-second/main", "fxs-second/transcrypt/main.js", false]' in second
+
+
+def test_scripts_with_the_same_module_name_are_rejected(scripts_dir):
+    (scripts_dir / "sub").mkdir()
+    (scripts_dir / "sub" / "a.py").write_text("print('sub')")
+    scripts = PythonGameScripts(items=["a.py", "sub/a.py"], mod_dir=scripts_dir)
+    with pytest.raises(ValueError, match='both be transpiled to "a.js"'):
+        scripts.plan()
+
+
+@pytest.mark.parametrize(
+    "fields",
+    [{"lazy": ["a.py"]}, {"bootstrap": True, "lazy": ["d.py"]}],
+    ids=["without bootstrap", "not an item"],
+)
+def test_lazy_items_are_validated(scripts_dir, fields):
+    with pytest.raises(ValueError, match="lazy|not an item"):
+        PythonGameScripts(items=["a.py", "b.py"], mod_dir=scripts_dir, **fields)
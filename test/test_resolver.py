@@ -0,0 +1,88 @@
+from pyciv7.index import IndexedActionGroup, IndexedMod, ModIndex
+from pyciv7.modinfo import ChildMod, Mod
+from pyciv7.resolver import resolve
+
+
+def indexed(mod_id, dependencies=(), references=(), load_orders=()):
+    return IndexedMod(
+        id=mod_id,
+        version="1",
+        path=None,
+        dependencies=tuple(dependencies),
+        references=tuple(references),
+        action_groups=tuple(
+            IndexedActionGroup(f"{mod_id}-{i}", "game", "always", load_order)
+            for i, load_order in enumerate(load_orders)
+        ),
+    )
+
+
+def test_resolve_orders_dependencies_and_load_order():
+    resolution = resolve(
+        [
+            indexed("fxs-c", dependencies=["fxs-a", "base-standard"]),
+            indexed("fxs-b", load_orders=[5, 1]),
+            indexed("fxs-a", load_orders=[10]),
+            indexed("fxs-d", references=["fxs-c", "fxs-optional"]),
+        ]
+    )
+    assert resolution.ok
+    assert [mod.id for mod in resolution.order] == ["fxs-b", "fxs-a", "fxs-c", "fxs-d"]
+    assert [group.id for _, group in resolution.action_groups] == [
+        "fxs-b-1",
+        "fxs-b-0",
+        "fxs-a-0",
+    ]
+
+
+def test_resolve_merges_action_groups_across_mods():
+    resolution = resolve(
+        [
+            indexed("fxs-a", load_orders=[0, 100]),
+            indexed("fxs-b", load_orders=[10]),
+            # Loads after its dependency despite its lower LoadOrder
+            indexed("fxs-c", dependencies=["fxs-b"], load_orders=[1, 50]),
+            indexed("fxs-d", dependencies=["fxs-e"], load_orders=[20]),
+            indexed("fxs-e"),
+        ]
+    )
+    assert [group.id for _, group in resolution.action_groups] == [
+        "fxs-a-0",
+        "fxs-b-0",
+        "fxs-c-0",
+        "fxs-d-0",
+        "fxs-c-1",
+        "fxs-a-1",
+    ]
+
+
+def test_resolve_reports_cycles_and_missing_dependencies():
+    resolution = resolve(
+        [
+            indexed("fxs-a", dependencies=["fxs-b"]),
+            indexed("fxs-b", dependencies=["fxs-a"]),
+            indexed("fxs-self", dependencies=["fxs-self"]),
+            indexed("fxs-c", dependencies=["fxs-a"]),
+            indexed("fxs-d", dependencies=["fxs-missing"]),
+        ]
+    )
+    assert not resolution.ok
+    assert resolution.cycles == [["fxs-a", "fxs-b"], ["fxs-self"]]
+    assert resolution.blocked == ["fxs-c"]
+    assert resolution.missing == {"fxs-d": ["fxs-missing"]}
+    assert [mod.id for mod in resolution.order] == ["fxs-d"]
+
+
+def test_resolve_accepts_mods_and_indexes(fxs_new_policies_sample):
+    addon = Mod(
+        id="fxs-addon",
+        version="1",
+        dependencies=[ChildMod(id="fxs-new-policies", title="New Policies")],
+    )
+    resolution = resolve([addon, fxs_new_policies_sample])
+    assert [mod.id for mod in resolution.order] == ["fxs-new-policies", "fxs-addon"]
+    index = ModIndex(resolution.order)
+    assert [mod.id for mod in resolve(index).order] == [
+        "fxs-new-policies",
+        "fxs-addon",
+    ]
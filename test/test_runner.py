@@ -1,8 +1,19 @@
+import asyncio
+import os
+import stat
+import sys
+import threading
+import time
+
 import pytest
 from sqlalchemy import text
-from pyciv7 import runner
+from pyciv7 import modinfo_extensions, runner
+from pyciv7.context import BuildContext
+from pyciv7.errors import BuildCancelledError, ModExistsError
+from pyciv7.modinfo import ActionGroup, Mod, UpdateDatabase
 from pyciv7.modinfo_extensions import PythonGameScripts
 from pyciv7.settings import Settings
+from pyciv7.sql import Rows
 
 
 def test_build_fxs_new_policies_sample(fxs_new_policies_sample):
@@ -18,16 +29,395 @@ def test_build_fxs_new_policies_sample_with_sql_expression(fxs_new_policies_samp
     assert len(list((fxs_new_policies_sample.mod_dir / "sql").glob("*"))) == 1
 
 
-# TODO: need to mock transcrypt subprocess.run
-@pytest.mark.skip(reason="Transcrypt needs to be mocked for pipeline")
-def test_build_fxs_new_policies_sample_with_python_script(fxs_new_policies_sample):
+def test_build_fxs_new_policies_sample_with_python_script(
+    fxs_new_policies_sample, fake_transcrypt
+):
     python_script = fxs_new_policies_sample.mod_dir / "test.py"
     python_script.write_text("print('Hello, world')")
     fxs_new_policies_sample.action_groups[0].actions[0] = PythonGameScripts(
-        items=["test.py"]
+        items=["test.py"], mod_dir=fxs_new_policies_sample.mod_dir
     )
     runner.build(fxs_new_policies_sample)
     assert (fxs_new_policies_sample.mod_dir / ".modinfo").read_text()
     assert (
         fxs_new_policies_sample.mod_dir / Settings().transcrypt_sub_dir / "test.js"
     ).exists()
+
+
+def test_rebuild_reuses_and_removes_generated_sql_files(fxs_new_policies_sample):
+    mod_dir = fxs_new_policies_sample.mod_dir
+    hand_written = mod_dir / "sql" / "hand-written.sql"
+    hand_written.parent.mkdir()
+    hand_written.write_text("SELECT 1")
+    action = fxs_new_policies_sample.action_groups[0].actions[0]
+    action.items = [text("SELECT * FROM Policies"), text("SELECT * FROM Types")]
+    runner.build(fxs_new_policies_sample)
+    first_build = {
+        file.name: file.stat().st_mtime_ns for file in (mod_dir / "sql").iterdir()
+    }
+    assert len(first_build) == 3
+    # Rebuilding identical statements produces the same, untouched files
+    runner.build(fxs_new_policies_sample, overwrite=True)
+    assert {
+        file.name: file.stat().st_mtime_ns for file in (mod_dir / "sql").iterdir()
+    } == first_build
+    # Statements that are no longer used are removed
+    action.items = [text("SELECT * FROM Types")]
+    runner.build(fxs_new_policies_sample, overwrite=True)
+    remaining = sorted(file.name for file in (mod_dir / "sql").iterdir())
+    assert len(remaining) == 2
+    assert "hand-written.sql" in remaining
+    assert set(remaining) < set(first_build)
+
+
+def test_rebuild_with_a_relative_mod_dir_keeps_sql_files(
+    fxs_new_policies_sample, tmp_path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    fxs_new_policies_sample.action_groups[0].actions[0].items = [text("SELECT 1")]
+    fxs_new_policies_sample.mod_dir = "fxs-new-policies"
+    runner.build(fxs_new_policies_sample)
+    assert "<Item>sql/" in (tmp_path / "fxs-new-policies" / ".modinfo").read_text()
+    assert runner.build(fxs_new_policies_sample, overwrite=True).changed == []
+    assert len(list((tmp_path / "fxs-new-policies" / "sql").glob("*.sql"))) == 1
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX file modes")
+def test_generated_files_get_the_usual_file_mode(fxs_new_policies_sample):
+    fxs_new_policies_sample.action_groups[0].actions[0].items = [text("SELECT 1")]
+    runner.build(fxs_new_policies_sample)
+    mod_dir = fxs_new_policies_sample.mod_dir
+    (sql_file,) = (mod_dir / "sql").glob("*.sql")
+    umask = os.umask(0o022)
+    os.umask(umask)
+    for path in [mod_dir / ".modinfo", sql_file]:
+        assert stat.S_IMODE(path.stat().st_mode) == 0o666 & ~umask
+    # Rewritten files keep their mode
+    (mod_dir / ".modinfo").chmod(0o640)
+    fxs_new_policies_sample.properties.name = "Renamed"
+    runner.build(fxs_new_policies_sample, overwrite=True)
+    assert stat.S_IMODE((mod_dir / ".modinfo").stat().st_mode) == 0o640
+    # New files follow the current umask
+    sql_file.unlink()
+    umask = os.umask(0o077)
+    try:
+        runner.build(fxs_new_policies_sample, overwrite=True)
+    finally:
+        os.umask(umask)
+    (sql_file,) = (mod_dir / "sql").glob("*.sql")
+    assert stat.S_IMODE(sql_file.stat().st_mode) == 0o600
+
+
+def test_build_fxs_new_policies_sample_with_bulk_rows(fxs_new_policies_sample):
+    rows = (
+        {
+            "Tag": f"LOC_TRADITION_{i}_NAME",
+            "Language": "en_US",
+            "Text": f"Tradition {i}",
+        }
+        for i in range(1_050)
+    )
+    fxs_new_policies_sample.action_groups[0].actions[0].items = [
+        Rows(rows, table="LocalizedText")
+    ]
+    runner.build(fxs_new_policies_sample)
+    sql_files = list((fxs_new_policies_sample.mod_dir / "sql").glob("*.sql"))
+    # 500 rows per INSERT statement
+    assert len(sql_files) == 3
+    assert sum(file.read_text().count("LOC_TRADITION_") for file in sql_files) == 1_050
+
+
+def test_build_fxs_new_policies_sample_with_bundled_sql(fxs_new_policies_sample):
+    action = fxs_new_policies_sample.action_groups[0].actions[0]
+    action.items = [
+        text("INSERT INTO Types (Type, Kind) VALUES ('A', 'KIND_TRADITION');"),
+        "data/antiquity-traditions.xml",
+        Rows(({"Type": f"T{i}"} for i in range(3)), table="Types", chunk_size=2),
+    ]
+    action.bundle = True
+    action.transaction = True
+    runner.build(fxs_new_policies_sample)
+    sql_files = list((fxs_new_policies_sample.mod_dir / "sql").glob("*.sql"))
+    assert len(sql_files) == 1
+    assert sql_files[0].read_text() == (
+        "BEGIN TRANSACTION;\n"
+        "INSERT INTO Types (Type, Kind) VALUES ('A', 'KIND_TRADITION');\n"
+        "INSERT INTO \"Types\" (\"Type\") VALUES ('T0'), ('T1');\n"
+        'INSERT INTO "Types" ("Type") VALUES (\'T2\');\n'
+        "COMMIT;\n"
+    )
+    modinfo = (fxs_new_policies_sample.mod_dir / ".modinfo").read_text()
+    assert modinfo.index(sql_files[0].name) < modinfo.index("antiquity-traditions.xml")
+
+
+def test_rebuild_only_rewrites_changed_files(fxs_new_policies_sample):
+    mod_dir = fxs_new_policies_sample.mod_dir
+    action = fxs_new_policies_sample.action_groups[0].actions[0]
+    action.items = ["data/antiquity-traditions.xml", text("SELECT * FROM Types")]
+    manifest = runner.build(fxs_new_policies_sample)
+    assert (mod_dir / ".modinfo") in manifest.changed
+    files = [mod_dir / ".modinfo", *(mod_dir / "sql").iterdir()]
+    mtimes = [file.stat().st_mtime_ns for file in files]
+    manifest = runner.build(fxs_new_policies_sample, overwrite=True)
+    assert manifest.changed == []
+    assert [file.stat().st_mtime_ns for file in files] == mtimes
+    # Edited inputs and tampered outputs are picked up
+    (mod_dir / "data" / "antiquity-traditions.xml").write_text("<Database/>")
+    files[1].write_text("SELECT 1")
+    manifest = runner.build(fxs_new_policies_sample, overwrite=True)
+    assert sorted(manifest.changed) == sorted(
+        [mod_dir / "data" / "antiquity-traditions.xml", files[1]]
+    )
+    assert files[1].read_text() == "SELECT * FROM Types"
+    assert files[0].stat().st_mtime_ns == mtimes[0]
+
+
+def test_build_lazy_action_groups_emits_their_sql_files(tmp_path):
+    def action_groups():
+        for age in ("antiquity", "exploration", "modern"):
+            yield ActionGroup(
+                id=f"{age}-types",
+                scope="game",
+                criteria="always",
+                actions=[
+                    UpdateDatabase(
+                        lazy_items=(
+                            text(f"SELECT '{age}-{i}' FROM Types") for i in range(3)
+                        )
+                    )
+                ],
+            )
+
+    mod = Mod(id="fxs-generated", version="1", lazy_action_groups=action_groups)
+    mod.mod_dir = tmp_path / "fxs-generated"
+    runner.build(mod)
+    modinfo = (mod.mod_dir / ".modinfo").read_text()
+    sql_files = list((mod.mod_dir / "sql").glob("*.sql"))
+    assert len(sql_files) == 9
+    assert all(f"sql/{file.name}" in modinfo for file in sql_files)
+    manifest = runner.build(mod, overwrite=True)
+    assert manifest.changed == []
+
+
+def test_watched_sources_include_reiterable_lazy_action_groups(tmp_path):
+    def action_groups():
+        yield ActionGroup(
+            id="data",
+            scope="game",
+            criteria="always",
+            actions=[UpdateDatabase(items=["data/types.xml"])],
+        )
+
+    mod = Mod(id="fxs-generated", version="1", lazy_action_groups=action_groups)
+    mod.mod_dir = tmp_path
+    assert list(runner.watched_sources(mod)) == [tmp_path.absolute() / "data/types.xml"]
+    # A generator is consumed by the build, so its action groups are not watched
+    mod.lazy_action_groups = action_groups()
+    assert runner.watched_sources(mod) == {}
+    assert len(list(mod.iter_action_groups())) == 1
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_build_many_reports_every_result(fxs_new_policies_sample, tmp_path, jobs):
+    mods = []
+    for i in range(3):
+        mod = fxs_new_policies_sample.model_copy(deep=True)
+        mod.id = f"fxs-new-policies-{i}"
+        mod.mod_dir = tmp_path / mod.id
+        mod.action_groups[0].actions[0].items = [text(f"SELECT {i}")]
+        mods.append(mod)
+    # Already exists
+    (tmp_path / mods[1].id).mkdir()
+    (tmp_path / mods[1].id / ".modinfo").touch()
+    results = runner.build_many(mods, jobs=jobs)
+    assert [result.mod_id for result in results] == [mod.id for mod in mods]
+    assert [result.ok for result in results] == [True, False, True]
+    assert isinstance(results[1].error, ModExistsError)
+    assert all(result.duration >= 0 for result in results)
+    assert (tmp_path / mods[2].id / ".modinfo").read_text()
+
+
+def test_build_async_builds_mods_concurrently(
+    fxs_new_policies_sample, fake_transcrypt, tmp_path
+):
+    mods = []
+    for i in range(3):
+        mod = fxs_new_policies_sample.model_copy(deep=True)
+        mod.id = f"fxs-new-policies-{i}"
+        mod_dir = tmp_path / mod.id
+        mod_dir.mkdir()
+        (mod_dir / "script.py").write_text(f"print({i})")
+        mod.action_groups[0].actions = [
+            UpdateDatabase(items=[text(f"SELECT {i}")]),
+            PythonGameScripts(items=["script.py"]),
+        ]
+        mod.mod_dir = mod_dir
+        mods.append(mod)
+
+    async def build_all():
+        return await asyncio.gather(*(runner.build_async(mod) for mod in mods))
+
+    manifests = asyncio.run(build_all())
+    assert len(fake_transcrypt) == 3
+    for mod, manifest in zip(mods, manifests):
+        assert (mod.mod_dir / "transcrypt" / "script.js").exists()
+        assert len(list((mod.mod_dir / "sql").glob("*.sql"))) == 1
+        modinfo = (mod.mod_dir / ".modinfo").read_text()
+        assert "<Item>transcrypt/script.js</Item>" in modinfo
+        assert "<Item>sql/" in modinfo
+        assert mod.mod_dir / ".modinfo" in manifest.changed
+    # The scripts are up to date
+    asyncio.run(runner.build_async(mods[0], overwrite=True))
+    assert len(fake_transcrypt) == 3
+
+
+def test_build_async_cancellation_keeps_the_previous_modinfo(
+    fxs_new_policies_sample, monkeypatch
+):
+    mod_dir = fxs_new_policies_sample.mod_dir
+    (mod_dir / "script.py").write_text("print('Hello, world')")
+    fxs_new_policies_sample.action_groups[0].actions.append(
+        PythonGameScripts(items=["script.py"], mod_dir=mod_dir)
+    )
+    started = []
+
+    async def hanging_transcrypt(source, outdir, flags=()):
+        started.append(source)
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(modinfo_extensions, "run_transcrypt_async", hanging_transcrypt)
+
+    async def build_and_cancel():
+        task = asyncio.ensure_future(runner.build_async(fxs_new_policies_sample))
+        while not started:
+            await asyncio.sleep(0)
+        task.cancel()
+        await task
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(build_and_cancel())
+    assert not (mod_dir / ".modinfo").exists()
+    # A cancelled context stops the rest of the build before its next action
+    context = BuildContext(Settings())
+    context.cancel()
+    fxs_new_policies_sample.action_groups[0].actions.pop()
+    with pytest.raises(BuildCancelledError):
+        runner.build(fxs_new_policies_sample, context=context)
+    assert not (mod_dir / ".modinfo").exists()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Runs a shell script")
+def test_run_async_waits_for_the_game(fxs_new_policies_sample, tmp_path):
+    game = tmp_path / "Civ7.sh"
+    game.write_text("#!/bin/sh\nexit 3\n")
+    game.chmod(0o755)
+    settings = Settings(civ7_release_bin=game)
+    exit_code = asyncio.run(
+        runner.run_async(
+            fxs_new_policies_sample, debug=False, settings_factory=lambda: settings
+        )
+    )
+    assert exit_code == 3
+    assert (fxs_new_policies_sample.mod_dir / ".modinfo").exists()
+
+    def unreachable():
+        raise AssertionError("settings resolved despite the context")
+
+    exit_code = asyncio.run(
+        runner.run_async(
+            fxs_new_policies_sample,
+            debug=False,
+            overwrite=True,
+            settings_factory=unreachable,
+            context=BuildContext(settings),
+        )
+    )
+    assert exit_code == 3
+
+
+def test_run_uses_the_given_context(fxs_new_policies_sample, tmp_path):
+    game = tmp_path / "Civ7.sh"
+    game.write_text("#!/bin/sh\nexit 0\n")
+    game.chmod(0o755)
+
+    def unreachable():
+        raise AssertionError("settings resolved despite the context")
+
+    context = BuildContext(Settings(civ7_release_bin=game))
+    runner.run(
+        fxs_new_policies_sample,
+        debug=False,
+        settings_factory=unreachable,
+        context=context,
+    )
+    assert (fxs_new_policies_sample.mod_dir / ".modinfo").exists()
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+@pytest.mark.parametrize("polling", [True, False])
+def test_watch_rebuilds_changed_scripts(
+    fxs_new_policies_sample, fake_transcrypt, polling
+):
+    mod_dir = fxs_new_policies_sample.mod_dir
+    for name in ["a", "b"]:
+        (mod_dir / f"{name}.py").write_text(f"print('{name}')")
+    fxs_new_policies_sample.action_groups[0].actions.append(
+        PythonGameScripts(items=["a.py", "b.py"], mod_dir=mod_dir)
+    )
+    stop = threading.Event()
+    watcher = threading.Thread(
+        target=runner.watch,
+        args=(fxs_new_policies_sample,),
+        kwargs={"script": mod_dir / "missing.py", "polling": polling, "stop": stop},
+    )
+    watcher.start()
+    try:
+        wait_for(lambda: len(fake_transcrypt) == 2)
+        time.sleep(0.3)
+        (mod_dir / "b.py").write_text("print('edited')")
+        wait_for(lambda: len(fake_transcrypt) == 3)
+        assert fake_transcrypt[2].name == "b.py"
+    finally:
+        stop.set()
+        watcher.join()
+
+
+def test_watch_reloads_the_script_defining_the_mod(tmp_path):
+    mod_dir = tmp_path / "mod"
+    script = tmp_path / "make_mod.py"
+    definition = (
+        "from sqlalchemy import text\n"
+        "from pyciv7.modinfo import *\n"
+        "mod = Mod(id='fxs-watched', version='1', properties=Properties(name='W'),\n"
+        "    action_groups=[ActionGroup(id='g', scope='game', criteria='c',\n"
+        "        actions=[UpdateDatabase(items=[text({sql!r})])])])\n"
+        "mod.mod_dir = {mod_dir!r}\n"
+    )
+    script.write_text(definition.format(sql="SELECT 1", mod_dir=str(mod_dir)))
+    mod = runner.reload_mod(script, "fxs-watched")
+    stop = threading.Event()
+    watcher = threading.Thread(
+        target=runner.watch,
+        args=(mod,),
+        kwargs={"script": script, "polling": True, "stop": stop},
+    )
+    watcher.start()
+    try:
+        wait_for(lambda: (mod_dir / ".modinfo").exists())
+        time.sleep(0.3)
+        script.write_text(definition.format(sql="SELECT 22", mod_dir=str(mod_dir)))
+
+        def rebuilt():
+            sql_files = list((mod_dir / "sql").glob("*.sql"))
+            return [file.read_text() for file in sql_files] == ["SELECT 22"]
+
+        wait_for(rebuilt)
+    finally:
+        stop.set()
+        watcher.join()
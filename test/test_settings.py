@@ -0,0 +1,43 @@
+import platform
+
+from pyciv7 import settings as settings_module
+from pyciv7.context import BuildContext
+from pyciv7.settings import Settings, clear_settings_cache, get_settings, steam_root
+
+
+def test_get_settings_is_memoized(monkeypatch):
+    assert get_settings() is get_settings()
+    assert BuildContext.current().settings is get_settings()
+    monkeypatch.setenv("SQL_SUB_DIR", "database")
+    try:
+        clear_settings_cache()
+        assert str(get_settings().sql_sub_dir) == "database"
+    finally:
+        monkeypatch.undo()
+        clear_settings_cache()
+    assert get_settings() == Settings()
+
+
+def test_steam_root_is_cached_on_disk(tmp_path, monkeypatch):
+    probes = []
+    steam = tmp_path / "steam"
+    steam.mkdir()
+
+    def guess_posix_steam_root(is_darwin):
+        probes.append(is_darwin)
+        return steam
+
+    monkeypatch.setattr(platform, "system", lambda: "Linux")
+    monkeypatch.setattr(
+        settings_module, "guess_posix_steam_root", guess_posix_steam_root
+    )
+    monkeypatch.setenv("PYCIV7_CACHE_DIR", str(tmp_path / "cache"))
+    assert steam_root() == steam
+    assert steam_root() == steam
+    assert len(probes) == 1
+    # A stale cache entry is probed again
+    steam.rmdir()
+    steam_root()
+    assert len(probes) == 2
+    clear_settings_cache(discovery=True)
+    assert not (tmp_path / "cache" / "discovery.json").exists()
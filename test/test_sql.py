@@ -0,0 +1,133 @@
+from typing import Optional
+
+import pytest
+from sqlalchemy import (
+    Boolean,
+    Integer,
+    String,
+    column,
+    delete,
+    insert,
+    select,
+    table,
+    text,
+    update,
+)
+
+from sqlmodel import Field, SQLModel
+
+from pyciv7.sql import Rows, StatementCompiler
+
+types = table(
+    "Types",
+    column("Type", String),
+    column("Kind", String),
+    column("Weight", Integer),
+    column("Hidden", Boolean),
+)
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        insert(types).values(Type="A'B%", Kind="KIND_X", Weight=None, Hidden=True),
+        update(types).where(types.c.Type == "A").values(Weight=5),
+        delete(types).where(types.c.Weight > 3),
+        select(types.c.Type).where(types.c.Type.in_(["A", "B"])),
+        text("SELECT * FROM Types WHERE Type LIKE 'A%' AND Kind = :kind").bindparams(
+            kind="K%"
+        ),
+        text("INSERT INTO Types (Type, Kind) VALUES ('A', 'KIND_X');"),
+    ],
+)
+def test_compile_matches_full_compilation(statement):
+    compiler = StatementCompiler()
+    assert compiler.compile(statement) == compiler.compile_uncached(statement)
+    # Cached structures render the same SQL
+    assert compiler.compile(statement) == compiler.compile_uncached(statement)
+
+
+def test_compile_uses_sqlite_dialect():
+    statement = insert(types).values(Type="A", Kind="K", Weight=1, Hidden=False)
+    assert StatementCompiler().compile(statement) == (
+        'INSERT INTO "Types" ("Type", "Kind", "Weight", "Hidden") '
+        "VALUES ('A', 'K', 1, 0)"
+    )
+
+
+def test_compile_caches_statement_shapes():
+    compiler = StatementCompiler(cache_size=2)
+    for i in range(100):
+        sql = compiler.compile(insert(types).values(Type=f"T{i}", Kind="K"))
+        assert f"'T{i}'" in sql
+        compiler.compile(update(types).where(types.c.Type == f"T{i}").values(Weight=i))
+    assert len(compiler) == 2
+    compiler.compile(delete(types).where(types.c.Weight > 3))
+    assert len(compiler) == 2
+
+
+class Traditions(SQLModel, table=True):
+    __tablename__ = "Traditions"
+    tradition_type: str = Field(
+        primary_key=True, sa_column_kwargs={"name": "TraditionType"}
+    )
+    name: str = Field(sa_column_kwargs={"name": "Name"})
+    description: Optional[str] = Field(
+        default=None, sa_column_kwargs={"name": "Description"}
+    )
+
+
+def test_rows_match_multi_row_insert():
+    rows = [{"Type": f"T{i}", "Kind": "K'", "Weight": i} for i in range(5)]
+    expected = StatementCompiler().compile_uncached(insert(types).values(rows))
+    assert list(Rows(rows, table=types).statements()) == [expected]
+
+
+def test_rows_are_chunked_per_table():
+    def generate():
+        for i in range(3):
+            yield Traditions(tradition_type=f"TRADITION_{i}", name=f"LOC_{i}")
+        for i in range(3):
+            yield {"Type": f"TRADITION_{i}", "Kind": "KIND_TRADITION"}
+
+    statements = list(Rows(generate(), table=types, chunk_size=2).statements())
+    assert [sql.split(" (")[0] for sql in statements] == [
+        'INSERT INTO "Traditions"',
+        'INSERT INTO "Traditions"',
+        'INSERT INTO "Types"',
+        'INSERT INTO "Types"',
+    ]
+    # Unset columns are left to the database's defaults
+    assert statements[0] == (
+        'INSERT INTO "Traditions" ("TraditionType", "Name") '
+        "VALUES ('TRADITION_0', 'LOC_0'), ('TRADITION_1', 'LOC_1')"
+    )
+
+
+def test_rows_keep_their_order_across_tables_and_columns():
+    rows = [
+        {"Type": "A", "Kind": "K"},
+        {"Type": "B", "Kind": "K", "Weight": 1},
+        Traditions(tradition_type="TRADITION_C", name="LOC_C"),
+        {"Type": "D", "Kind": "K"},
+        {"Type": "E", "Kind": "K"},
+    ]
+    chunks = list(Rows(rows, table=types, chunk_size=2).chunks())
+    assert [(table.name, columns, values) for table, columns, values in chunks] == [
+        ("Types", ["Type", "Kind"], [["A", "K"]]),
+        ("Types", ["Type", "Kind", "Weight"], [["B", "K", 1]]),
+        ("Traditions", ["TraditionType", "Name"], [["TRADITION_C", "LOC_C"]]),
+        ("Types", ["Type", "Kind"], [["D", "K"], ["E", "K"]]),
+    ]
+
+
+def test_rows_from_columns():
+    rows = Rows.from_columns(
+        "LocalizedText", {"Tag": ["A", "B"], "Language": ["en_US", "en_US"]}
+    )
+    assert list(rows.statements()) == [
+        'INSERT INTO "LocalizedText" ("Tag", "Language") '
+        "VALUES ('A', 'en_US'), ('B', 'en_US')"
+    ]
+    with pytest.raises(ValueError):
+        Rows.from_columns("LocalizedText", {"Tag": ["A", "B"], "Language": ["en_US"]})
@@ -0,0 +1,42 @@
+import json
+
+from sqlalchemy import text
+
+from pyciv7 import runner
+from pyciv7.tracing import ITEM, Tracer, current_tracer, span, trace
+
+
+def test_trace_records_the_phases_actions_and_items_of_a_build(
+    fxs_new_policies_sample,
+):
+    action = fxs_new_policies_sample.action_groups[0].actions[0]
+    action.items = [text("SELECT * FROM Policies"), text("SELECT * FROM Types")]
+    with trace() as tracer:
+        runner.build(fxs_new_policies_sample)
+    names = [record.name for record in tracer.spans]
+    assert names[0] == "build"
+    assert names.count("compile sql") == names.count("write sql") == 2
+    assert {"write .modinfo", "plan", "emit", "save manifest"} <= set(names)
+    # Every span but the build is nested in it
+    assert [record.parent for record in tracer.spans].count(None) == 1
+    summary = tracer.summary()
+    assert summary["compile sql"]["count"] == 2
+    assert summary["build"]["self"] <= summary["build"]["total"]
+
+
+def test_build_writes_a_chrome_trace(fxs_new_policies_sample, tmp_path):
+    trace_file = tmp_path / "build.trace.json"
+    runner.build(fxs_new_policies_sample, trace_file=trace_file)
+    events = json.loads(trace_file.read_text())["traceEvents"]
+    assert events[0]["name"] == "build"
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+    assert current_tracer() is None
+
+
+def test_spans_are_not_recorded_outside_of_a_trace():
+    with span("ignored") as record:
+        assert record is None
+    with trace(Tracer(items=False)) as tracer:
+        with span("ignored", ITEM), span("kept"):
+            pass
+    assert [record.name for record in tracer.spans] == ["kept"]